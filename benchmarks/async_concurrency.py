@@ -0,0 +1,57 @@
+"""
+Throughput of the async EmailSupportGraph as concurrency grows, with fake LLMs and a fake Gmail client.
+
+    python -m benchmarks.async_concurrency --emails 128 --llm-latency 0.05 --gmail-latency 0.02
+"""
+import argparse
+import asyncio
+import time
+
+from .fakes import install_fakes, make_gmail_message
+
+
+def _initial_states(emails: int) -> list[dict]:
+    from src.utils.gmail_utils import _parse_email_message
+
+    return [
+        {
+            "current_email": _parse_email_message(make_gmail_message(index)),
+            "email_category": "",
+            "email_response": "",
+            "messages": [""],
+        }
+        for index in range(emails)
+    ]
+
+
+async def _run_async(graph, emails: int, concurrency: int) -> float:
+    start = time.perf_counter()
+    await graph.abatch(_initial_states(emails), config={"max_concurrency": concurrency})
+    return time.perf_counter() - start
+
+
+def run(emails: int, llm_latency: float, gmail_latency: float, levels: list[int]):
+    install_fakes(llm_latency=llm_latency, gmail_latency=gmail_latency)
+    from src.graph.email_graph import EmailSupportGraph
+
+    sync_graph = EmailSupportGraph(batch=True).email_graph
+    start = time.perf_counter()
+    for state in _initial_states(emails):
+        sync_graph.invoke(state)
+    elapsed = time.perf_counter() - start
+    print(f"{'sync sequential':>16}: {emails / elapsed:8.1f} emails/s ({elapsed:.2f}s)")
+
+    async_graph = EmailSupportGraph(batch=True, use_async=True).email_graph
+    for concurrency in levels:
+        elapsed = asyncio.run(_run_async(async_graph, emails, concurrency))
+        print(f"{f'async x{concurrency}':>16}: {emails / elapsed:8.1f} emails/s ({elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=64)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="simulated seconds per LLM call")
+    parser.add_argument("--gmail-latency", type=float, default=0.02, help="simulated seconds per Gmail call")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+    run(emails=args.emails, llm_latency=args.llm_latency, gmail_latency=args.gmail_latency, levels=args.levels)
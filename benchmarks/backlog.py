@@ -0,0 +1,87 @@
+"""
+Emails per minute for a backlog answered through the per-email workflow (one categorizer and one
+writer request after the other, per email) against the backlog processor, which runs each stage
+for all emails at once: on-demand requests with chain.batch at several concurrency limits, and a
+fake Bedrock batch inference job per stage (submission plus queueing delay, then a fixed throughput).
+
+Every on-demand LLM call waits --llm-latency seconds; the categorization cache and pre-classifier
+are off so every email reaches the categorizer.
+
+    python -m benchmarks.backlog --emails 200 --llm-latency 0.2 --job-startup 2
+"""
+import argparse
+import contextlib
+import io
+import os
+import time
+
+from src.utils.gmail_utils import _parse_email_message
+from .fakes import install_fake_batch_inference, install_fake_outbox, install_fake_retriever, install_fakes, make_gmail_message
+
+os.environ["PRECLASSIFIER_ENABLED"] = "false"
+
+
+def _reset():
+    from src.utils.cache import set_categorization_cache
+
+    set_categorization_cache(None)
+    install_fake_retriever()
+    return install_fake_outbox()
+
+
+def _per_email(emails) -> dict[str, str]:
+    from src.graph.email_graph import EmailSupportGraph
+
+    graph = EmailSupportGraph(batch=True, writer_mode="single_pass", checkpointer="none")
+    categories = {}
+    for email in emails:
+        result = graph.process_email(email, defer_send=True)
+        categories[email.id] = result["email_category"]
+    return categories
+
+
+def _backlog(emails, mode: str, max_concurrency: int) -> dict[str, str]:
+    from src.graph.backlog import BacklogProcessor
+
+    processor = BacklogProcessor(mode=mode, max_concurrency=max_concurrency, min_job_records=1)
+    states = processor.process(emails)
+    processor.send(states)
+    return {state["current_email"].id: state["email_category"] for state in states}
+
+
+def run(emails: int, llm_latency: float, concurrency: list[int], job_startup: float, job_throughput: float):
+    install_fakes(llm_latency=llm_latency)
+    fake_job = install_fake_batch_inference(startup=job_startup, records_per_second=job_throughput)
+    backlog = [_parse_email_message(make_gmail_message(index)) for index in range(emails)]
+
+    variants = [("per-email workflow", lambda: _per_email(backlog))]
+    variants += [(f"chain.batch, {limit} in flight", lambda limit=limit: _backlog(backlog, "batch", limit)) for limit in concurrency]
+    variants.append(("batch inference job", lambda: _backlog(backlog, "batch_job", 1)))
+
+    print(f"{'path':<28}{'seconds':>9}{'emails/min':>12}{'speedup':>9}{'queued':>8}  categories")
+    baseline = reference = None
+    for name, variant in variants:
+        sender = _reset()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            categories = variant()
+        elapsed = time.perf_counter() - start
+        reference = reference or categories
+        baseline = baseline or elapsed
+        queued = sum(sender.store.status_counts().values())
+        print(f"{name:<28}{elapsed:>9.2f}{emails / elapsed * 60:>12.0f}{baseline / elapsed:>8.1f}x{queued:>8}"
+              f"  {'same' if categories == reference else 'DIFFERENT'}")
+    print(f"\nbatch jobs submitted: {fake_job.calls['create_model_invocation_job']}, "
+          f"status polls: {fake_job.calls['get_model_invocation_job']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per on-demand LLM call")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--job-startup", type=float, default=2.0, help="seconds a batch job waits before processing")
+    parser.add_argument("--job-throughput", type=float, default=200.0, help="records per second once a job runs")
+    args = parser.parse_args()
+    run(emails=args.emails, llm_latency=args.llm_latency, concurrency=args.concurrency,
+        job_startup=args.job_startup, job_throughput=args.job_throughput)
@@ -0,0 +1,48 @@
+"""
+Compare one-email-per-run ingestion with the batched listener against a stubbed Gmail service.
+
+    python -m benchmarks.batch_ingestion --emails 500 --latency 0.02
+"""
+import argparse
+import time
+
+from src.utils.gmail_utils import _parse_email_message, get_unprocessed_emails, mark_emails_as_processed
+from .fakes import FakeGmailService, make_gmail_message
+
+
+def _per_email_ingest(service: FakeGmailService) -> int:
+    """Mimic get_most_recent_email: list one message, fetch it, then mark it read for the next run."""
+    processed = 0
+    while True:
+        results = service.users().messages().list(userId="me", q="", maxResults=1).execute()
+        if not results.get("messages"):
+            return processed
+        message_id = results["messages"][0]["id"]
+        _parse_email_message(service.users().messages().get(userId="me", id=message_id).execute())
+        mark_emails_as_processed([message_id], service=service)
+        processed += 1
+
+
+def _batch_ingest(service: FakeGmailService) -> int:
+    emails = get_unprocessed_emails(service=service)
+    mark_emails_as_processed([email.id for email in emails], service=service)
+    return len(emails)
+
+
+def run(emails: int, latency: float):
+    corpus = [make_gmail_message(index) for index in range(emails)]
+    for name, ingest in (("per-email", _per_email_ingest), ("batch", _batch_ingest)):
+        service = FakeGmailService(messages=[dict(message, labelIds=["INBOX", "UNREAD"]) for message in corpus], latency=latency)
+        start = time.perf_counter()
+        count = ingest(service)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10}: {count} emails in {elapsed:.3f}s "
+              f"({count / elapsed:,.1f} emails/s, {service.round_trips} HTTP round trips)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated seconds per HTTP round trip")
+    args = parser.parse_args()
+    run(emails=args.emails, latency=args.latency)
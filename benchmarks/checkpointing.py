@@ -0,0 +1,118 @@
+"""
+Checkpoint write overhead of the per-email workflow for each checkpointer backend, plus a crash
+in the writer that is resumed from the last completed node and then skipped on re-delivery.
+
+    python -m benchmarks.checkpointing --emails 200
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+from langchain_core.runnables import RunnableLambda
+
+from src.utils.checkpointer import create_checkpointer
+from src.utils.gmail_utils import _parse_email_message
+from .fakes import fake_agent_registry, install_fakes, make_gmail_message
+
+
+def _time_calls(saver, timings: dict[str, list[float]]):
+    """Wrap the saver's write path so every call records its duration"""
+    for name in ("put", "put_writes", "get_tuple"):
+        method = getattr(saver, name)
+
+        def timed(*args, _method=method, _name=name, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _method(*args, **kwargs)
+            finally:
+                timings[_name].append((time.perf_counter() - start) * 1000)
+        setattr(saver, name, timed)
+
+
+def _overhead(emails: list, directory: str):
+    from src.graph.email_graph import EmailSupportGraph
+
+    baseline = None
+    print(f"{'checkpointer':>13}{'ms/email':>10}{'overhead':>10}{'puts/email':>12}{'put ms':>8}{'writes ms':>11}{'db KiB':>8}")
+    for backend in ("none", "memory", "sqlite"):
+        path = os.path.join(directory, "overhead.sqlite")
+        saver = create_checkpointer(backend, path=path)
+        timings = {"put": [], "put_writes": [], "get_tuple": []}
+        if saver is not None:
+            _time_calls(saver, timings)
+        graph = EmailSupportGraph(batch=True, checkpointer=saver or "none")
+        durations = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for email in emails:
+                start = time.perf_counter()
+                graph.process_email(email)
+                durations.append((time.perf_counter() - start) * 1000)
+        mean = statistics.mean(durations)
+        baseline = baseline if baseline is not None else mean
+        size = sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix)) if backend == "sqlite" else 0
+        print(f"{backend:>13}{mean:>10.2f}{mean - baseline:>+10.2f}{len(timings['put']) / len(emails):>12.1f}"
+              f"{statistics.mean(timings['put'] or [0]):>8.3f}{statistics.mean(timings['put_writes'] or [0]):>11.3f}"
+              f"{size / 1024:>8.0f}")
+
+
+def _crash_and_resume(email, directory: str, service):
+    from src.agents import AGENT_REGISTRY
+    from src.graph.email_graph import EmailSupportGraph
+
+    calls = Counter()
+    agents = fake_agent_registry()
+
+    def counted(name, fail_first=False):
+        def _invoke(inputs):
+            calls[name] += 1
+            if fail_first and calls[name] == 1:
+                raise RuntimeError("process killed during the writer call")
+            return agents[name].invoke(inputs)
+        return RunnableLambda(_invoke)
+
+    AGENT_REGISTRY.update({
+        "email_categorizer": counted("email_categorizer"),
+        "query_or_email": counted("query_or_email"),
+        "email_writer_with_context": counted("email_writer_with_context", fail_first=True),
+    })
+    path = os.path.join(directory, "crash.sqlite")
+    graph = EmailSupportGraph(batch=True, checkpointer=create_checkpointer("sqlite", path=path))
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            graph.process_email(email)
+        except RuntimeError as error:
+            crashed = str(error)
+    print(f"\nfirst run: {crashed}; llm calls so far {dict(calls)}")
+
+    # a new process: fresh graph and saver over the same file
+    graph = EmailSupportGraph(batch=True, checkpointer=create_checkpointer("sqlite", path=path))
+    print(f"interrupted after restart: {graph.interrupted_emails()}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        graph.resume_interrupted()
+    print(f"resumed: llm calls {dict(calls)}, replies sent {len(service.sent)}")
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        graph.process_email(email)
+    skipped = "already answered" in output.getvalue()
+    print(f"re-delivered: skipped={skipped}, llm calls {dict(calls)}, replies sent {len(service.sent)}")
+
+
+def run(emails: int):
+    service, _ = install_fakes()
+    batch = [_parse_email_message(make_gmail_message(index)) for index in range(emails)]
+    with tempfile.TemporaryDirectory() as directory:
+        _overhead(batch, directory)
+        service.sent.clear()
+        _crash_and_resume(_parse_email_message(make_gmail_message(emails)), directory, service)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=200)
+    args = parser.parse_args()
+    run(emails=args.emails)
@@ -0,0 +1,117 @@
+"""
+Deterministic synthetic inbox for the end-to-end benchmarks: product enquiries about the models in
+the knowledge base, complaints, feedback and unrelated mail (newsletters, notifications, spam) in
+roughly production proportions, with varying length, follow-ups quoting an earlier email of the
+same thread, and the labelled unrelated senders of data/categorized_emails.jsonl.
+
+The same (count, seed) always yields the same messages.
+"""
+import json
+import os
+import random
+import re
+
+from .fakes import DATA_DIR, make_gmail_message
+
+CATEGORY_WEIGHTS = {
+    "product_enquiry": 0.40,
+    "customer_complaint": 0.25,
+    "customer_feedback": 0.15,
+    "unrelated": 0.20,
+}
+
+NAMES = ["Ana", "Luis", "María", "Jorge", "Carla", "Pedro", "Sofía", "Diego", "Valeria", "Andrés", "Lucía", "Mateo"]
+
+# each template carries the keywords the fake categorizer keys on, the filler carries none of them
+TEMPLATES = {
+    "product_enquiry": [
+        "Hola, quisiera saber el precio del {product} y si lo tienen disponible en tienda.",
+        "Buenas tardes, ¿el {product} tiene financiamiento a 12 meses? Me interesa saber la cuota.",
+        "Hola, ¿tienen disponible el {product}? Quisiera saber si viene sellado u open box.",
+        "Buen día, necesito el precio de contado del {product} y cuánto demora el envío a {city}.",
+    ],
+    "customer_complaint": [
+        "Compré un {product} hace {days} días y la batería se descarga muy rápido, estoy muy molesto.",
+        "Tengo un problema con mi pedido #{order}: el {product} llegó con la pantalla rayada.",
+        "Quiero presentar un reclamo, el {product} que me vendieron se reinicia solo desde el primer día.",
+        "Estoy molesto, llevo {days} días esperando el {product} del pedido #{order} y nadie me responde.",
+    ],
+    "customer_feedback": [
+        "Muchas gracias por la atención, el {product} llegó rápido y en perfecto estado.",
+        "Excelente servicio, {name} me ayudó a elegir el {product}. ¡Los recomiendo!",
+        "Una sugerencia: sería útil poder seguir el envío del pedido #{order} desde la web.",
+        "Gracias por resolver lo de mi {product} tan rápido, todo funciona bien ahora.",
+    ],
+    "unrelated": [
+        "Hi, we offer SEO and marketing services for your website with a {days}% discount this month. Click here to unsubscribe.",
+        "Your invoice #{order} for cloud hosting is attached. This is an automated message.",
+        "Recordatorio: la reunión del comité de {city} se movió al jueves a las {hour}:00.",
+        "Boletín semanal: novedades del sector tecnológico. Para darte de baja haz clic aquí.",
+    ],
+}
+
+FILLER = [
+    "Les escribo desde {city}.",
+    "Soy cliente de ustedes desde hace {years} años.",
+    "Pueden contactarme a este mismo correo.",
+    "Prefiero que me respondan por aquí y no por teléfono.",
+    "Quedo atento a su respuesta.",
+    "Saludos cordiales.",
+    "Es la primera vez que les escribo.",
+    "Lo necesito antes del fin de semana.",
+]
+
+CITIES = ["Lima", "Quito", "Bogotá", "Guayaquil", "Cuenca", "Arequipa", "Medellín"]
+
+
+def _products() -> list[str]:
+    with open(os.path.join(DATA_DIR, "data.txt"), encoding="utf-8") as source:
+        return re.findall(r"^Modelo: (.+)$", source.read(), flags=re.MULTILINE)
+
+
+def _unrelated_senders() -> list[tuple[str, str]]:
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "categorized_emails.jsonl")
+    with open(path, encoding="utf-8") as corpus:
+        records = [json.loads(line) for line in corpus if line.strip()]
+    return [(record["sender"], record["subject"]) for record in records if record["llm_category"] == "unrelated"]
+
+
+def synthetic_corpus(count: int, seed: int = 0, follow_up_share: float = 0.15) -> list[dict]:
+    """`count` Gmail message resources; about `follow_up_share` of them reply in an earlier thread"""
+    rng = random.Random(seed)
+    products = _products()
+    senders = _unrelated_senders()
+    categories, weights = zip(*CATEGORY_WEIGHTS.items())
+    messages, customer_threads = [], []
+    for index in range(count):
+        category = rng.choices(categories, weights)[0]
+        values = {
+            "product": rng.choice(products),
+            "city": rng.choice(CITIES),
+            "name": rng.choice(NAMES),
+            "order": rng.randint(1000, 99999),
+            "days": rng.randint(2, 40),
+            "hour": rng.randint(8, 18),
+            "years": rng.randint(1, 10),
+        }
+        body = rng.choice(TEMPLATES[category]).format(**values)
+        filler = rng.sample(FILLER, rng.randint(0, 4))
+        body = " ".join([body, *(sentence.format(**values) for sentence in filler)])
+
+        sender = subject = thread_id = in_reply_to = None
+        if category == "unrelated" and rng.random() < 0.5:
+            sender, subject = rng.choice(senders)
+        elif category != "unrelated" and customer_threads and rng.random() < follow_up_share:
+            earlier = rng.choice(customer_threads)
+            thread_id, sender, subject = earlier["thread_id"], earlier["sender"], f"Re: {earlier['subject']}"
+            in_reply_to = earlier["message_id"]
+            quoted = "\n".join(f"> {line}" for line in earlier["body"].splitlines())
+            body = f"{body}\n\nEl lun, 6 oct 2025 a las 10:00, {sender} escribió:\n{quoted}"
+
+        message = make_gmail_message(index, body=body, thread_id=thread_id, sender=sender, subject=subject, in_reply_to=in_reply_to)
+        if category != "unrelated":
+            headers = {header["name"]: header["value"] for header in message["payload"]["headers"]}
+            customer_threads.append({"thread_id": message["threadId"], "sender": headers["From"], "message_id": headers["Message-ID"],
+                                     "subject": headers["Subject"].removeprefix("Re: "), "body": body})
+        messages.append(message)
+    return messages
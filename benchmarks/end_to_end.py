@@ -0,0 +1,272 @@
+"""
+End-to-end run of EmailSupportGraph over a synthetic inbox (benchmarks/corpus.py) with fake
+Bedrock agents, knowledge base and Gmail. Emails are listed and fetched from the fake mailbox in
+chunks, answered one workflow run per email (sequentially, or concurrently with the async graph),
+their replies flushed through the outbox and the chunk marked processed, like the batch graph.
+
+Reports throughput, per-email and per-node latency percentiles, LLM/retriever/Gmail calls and
+tokens per email, the size of the final per-email graph state, and (in a second pass under
+tracemalloc, without simulated latency) peak traced memory and its growth per 1000 emails.
+
+Results are compared against a stored baseline with the same configuration; a metric that got
+worse beyond its tolerance is reported as a regression and the exit status is 1. Counts, tokens
+and state size are deterministic for a seed and have tight tolerances, timings and memory loose ones.
+
+    python -m benchmarks.end_to_end                        # compare with benchmarks/baselines/end_to_end.json
+    python -m benchmarks.end_to_end --save-baseline        # record a new baseline after an intended change
+    python -m benchmarks.end_to_end --emails 5000 --mode sequential --no-baseline
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import pickle
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from io import StringIO
+
+from src.utils.gmail_utils import get_unprocessed_emails, mark_emails_as_processed
+from src.utils.metrics import MetricsRegistry, set_metrics
+from src.utils.tracing import InMemorySpanExporter, Tracer, set_tracer
+from .corpus import synthetic_corpus
+from .fakes import install_fakes
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "end_to_end.json")
+
+# metric path -> (better direction, relative tolerance, absolute slack)
+CHECKS = {
+    "throughput_eps": ("higher", 0.25, 0.0),
+    "email_ms.p50": ("lower", 0.25, 2.0),
+    "email_ms.p95": ("lower", 0.30, 5.0),
+    "llm_calls_per_email": ("lower", 0.02, 0.0),
+    "tokens_per_email": ("lower", 0.02, 0.0),
+    "retriever_calls_per_email": ("lower", 0.02, 0.0),
+    "gmail_round_trips_per_email": ("lower", 0.02, 0.0),
+    "state_bytes.mean": ("lower", 0.05, 0.0),
+    "state_bytes.max": ("lower", 0.05, 0.0),
+    "memory.peak_kib": ("lower", 0.25, 256.0),
+    "memory.growth_kib_per_1k": ("lower", 0.50, 128.0),
+}
+NODE_CHECK = ("lower", 0.50, 5.0)
+
+
+def _percentiles(values: list[float]) -> dict[str, float]:
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))] if ordered else 0.0
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def _install(args, latency: bool):
+    from src.utils.cache import create_cache, set_categorization_cache
+
+    scale = 1.0 if latency else 0.0
+    service, retriever = install_fakes(
+        llm_latency=args.llm_latency * scale,
+        gmail_latency=args.gmail_latency * scale,
+        retriever_latency=args.retriever_latency * scale,
+        jitter=args.jitter
+    )
+    # production defaults, but empty at the start of every pass
+    set_categorization_cache(create_cache("memory", max_size=10_000, ttl=86_400))
+    set_metrics(MetricsRegistry())
+    set_tracer(Tracer(InMemorySpanExporter()))
+    for message in synthetic_corpus(args.emails, seed=args.seed):
+        service.add_message(message)
+    return service, retriever
+
+
+# only the pickled size of a final state is kept, so the memory pass measures the graph and not the harness
+async def _answer_async(graph, emails, concurrency: int) -> list[tuple[int, float]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(email):
+        async with semaphore:
+            start = time.perf_counter()
+            state = await graph.aprocess_email(email, defer_send=True)
+            return len(pickle.dumps(state)), (time.perf_counter() - start) * 1000
+
+    return await asyncio.gather(*(answer(email) for email in emails))
+
+
+def _answer_sequential(graph, emails) -> list[tuple[int, float]]:
+    results = []
+    for email in emails:
+        start = time.perf_counter()
+        state = graph.process_email(email, defer_send=True)
+        results.append((len(pickle.dumps(state)), (time.perf_counter() - start) * 1000))
+    return results
+
+
+def _drain(args, service, on_chunk=None) -> list[tuple[int, float]]:
+    """Answer the whole mailbox chunk by chunk, returning (state bytes, ms) per email; on_chunk(processed) runs after each chunk"""
+    from src.graph.email_graph import EmailSupportGraph
+    from src.utils.outbox import get_outbox_sender
+
+    graph = EmailSupportGraph(batch=True, use_async=args.mode == "async", writer_mode=args.writer_mode, checkpointer="none")
+    results = []
+    while True:
+        emails = get_unprocessed_emails(max_messages=args.chunk, service=service)
+        if not emails:
+            return results
+        if args.mode == "async":
+            chunk = asyncio.run(_answer_async(graph, emails, args.concurrency))
+        else:
+            chunk = _answer_sequential(graph, emails)
+        get_outbox_sender().flush()
+        mark_emails_as_processed([email.id for email in emails], service=service)
+        results.extend(chunk)
+        if on_chunk is not None:
+            on_chunk(len(results))
+
+
+def _timing_pass(args) -> dict:
+    from src.utils.metrics import get_metrics
+
+    service, retriever = _install(args, latency=True)
+    start = time.perf_counter()
+    with redirect_stdout(StringIO()):
+        results = _drain(args, service)
+    elapsed = time.perf_counter() - start
+
+    emails = len(results)
+    snapshot = get_metrics().snapshot()
+    state_sizes = [size for size, _ in results]
+    nodes = {
+        series["labels"]["node"]: {"count": series["count"], **{q: series[q] * 1000 for q in ("p50", "p95", "p99")}}
+        for series in snapshot.get("node_latency_seconds", [])
+    }
+    return {
+        "emails": emails,
+        "replies_sent": len(service.sent),
+        "wall_s": elapsed,
+        "throughput_eps": emails / elapsed,
+        "email_ms": _percentiles([duration for _, duration in results]),
+        "nodes": nodes,
+        "llm_calls_per_email": sum(series["count"] for series in snapshot.get("llm_latency_seconds", [])) / emails,
+        "tokens_per_email": sum(series["value"] for series in snapshot.get("llm_tokens_total", [])) / emails,
+        "cost_usd_per_1k": sum(series["value"] for series in snapshot.get("llm_cost_usd_total", [])) / emails * 1000,
+        "retriever_calls_per_email": retriever.calls / emails,
+        "gmail_round_trips_per_email": service.round_trips / emails,
+        "state_bytes": {"mean": statistics.mean(state_sizes), **_percentiles(state_sizes), "max": max(state_sizes)},
+    }
+
+
+def _memory_pass(args) -> dict:
+    service, _ = _install(args, latency=False)
+    samples = []
+
+    def sample(processed: int):
+        gc.collect()
+        samples.append((processed, tracemalloc.get_traced_memory()[0]))
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with redirect_stdout(StringIO()):
+            _drain(args, service, on_chunk=sample)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # least-squares slope after the first chunk, which pays for imports and warm-up
+    steady = samples[1:] if len(samples) > 2 else samples
+    slope = statistics.linear_regression(*zip(*steady)).slope if len(steady) > 1 else 0.0
+    return {"peak_kib": peak / 1024, "growth_kib_per_1k": slope * 1000 / 1024}
+
+
+def _lookup(results: dict, path: str):
+    value = results
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare(baseline: dict, results: dict) -> list[str]:
+    """Print current against baseline values and return the regressed metric paths"""
+    checks = dict(CHECKS)
+    checks.update({f"nodes.{node}.p95": NODE_CHECK for node in baseline.get("nodes", {})})
+    regressions = []
+    print(f"\n{'metric':<44}{'baseline':>12}{'current':>12}{'change':>9}")
+    for path, (direction, tolerance, slack) in checks.items():
+        before, after = _lookup(baseline, path), _lookup(results, path)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        worse = after < before * (1 - tolerance) - slack if direction == "higher" else after > before * (1 + tolerance) + slack
+        better = after > before if direction == "higher" else after < before
+        status = "REGRESSION" if worse else ("better" if better and abs(change) > tolerance else "")
+        if worse:
+            regressions.append(path)
+        print(f"{path:<44}{before:>12.2f}{after:>12.2f}{change:>+9.1%}  {status}")
+    return regressions
+
+
+def _print_results(results: dict):
+    print(f"{results['emails']} emails in {results['wall_s']:.2f}s: {results['throughput_eps']:.1f} emails/s, "
+          f"{results['replies_sent']} replies sent")
+    email_ms = results["email_ms"]
+    print(f"per email: p50 {email_ms['p50']:.1f} ms, p95 {email_ms['p95']:.1f} ms, p99 {email_ms['p99']:.1f} ms; "
+          f"{results['llm_calls_per_email']:.2f} LLM calls, {results['tokens_per_email']:.0f} tokens, "
+          f"{results['retriever_calls_per_email']:.2f} retriever calls, "
+          f"{results['gmail_round_trips_per_email']:.3f} Gmail round trips; ${results['cost_usd_per_1k']:.3f} per 1000 emails")
+    state = results["state_bytes"]
+    print(f"final state: mean {state['mean'] / 1024:.1f} KiB, p95 {state['p95'] / 1024:.1f} KiB, max {state['max'] / 1024:.1f} KiB")
+    if "memory" in results:
+        print(f"memory: peak {results['memory']['peak_kib'] / 1024:.1f} MiB traced, "
+              f"growth {results['memory']['growth_kib_per_1k']:.0f} KiB per 1000 emails")
+    print(f"\n{'node':<28}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for node, values in sorted(results["nodes"].items()):
+        print(f"{node:<28}{values['count']:>7}{values['p50']:>9.1f}{values['p95']:>9.1f}{values['p99']:>9.1f}")
+
+
+def run(args) -> int:
+    config = {name: getattr(args, name) for name in
+              ("emails", "seed", "mode", "concurrency", "chunk", "writer_mode", "llm_latency", "retriever_latency", "gmail_latency", "jitter")}
+    results = _timing_pass(args)
+    if not args.no_memory:
+        results["memory"] = _memory_pass(args)
+    _print_results(results)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump({"config": config, "results": results}, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        print(f"\nbaseline saved to {args.baseline}")
+        return 0
+    if args.no_baseline or not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline["config"] != config:
+        changed = sorted(name for name in config if baseline["config"].get(name) != config[name])
+        print(f"\nbaseline {args.baseline} was recorded with a different configuration ({', '.join(changed)}), not comparing")
+        return 0
+    regressions = compare(baseline["results"], results)
+    print(f"\n{len(regressions)} regressions" + (f": {', '.join(regressions)}" if regressions else ""))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", choices=("async", "sequential"), default="async")
+    parser.add_argument("--concurrency", type=int, default=32, help="emails in flight in async mode")
+    parser.add_argument("--chunk", type=int, default=250, help="emails loaded, answered and marked per round")
+    parser.add_argument("--writer-mode", choices=("two_pass", "single_pass"), default="two_pass")
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="median seconds per LLM call")
+    parser.add_argument("--retriever-latency", type=float, default=0.005, help="median seconds per knowledge-base query")
+    parser.add_argument("--gmail-latency", type=float, default=0.002, help="seconds per Gmail round trip")
+    parser.add_argument("--jitter", type=float, default=0.3, help="sigma of the log-normal latency spread")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--no-baseline", action="store_true", help="do not compare against the baseline")
+    args = parser.parse_args()
+    sys.exit(run(args))
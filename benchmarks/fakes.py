@@ -0,0 +1,739 @@
+"""Offline stand-ins for the Gmail API, the knowledge base and the Bedrock agents used by the benchmarks."""
+import asyncio
+import base64
+import email
+import io
+import itertools
+import json
+import os
+import random
+import re
+import time
+import zlib
+from collections import Counter, deque
+from email.header import decode_header, make_header
+from typing import Callable
+
+import httplib2
+from googleapiclient.errors import HttpError
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableLambda
+from pydantic import PrivateAttr
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "data")
+
+SAMPLE_BODIES = [
+    "Hola, quisiera saber el precio del iPhone 13 Pro de 256 GB y si tienen financiamiento a 12 meses.",
+    "Compré un Samsung Galaxy hace una semana y la batería se descarga muy rápido, estoy muy molesto.",
+    "Muchas gracias por la atención, el equipo llegó rápido y en perfecto estado. ¡Excelente servicio!",
+    "Hi, we offer SEO and marketing services for your website with a 40% discount this month. Click here to unsubscribe.",
+]
+
+
+def make_gmail_message(index: int, body: str | None = None, thread_id: str | None = None,
+                       sender: str | None = None, subject: str | None = None, in_reply_to: str | None = None) -> dict:
+    """Build a Gmail API message resource with a single text/plain part, a reply when `in_reply_to` is a Message-ID."""
+    body = body if body is not None else SAMPLE_BODIES[index % len(SAMPLE_BODIES)]
+    message_id = f"msg{index:06d}"
+    message = {
+        "id": message_id,
+        "threadId": thread_id or f"thread{index:06d}",
+        "labelIds": ["INBOX", "UNREAD"],
+        "payload": {
+            "mimeType": "multipart/alternative",
+            "headers": [
+                {"name": "Subject", "value": subject or f"Consulta {index}"},
+                {"name": "From", "value": sender or f"Cliente {index} <cliente{index}@example.com>"},
+                {"name": "Date", "value": "Mon, 6 Oct 2025 10:00:00 -0500"},
+                {"name": "Message-ID", "value": f"<{message_id}@mail.example.com>"},
+            ],
+            "parts": [
+                {
+                    "mimeType": "text/plain",
+                    "body": {"data": base64.urlsafe_b64encode(body.encode("utf-8")).decode("ascii")},
+                }
+            ],
+        },
+    }
+    if in_reply_to:
+        message["payload"]["headers"] += [{"name": "In-Reply-To", "value": in_reply_to}, {"name": "References", "value": in_reply_to}]
+    return message
+
+
+def eml_to_gmail_message(raw: bytes, message_id: str, thread_id: str | None = None) -> dict:
+    """
+    The format=full Gmail resource of an RFC 822 message, shaped like the API's: every part with
+    its headers, text bodies as base64url data, attachments as an attachmentId and a size.
+    """
+    parsed = email.message_from_bytes(raw)
+
+    def to_part(message, part_id: str) -> dict:
+        part = {
+            "partId": part_id,
+            "mimeType": message.get_content_type(),
+            "filename": message.get_filename() or "",
+            # Gmail returns unfolded, decoded header values
+            "headers": [{"name": name, "value": str(make_header(decode_header(value))).replace("\n", "").replace("\r", "")}
+                        for name, value in message.items()],
+        }
+        if message.is_multipart():
+            part["body"] = {"size": 0}
+            part["parts"] = [to_part(child, f"{part_id}.{index}" if part_id else str(index))
+                             for index, child in enumerate(message.get_payload())]
+            return part
+        data = message.get_payload(decode=True) or b""
+        if part["filename"] or message.get_content_disposition() == "attachment":
+            part["body"] = {"attachmentId": f"ANGjdJ{zlib.crc32(data):08x}{part_id}", "size": len(data)}
+        else:
+            part["body"] = {"size": len(data), "data": base64.urlsafe_b64encode(data).decode("ascii")}
+        return part
+
+    return {
+        "id": message_id,
+        "threadId": thread_id or message_id,
+        "labelIds": ["INBOX", "UNREAD"],
+        "snippet": " ".join(parsed.get("Subject", "").split())[:200],
+        "historyId": "1000",
+        "internalDate": "1759762800000",
+        "sizeEstimate": len(raw),
+        "payload": to_part(parsed, ""),
+    }
+
+
+def _parse_fields(mask: str) -> dict:
+    """A partial-response mask such as "id,payload(headers,body/data)" as nested dicts, None selects a whole value"""
+    def add(spec: dict, path: str, selection: dict | None):
+        head, _, rest = path.strip().partition("/")
+        if rest:
+            add(spec.setdefault(head, {}), rest, selection)
+        else:
+            spec[head] = selection
+
+    def parse(index: int) -> tuple[dict, int]:
+        spec, name = {}, ""
+        while index < len(mask):
+            char = mask[index]
+            if char == "(":
+                selection, index = parse(index + 1)
+                add(spec, name, selection)
+                name = ""
+                continue
+            if char in ",)":
+                if name.strip():
+                    add(spec, name, None)
+                name = ""
+                if char == ")":
+                    return spec, index + 1
+            else:
+                name += char
+            index += 1
+        if name.strip():
+            add(spec, name, None)
+        return spec, index
+
+    return parse(0)[0]
+
+
+def _select_fields(value, spec: dict | None):
+    if spec is None:
+        return value
+    if isinstance(value, list):
+        return [_select_fields(item, spec) for item in value]
+    if isinstance(value, dict):
+        return {key: _select_fields(value[key], selection) for key, selection in spec.items() if key in value}
+    return value
+
+def _http_error(status: int, message: str, headers: dict | None = None) -> HttpError:
+    response = httplib2.Response({"status": str(status), **(headers or {})})
+    return HttpError(response, json.dumps({"error": {"code": status, "message": message}}).encode())
+
+
+class _FakeRequest:
+    def __init__(self, service: "FakeGmailService", method: str, handler):
+        self._service = service
+        self.method = method
+        self._handler = handler
+
+    def execute(self, *args, **kwargs):
+        self._service._round_trip(self.method)
+        return self._handler()
+
+
+class _FakeBatchRequest:
+    def __init__(self, service: "FakeGmailService", callback):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request: _FakeRequest, callback=None, request_id=None):
+        request_id = request_id or str(len(self._requests))
+        self._requests.append((request_id, request, callback or self._callback))
+
+    def execute(self, *args, **kwargs):
+        # one HTTP round trip carries every queued call
+        self._service._round_trip("batch")
+        for request_id, request, callback in self._requests:
+            self._service.calls[request.method] += 1
+            try:
+                response, exception = request._handler(), None
+            except Exception as error:
+                response, exception = None, error
+            callback(request_id, response, exception)
+
+
+class FakeGmailService:
+    """
+    In-memory Gmail service exposing the subset of the discovery client used by gmail_utils.
+    Each HTTP round trip sleeps for `latency` seconds to model network cost.
+    """
+
+    def __init__(self, messages: list[dict] | None = None, latency: float = 0.0,
+                 send_quota: float | None = None, send_error_rate: float = 0.0, seed: int = 0):
+        self.store = {}
+        # thread id -> message ids in delivery order, sent replies included
+        self.threads_index = {}
+        self.latency = latency
+        self.calls = Counter()
+        self.round_trips = 0
+        # JSON bytes of the messages.get responses, after format and fields are applied
+        self.bytes_fetched = 0
+        self.sent = []
+        self._sent_ids = itertools.count()
+        self._sent_by_message_id = {}
+        # sends allowed per rolling second before answering 429, and share of sends failing with 503
+        self.send_quota = send_quota
+        self.send_error_rate = send_error_rate
+        self.send_errors = Counter()
+        self._send_times = deque()
+        self._rng = random.Random(seed)
+        # mailbox history: one record per change, ids increase monotonically
+        self.history_records = []
+        self.history_id = 1000
+        self.history_floor = self.history_id
+        for message in messages or []:
+            self.add_message(message)
+
+    def add_message(self, message: dict):
+        """Deliver a message to the mailbox, recording a messageAdded history entry."""
+        self.store[message["id"]] = message
+        self.threads_index.setdefault(message["threadId"], []).append(message["id"])
+        self._record_history(message)
+
+    def _record_history(self, message: dict):
+        self.history_id += 1
+        self.history_records.append({
+            "id": str(self.history_id),
+            "messagesAdded": [{"message": {
+                "id": message["id"], "threadId": message["threadId"], "labelIds": list(message["labelIds"])
+            }}],
+        })
+
+    def expire_history(self):
+        """Drop every history record so older startHistoryIds get a 404, as Gmail does after about a week."""
+        self.history_records.clear()
+        self.history_floor = self.history_id
+
+    def resource(self, message_id: str) -> dict:
+        """The stored message as a format=full resource; sent replies are kept as raw RFC 822 until read."""
+        message = self.store[message_id]
+        if "raw" not in message:
+            return message
+        parsed = eml_to_gmail_message(base64.urlsafe_b64decode(message["raw"]), message_id, message["threadId"])
+        return {**parsed, "labelIds": list(message["labelIds"])}
+
+    def _round_trip(self, method: str):
+        self.round_trips += 1
+        self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    # discovery-style resource accessors
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def getProfile(self, userId: str):
+        return _FakeRequest(self, "getProfile", lambda: {"emailAddress": "support@example.com", "historyId": str(self.history_id)})
+
+    def history(self):
+        return _FakeHistory(self)
+
+    def threads(self):
+        return _FakeThreads(self)
+
+    def list(self, userId: str, q: str = "", maxResults: int = 100, pageToken: str | None = None, **kwargs):
+        def _list():
+            if q.startswith("rfc822msgid:"):
+                sent_id = self._sent_by_message_id.get(q[len("rfc822msgid:"):].strip())
+                return {"messages": [{"id": sent_id}]} if sent_id else {}
+            # newest first, like Gmail
+            ids = [message_id for message_id, message in reversed(self.store.items()) if "UNREAD" in message["labelIds"]]
+            start = int(pageToken or 0)
+            page = ids[start:start + maxResults]
+            result = {"messages": [{"id": message_id, "threadId": self.store[message_id]["threadId"]} for message_id in page]}
+            if start + maxResults < len(ids):
+                result["nextPageToken"] = str(start + maxResults)
+            return result
+        return _FakeRequest(self, "list", _list)
+
+    def get(self, userId: str, id: str, format: str = "full", fields: str | None = None,
+            metadataHeaders: "list[str] | None" = None, **kwargs):
+        def _get():
+            message = self.resource(id)
+            if format == "minimal":
+                message = {key: value for key, value in message.items() if key != "payload"}
+            elif format == "metadata":
+                names = {name.lower() for name in metadataHeaders or []}
+                payload = message["payload"]
+                message = {**message, "payload": {
+                    "mimeType": payload.get("mimeType", ""),
+                    "headers": [header for header in payload.get("headers", []) if not names or header["name"].lower() in names],
+                }}
+            if fields:
+                message = _select_fields(message, _parse_fields(fields))
+            self.bytes_fetched += len(json.dumps(message))
+            return message
+        return _FakeRequest(self, "get", _get)
+
+    def batchModify(self, userId: str, body: dict):
+        def _modify():
+            for message_id in body.get("ids", []):
+                labels = self.store[message_id]["labelIds"]
+                for label in body.get("removeLabelIds", []):
+                    if label in labels:
+                        labels.remove(label)
+                labels.extend(body.get("addLabelIds", []))
+            return {}
+        return _FakeRequest(self, "batchModify", _modify)
+
+    def _check_send_quota(self):
+        now = time.monotonic()
+        while self._send_times and now - self._send_times[0] >= 1.0:
+            self._send_times.popleft()
+        if self.send_quota is not None and len(self._send_times) >= self.send_quota:
+            self.send_errors[429] += 1
+            raise _http_error(429, "User-rate limit exceeded", {"retry-after": "1"})
+        if self._rng.random() < self.send_error_rate:
+            self.send_errors[503] += 1
+            raise _http_error(503, "Backend Error")
+        self._send_times.append(now)
+
+    def send(self, userId: str, body: dict):
+        def _send():
+            self._check_send_quota()
+            self.sent.append(body)
+            sent = {"id": f"sent{next(self._sent_ids):06d}", "threadId": body.get("threadId", ""), "labelIds": ["SENT"]}
+            raw = base64.urlsafe_b64decode(body["raw"])
+            self._sent_by_message_id[email.message_from_bytes(raw).get("Message-ID", "")] = sent["id"]
+            # keep the reply in the mailbox so later reads of the thread see it, parsed only when read
+            self.add_message({**sent, "threadId": sent["threadId"] or sent["id"], "raw": body["raw"]})
+            return sent
+        return _FakeRequest(self, "send", _send)
+
+    def new_batch_http_request(self, callback=None):
+        return _FakeBatchRequest(self, callback)
+
+
+class _FakeHistory:
+    """users().history() resource: messageAdded records after startHistoryId, filtered by label."""
+
+    def __init__(self, service: FakeGmailService):
+        self._service = service
+
+    def list(self, userId: str, startHistoryId: str, labelId: str | None = None, maxResults: int = 100,
+             pageToken: str | None = None, historyTypes=None, **kwargs):
+        service = self._service
+
+        def _list():
+            if int(startHistoryId) < service.history_floor:
+                raise _http_error(404, "Not Found")
+            records = [
+                record for record in service.history_records
+                if int(record["id"]) > int(startHistoryId)
+                and (labelId is None or any(labelId in added["message"]["labelIds"] for added in record["messagesAdded"]))
+            ]
+            start = int(pageToken or 0)
+            result = {"history": records[start:start + maxResults], "historyId": str(service.history_id)}
+            if start + maxResults < len(records):
+                result["nextPageToken"] = str(start + maxResults)
+            return result
+        return _FakeRequest(service, "history", _list)
+
+
+class _FakeThreads:
+    """users().threads() resource: a thread's messages in delivery order, with format and fields applied."""
+
+    def __init__(self, service: FakeGmailService):
+        self._service = service
+
+    def get(self, userId: str, id: str, format: str = "full", fields: str | None = None, **kwargs):
+        service = self._service
+
+        def _get():
+            messages = [service.resource(message_id) for message_id in service.threads_index.get(id, [])]
+            if not messages:
+                raise _http_error(404, "Not Found")
+            if format == "minimal":
+                messages = [{key: value for key, value in message.items() if key != "payload"} for message in messages]
+            thread = {"id": id, "historyId": str(service.history_id), "messages": messages}
+            if fields:
+                thread = _select_fields(thread, _parse_fields(fields))
+            service.bytes_fetched += len(json.dumps(thread))
+            return thread
+        return _FakeRequest(service, "threads.get", _get)
+
+
+def install_fake_gmail(service: FakeGmailService):
+    """Route every gmail_utils call to the given fake service."""
+    from src.utils.gmail_service import GmailServiceManager, set_gmail_service_manager
+
+    set_gmail_service_manager(GmailServiceManager(service_factory=lambda: service))
+
+
+_CATEGORY_KEYWORDS = {
+    "product_enquiry": ("precio", "saber", "financiamiento", "disponible"),
+    "customer_complaint": ("molesto", "problema", "reclamo", "descarga"),
+    "customer_feedback": ("gracias", "excelente", "sugerencia"),
+}
+
+_WRITER_CATEGORY = re.compile(r"Original Email Category: (\w+)")
+_WRITER_CONTENT = re.compile(r"Original Email Content: (.*?)\nAdditional context:", re.DOTALL)
+_CATEGORIZER_CONTENT = re.compile(r"EMAIL CONTENT:\n(.*)", re.DOTALL)
+
+
+def _jittered(latency: float, jitter: float, rng: random.Random) -> float:
+    """`latency` scaled by a log-normal factor with sigma `jitter` (median stays at `latency`)."""
+    return latency * rng.lognormvariate(0.0, jitter) if jitter and latency else latency
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), close enough to compare prompt variants."""
+    return max(1, len(text) // 4)
+
+
+def _fake_category(body: str) -> str:
+    body = body.lower()
+    for category, keywords in _CATEGORY_KEYWORDS.items():
+        if any(keyword in body for keyword in keywords):
+            return category
+    return "unrelated"
+
+
+def _content_blocks(content) -> list:
+    return [content] if isinstance(content, str) else list(content)
+
+
+def _block_text(block) -> str:
+    if isinstance(block, str):
+        return block
+    return block.get("text", "") if block.get("type") == "text" else ""
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers with `respond(prompt)` after `latency` seconds (log-normally spread
+    by `jitter`, from a seeded generator) and reports estimated token usage, so callbacks see
+    the same events as with ChatBedrock.
+
+    Like Bedrock, text before a cachePoint block is written to a prompt cache on first use
+    and read from it afterwards (when at least `cache_min_tokens` long); those tokens are
+    reported as cache_creation/cache_read and left out of input_tokens.
+    """
+
+    respond: Callable[[str], AIMessage]
+    # reported as ls_model_name, so cost estimates use this model's prices
+    model: str = "amazon.nova-micro-v1:0"
+    latency: float = 0.0
+    jitter: float = 0.0
+    cache_min_tokens: int = 0
+
+    _prompt_cache: set = PrivateAttr(default_factory=set)
+    _rng: random.Random = PrivateAttr(default_factory=lambda: random.Random(0))
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _result(self, messages: list[BaseMessage]) -> ChatResult:
+        texts, cached_prefix = [], None
+        for message in messages:
+            for block in _content_blocks(message.content):
+                if isinstance(block, dict) and "cachePoint" in block:
+                    cached_prefix = "\n".join(texts)
+                else:
+                    texts.append(_block_text(block))
+        prompt = "\n".join(texts)
+        message = self.respond(prompt)
+        completion = str(message.content) + json.dumps([call["args"] for call in message.tool_calls])
+        input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(completion)
+        cache_read = cache_creation = 0
+        if cached_prefix is not None and estimate_tokens(cached_prefix) >= self.cache_min_tokens:
+            key = hash(cached_prefix)
+            if key in self._prompt_cache:
+                cache_read = estimate_tokens(cached_prefix)
+            else:
+                cache_creation = estimate_tokens(cached_prefix)
+                self._prompt_cache.add(key)
+            input_tokens -= cache_read + cache_creation
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens + cache_read + cache_creation,
+            "input_token_details": {"cache_read": cache_read, "cache_creation": cache_creation},
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(_jittered(self.latency, self.jitter, self._rng))
+        return self._result(messages)
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(_jittered(self.latency, self.jitter, self._rng))
+        return self._result(messages)
+
+
+def _categorize(prompt: str) -> AIMessage:
+    match = _CATEGORIZER_CONTENT.search(prompt)
+    return AIMessage(content=json.dumps({"category": _fake_category(match.group(1) if match else prompt)}))
+
+
+def _query_or_email(prompt: str) -> AIMessage:
+    from src.structured_outputs import RAG_CATEGORIES
+    from src.utils.rag_utils import get_retriever_tool
+
+    category = _WRITER_CATEGORY.search(prompt).group(1)
+    if category in RAG_CATEGORIES:
+        content = _WRITER_CONTENT.search(prompt).group(1).strip()
+        tool_call = {"name": get_retriever_tool().name, "args": {"query": content}, "id": f"call_{zlib.crc32(content.encode())}"}
+        return AIMessage(content="", tool_calls=[tool_call])
+    return AIMessage(content=f"Estimado cliente, gracias por escribirnos sobre {category}.")
+
+
+def _write_email(prompt: str) -> AIMessage:
+    category = _WRITER_CATEGORY.search(prompt).group(1)
+    return AIMessage(content=json.dumps({
+        "subject": "Re: Consulta",
+        "sender": "Cellfone SA <eedani116@gmail.com>",
+        "date": "",
+        "body": f"Estimado cliente, gracias por escribirnos. Respuesta para {category}.",
+    }))
+
+
+def fake_agent_registry(latency: float = 0.0, prompts: dict | None = None, cache_min_tokens: int = 0, jitter: float = 0.0) -> dict:
+    """
+    AGENT_REGISTRY replacements built from the real prompts and a FakeChatModel, so prompt sizes
+    and token accounting match production. Each LLM call waits about `latency` seconds. `prompts` can
+    override the "categorizer" and "writer" prompt templates, by default the cached chat prompts.
+    """
+    from src.agents.prompt_cache import build_chat_prompt
+    from src.prompts import (
+        EMAIL_CATEGORIZER_HUMAN_PROMPT,
+        EMAIL_CATEGORIZER_SYSTEM_PROMPT,
+        EMAIL_WRITER_HUMAN_PROMPT,
+        EMAIL_WRITER_SYSTEM_PROMPT,
+    )
+    from src.state import Email
+    from src.structured_outputs import CategorizerEmailOutput
+
+    prompts = {
+        "categorizer": build_chat_prompt(EMAIL_CATEGORIZER_SYSTEM_PROMPT, EMAIL_CATEGORIZER_HUMAN_PROMPT, cache=True),
+        "writer": build_chat_prompt(EMAIL_WRITER_SYSTEM_PROMPT, EMAIL_WRITER_HUMAN_PROMPT, cache=True),
+        **(prompts or {}),
+    }
+
+    def model(respond, model_id: str):
+        return FakeChatModel(respond=respond, model=model_id, latency=latency, jitter=jitter, cache_min_tokens=cache_min_tokens)
+
+    writer_model = os.getenv("LLM_WRITER") or "us.amazon.nova-2-lite-v1:0"
+    return {
+        "email_categorizer": prompts["categorizer"]
+        | model(_categorize, os.getenv("LLM_CATEGORIZER") or "us.amazon.nova-micro-v1:0")
+        | RunnableLambda(lambda message: CategorizerEmailOutput.model_validate_json(message.content)),
+        "query_or_email": prompts["writer"] | model(_query_or_email, writer_model),
+        "email_writer_with_context": prompts["writer"]
+        | model(_write_email, writer_model)
+        | RunnableLambda(lambda message: Email.model_validate_json(message.content)),
+    }
+
+
+def install_fake_agents(latency: float = 0.0, jitter: float = 0.0):
+    """Inject fakes into AGENT_REGISTRY before any Bedrock-backed chain gets built."""
+    from src.agents import AGENT_REGISTRY
+
+    AGENT_REGISTRY.update(fake_agent_registry(latency, jitter=jitter))
+
+
+class FakeBatchInference:
+    """
+    Stand-in for both the Bedrock control-plane client and S3 as used by BatchInferenceJob. A job
+    stays InProgress for `startup` seconds plus `records_per_second` throughput, then its output
+    JSONL is written with the same fake answers the agents give on demand.
+    """
+
+    def __init__(self, startup: float = 0.0, records_per_second: float = 1000.0, error_rate: float = 0.0, seed: int = 0):
+        self.startup = startup
+        self.records_per_second = records_per_second
+        self.error_rate = error_rate
+        self.objects: dict[tuple[str, str], bytes] = {}
+        self.jobs: dict[str, dict] = {}
+        self.calls = Counter()
+        self._rng = random.Random(seed)
+        self._ids = itertools.count(1)
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs):
+        self.calls["put_object"] += 1
+        self.objects[(Bucket, Key)] = Body
+        return {}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs):
+        self.calls["get_object"] += 1
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    @staticmethod
+    def _split(uri: str) -> tuple[str, str]:
+        bucket, _, key = uri[len("s3://"):].partition("/")
+        return bucket, key
+
+    def create_model_invocation_job(self, jobName: str, roleArn: str, modelId: str, inputDataConfig: dict, outputDataConfig: dict, **kwargs):
+        self.calls["create_model_invocation_job"] += 1
+        job_id = f"job{next(self._ids):06d}"
+        job_arn = f"arn:aws:bedrock:us-east-1:000000000000:model-invocation-job/{job_id}"
+        records = self.objects[self._split(inputDataConfig["s3InputDataConfig"]["s3Uri"])].decode("utf-8").splitlines()
+        self.jobs[job_arn] = {
+            "input": inputDataConfig["s3InputDataConfig"]["s3Uri"],
+            "output": outputDataConfig["s3OutputDataConfig"]["s3Uri"],
+            "records": len(records),
+            "done_at": time.monotonic() + self.startup + len(records) / self.records_per_second,
+            "status": "InProgress",
+        }
+        return {"jobArn": job_arn}
+
+    def get_model_invocation_job(self, jobIdentifier: str, **kwargs):
+        self.calls["get_model_invocation_job"] += 1
+        job = self.jobs[jobIdentifier]
+        if job["status"] == "InProgress" and time.monotonic() >= job["done_at"]:
+            self._complete(jobIdentifier, job)
+        return {"jobArn": jobIdentifier, "status": job["status"]}
+
+    def stop_model_invocation_job(self, jobIdentifier: str, **kwargs):
+        self.jobs[jobIdentifier]["status"] = "Stopped"
+        return {}
+
+    def _complete(self, job_arn: str, job: dict):
+        input_bucket, input_key = self._split(job["input"])
+        output_bucket, output_prefix = self._split(job["output"])
+        lines = []
+        for line in self.objects[(input_bucket, input_key)].decode("utf-8").splitlines():
+            record = json.loads(line)
+            model_input = record["modelInput"]
+            prompt = "\n".join([block["text"] for block in model_input["system"]]
+                               + [block["text"] for block in model_input["messages"][0]["content"]])
+            if self._rng.random() < self.error_rate:
+                record["error"] = {"errorCode": 500, "errorMessage": "Internal server error"}
+            else:
+                message = _write_email(prompt) if _WRITER_CATEGORY.search(prompt) else _categorize(prompt)
+                record["modelOutput"] = {
+                    "output": {"message": {"role": "assistant", "content": [{"text": message.content}]}},
+                    "stopReason": "end_turn",
+                    "usage": {"inputTokens": estimate_tokens(prompt), "outputTokens": estimate_tokens(str(message.content))},
+                }
+            lines.append(json.dumps(record, ensure_ascii=False))
+        name = os.path.basename(input_key)
+        job_id = job_arn.rsplit("/", 1)[-1]
+        self.objects[(output_bucket, f"{output_prefix.rstrip('/')}/{job_id}/{name}.out")] = "\n".join(lines).encode("utf-8")
+        job["status"] = "Completed"
+
+
+def install_fake_batch_inference(startup: float = 0.0, records_per_second: float = 1000.0, error_rate: float = 0.0) -> FakeBatchInference:
+    """Run batch inference jobs against a FakeBatchInference, polling every 10 ms."""
+    from src.agents.batch_inference import BatchInferenceJob, set_batch_inference_job
+
+    fake = FakeBatchInference(startup=startup, records_per_second=records_per_second, error_rate=error_rate)
+    set_batch_inference_job(BatchInferenceJob(
+        s3_uri="s3://fake-batch-bucket/backlog",
+        role_arn="arn:aws:iam::000000000000:role/fake-batch-inference",
+        client=fake,
+        s3=fake,
+        poll_interval=0.01
+    ))
+    return fake
+
+
+def load_corpus_documents() -> list[Document]:
+    """Split the knowledge-base source files in src/data into paragraph documents."""
+    documents = []
+    for name in sorted(os.listdir(DATA_DIR)):
+        with open(os.path.join(DATA_DIR, name), encoding="utf-8") as source:
+            for chunk in source.read().split("\n\n"):
+                if chunk.strip():
+                    documents.append(Document(page_content=chunk.strip(), metadata={"source": name}))
+    return documents
+
+
+class FakeRetriever(BaseRetriever):
+    """Local stand-in for AmazonKnowledgeBasesRetriever: word-overlap ranking plus simulated latency."""
+
+    documents: list[Document] = []
+    latency: float = 0.0
+    jitter: float = 0.0
+    k: int = 4
+    calls: int = 0
+
+    _rng: random.Random = PrivateAttr(default_factory=lambda: random.Random(1))
+
+    def model_post_init(self, context):
+        if not self.documents:
+            self.documents = load_corpus_documents()
+
+    def _rank(self, query: str) -> list[Document]:
+        words = set(query.lower().split())
+        scored = [(len(words & set(document.page_content.lower().split())), document) for document in self.documents]
+        return [document for score, document in sorted(scored, key=lambda item: -item[0])[:self.k] if score]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(_jittered(self.latency, self.jitter, self._rng))
+        return self._rank(query)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> list[Document]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(_jittered(self.latency, self.jitter, self._rng))
+        return self._rank(query)
+
+
+def install_fake_retriever(latency: float = 0.0, jitter: float = 0.0) -> FakeRetriever:
+    """Use a FakeRetriever as retrieval backend; build graphs after calling this."""
+    from src.utils.rag_utils import set_retriever
+
+    retriever = FakeRetriever(latency=latency, jitter=jitter)
+    set_retriever(retriever)
+    return retriever
+
+
+def install_fake_outbox():
+    """Queue replies in an in-memory outbox without send-rate limiting."""
+    from src.utils.outbox import OutboxSender, OutboxStore, set_outbox_sender
+
+    sender = OutboxSender(OutboxStore(":memory:"))
+    set_outbox_sender(sender)
+    return sender
+
+
+def install_fakes(llm_latency: float = 0.0, gmail_latency: float = 0.0, retriever_latency: float = 0.0, jitter: float = 0.0):
+    """Install fake agents, Gmail service, outbox and retriever; returns (gmail_service, retriever)."""
+    install_fake_agents(latency=llm_latency, jitter=jitter)
+    service = FakeGmailService(latency=gmail_latency)
+    install_fake_gmail(service)
+    install_fake_outbox()
+    return service, install_fake_retriever(latency=retriever_latency, jitter=jitter)
@@ -0,0 +1,63 @@
+"""
+Cost of rebuilding the Gmail client on every call versus the cached GmailServiceManager.
+Runs fully offline with a throwaway, non-expired token file.
+
+    python -m benchmarks.gmail_service --calls 200 --threads 8
+"""
+import argparse
+import datetime
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+from src.utils.gmail_service import SCOPES, GmailServiceManager
+
+
+def _write_token(directory: str) -> str:
+    expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    token_path = os.path.join(directory, "token.json")
+    with open(token_path, "w") as token:
+        json.dump({
+            "token": "offline-benchmark-token",
+            "refresh_token": "offline-benchmark-refresh",
+            "client_id": "benchmark",
+            "client_secret": "benchmark",
+            "scopes": SCOPES,
+            "expiry": expiry.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        }, token)
+    return token_path
+
+
+def _rebuild_per_call(token_path: str):
+    creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+    return build("gmail", "v1", credentials=creds)
+
+
+def _timed(label: str, calls: int, threads: int, fn):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: fn(), range(calls)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:>16}: {calls} calls in {elapsed:.3f}s ({elapsed / calls * 1000:.3f} ms/call)")
+
+
+def run(calls: int, threads: int):
+    with tempfile.TemporaryDirectory() as directory:
+        token_path = _write_token(directory)
+        _timed("rebuild per call", calls, threads, lambda: _rebuild_per_call(token_path))
+        manager = GmailServiceManager(token_path=token_path)
+        _timed("managed", calls, threads, manager.get_service)
+        print(f"manager counters: {dict(manager.stats)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    run(calls=args.calls, threads=args.threads)
@@ -0,0 +1,153 @@
+"""
+Replay bursty mail arrival against a fake Gmail mailbox and compare the listeners:
+date-query polling (get_most_recent_email), unread-query polling with batch fetch, and the
+history.list listener with a persisted checkpoint. Halfway through, the history listener is
+restarted from its store and the mailbox history is expired to exercise the full-sync path.
+Finally the single-email graph answers a few emails, one of them failing once, and a listener
+pass after the claim timeout must not deliver an answered email again.
+
+    python -m benchmarks.history_listener --polls 200 --existing 2000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+from src.utils.gmail_history import HistoryListener, HistoryStore
+from src.utils.gmail_utils import get_most_recent_email, get_unprocessed_emails, mark_emails_as_processed
+from .fakes import FakeGmailService, install_fake_gmail, make_gmail_message
+
+
+def _mailbox(existing: int) -> FakeGmailService:
+    # old mail that has already been answered (read)
+    return FakeGmailService(messages=[dict(make_gmail_message(index), labelIds=["INBOX"]) for index in range(existing)])
+
+
+def _replay(service: FakeGmailService, polls: int, seed: int, poll_once, on_halfway=None) -> dict:
+    rng = random.Random(seed)
+    next_index = len(service.store)
+    arrived, delivered = [], Counter()
+    for poll in range(polls):
+        if poll == polls // 2 and on_halfway:
+            on_halfway()
+        # bursty arrivals: most polls see nothing, some see several emails at once
+        for _ in range(rng.choice((0, 0, 0, 1, 1, 2, 5))):
+            message = make_gmail_message(next_index)
+            service.add_message(message)
+            arrived.append(message["id"])
+            next_index += 1
+        for email in poll_once():
+            delivered[email.id] += 1
+    return {
+        "arrived": len(arrived),
+        "answered": sum(1 for message_id in arrived if delivered[message_id]),
+        "duplicates": sum(count - 1 for count in delivered.values()),
+        "missed": sum(1 for message_id in arrived if not delivered[message_id]),
+        "round_trips": service.round_trips,
+        "calls": dict(service.calls),
+    }
+
+
+def run(polls: int, existing: int, seed: int):
+    results = {}
+
+    service = _mailbox(existing)
+    install_fake_gmail(service)
+    service.round_trips, service.calls = 0, Counter()
+
+    def _date_query():
+        email = get_most_recent_email()
+        return [email] if email else []
+    results["date query"] = _replay(service, polls, seed, _date_query)
+
+    service = _mailbox(existing)
+    service.round_trips, service.calls = 0, Counter()
+
+    def _unread_query():
+        emails = get_unprocessed_emails(service=service)
+        mark_emails_as_processed([email.id for email in emails], service=service)
+        return emails
+    results["unread query"] = _replay(service, polls, seed, _unread_query)
+
+    with tempfile.TemporaryDirectory() as directory:
+        service = _mailbox(existing)
+        store_path = os.path.join(directory, "history.sqlite")
+        listener = HistoryListener(HistoryStore(store_path), service=service)
+        # bootstrap before the replay, like a deployment that has been running
+        listener.poll()
+        service.round_trips, service.calls = 0, Counter()
+        listeners = [listener]
+
+        def _restart():
+            service.expire_history()
+            listeners.append(HistoryListener(HistoryStore(store_path), service=service))
+        results["history"] = _replay(service, polls, seed, lambda: listeners[-1].poll(), on_halfway=_restart)
+
+    print(f"{polls} polls, {existing} messages already in the mailbox")
+    print(f"{'listener':>13}{'arrived':>9}{'answered':>10}{'duplicates':>12}{'missed':>8}{'round trips':>13}")
+    for name, result in results.items():
+        print(f"{name:>13}{result['arrived']:>9}{result['answered']:>10}{result['duplicates']:>12}"
+              f"{result['missed']:>8}{result['round_trips']:>13}")
+    for name, result in results.items():
+        print(f"{name:>13}: {result['calls']}")
+    for use_async in (False, True):
+        _check_single_email_claims(use_async)
+
+
+def _check_single_email_claims(use_async: bool, emails: int = 3, claim_timeout: float = 0.2):
+    """Every email answered once by the single-email graph, the one whose writer call failed delivered again"""
+    from langchain_core.runnables import RunnableLambda
+    from src.agents import AGENT_REGISTRY
+    from src.graph.email_graph import EmailSupportGraph
+    from src.utils.gmail_history import set_history_listener
+    from .fakes import fake_agent_registry, install_fakes
+
+    service, _ = install_fakes()
+    for index in range(emails):
+        service.add_message(make_gmail_message(index))
+    writer, writes = fake_agent_registry()["email_writer_with_context"], Counter()
+
+    def _write(inputs):
+        writes["calls"] += 1
+        if writes["calls"] == 2:
+            raise RuntimeError("writer unavailable")
+        return writer.invoke(inputs)
+    AGENT_REGISTRY.update({"email_writer_with_context": RunnableLambda(_write)})
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = HistoryStore(os.path.join(directory, "history.sqlite"), claim_timeout=claim_timeout)
+        listener = HistoryListener(store, service=service)
+        set_history_listener(listener)
+        graph = EmailSupportGraph(use_async=use_async, checkpointer="none").graph
+        answered, failed = Counter(), 0
+        try:
+            # more runs than emails, each after the claim timeout of the previous one
+            for _ in range(emails * 2):
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        state = asyncio.run(graph.ainvoke({"messages": []})) if use_async else graph.invoke({"messages": []})
+                    if state["current_email"]:
+                        answered[state["current_email"].id] += 1
+                except RuntimeError:
+                    failed += 1
+                time.sleep(claim_timeout * 1.5)
+            redelivered = listener.poll()
+        finally:
+            set_history_listener(None)
+        print(f"\n{'async' if use_async else 'sync'} single-email graph: answered {dict(answered)}, {failed} failed, {writes['calls']} writer calls, "
+              f"claims {store.status_counts(listener.mailbox)}, delivered again after the timeout: {len(redelivered)}")
+        assert len(answered) == emails and set(answered.values()) == {1} and not redelivered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--polls", type=int, default=200)
+    parser.add_argument("--existing", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    run(polls=args.polls, existing=args.existing, seed=args.seed)
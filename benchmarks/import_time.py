@@ -0,0 +1,71 @@
+"""
+Cold-start cost of importing main (which builds EmailSupportGraph), measured with
+`python -X importtime`. Optionally compares against another git revision of the tree.
+
+    python -m benchmarks.import_time --runs 5 --compare-ref HEAD~1
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# older revisions build Bedrock clients at import and need these to be set (no network is used)
+OFFLINE_ENV = {
+    "AWS_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "benchmark",
+    "AWS_SECRET_ACCESS_KEY": "benchmark",
+    "LLM_WRITER": "us.amazon.nova-lite-v1:0",
+    "LLM_CATEGORIZER": "us.amazon.nova-micro-v1:0",
+}
+
+
+def _import_once(tree: str) -> tuple[float, float, list[tuple[int, str]]]:
+    """Returns wall seconds, cumulative import microseconds of main, and per-module self times"""
+    env = {**os.environ, **{key: os.environ.get(key, value) for key, value in OFFLINE_ENV.items()}}
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=tree, env=env, capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - start
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        modules.append((int(self_us), int(cumulative_us), name))
+    main_cumulative = next(cumulative for _, cumulative, name in reversed(modules) if name == "main")
+    return wall, main_cumulative / 1e6, [(self_us, name) for self_us, _, name in modules]
+
+
+def _measure(label: str, tree: str, runs: int, top: int):
+    samples = [_import_once(tree) for _ in range(runs)]
+    wall = statistics.median(sample[0] for sample in samples)
+    imports = statistics.median(sample[1] for sample in samples)
+    print(f"{label:>12}: import main {imports * 1000:7.1f} ms (median of {runs}), process wall {wall * 1000:7.1f} ms")
+    if top:
+        for self_us, name in sorted(samples[-1][2], reverse=True)[:top]:
+            print(f"{'':>14}{self_us / 1000:7.1f} ms  {name.strip()}")
+
+
+def run(runs: int, compare_ref: str | None, top: int):
+    if compare_ref:
+        with tempfile.TemporaryDirectory() as tree:
+            archive = subprocess.run(["git", "archive", compare_ref], cwd=ROOT, capture_output=True, check=True)
+            subprocess.run(["tar", "-x", "-C", tree], input=archive.stdout, check=True)
+            _measure(compare_ref, tree, runs, top)
+    _measure("working tree", ROOT, runs, top)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--compare-ref", help="git revision to compare against, e.g. HEAD~1")
+    parser.add_argument("--top", type=int, default=8, help="show the slowest modules by self time")
+    args = parser.parse_args()
+    run(runs=args.runs, compare_ref=args.compare_ref, top=args.top)
@@ -0,0 +1,150 @@
+"""
+What the metrics layer reports for a run and what it costs: answers emails through the per-email
+workflow with fake LLMs, retriever and Gmail, prints the latency percentiles, tokens and estimated
+cost per node, one email's span tree and the size of the Prometheus exposition, then repeats the
+run without latency with metrics and tracing off, metrics only, and both, to measure the overhead,
+and prices one instrumented call on its own.
+
+    python -m benchmarks.instrumentation --emails 100 --llm-latency 0.05 --rounds 5
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import time
+import uuid
+
+from src.utils.gmail_utils import _parse_email_message
+from src.utils.metrics import MetricsRegistry, set_metrics
+from src.utils.tracing import InMemorySpanExporter, Tracer, set_tracer
+from .fakes import install_fakes, make_gmail_message
+
+os.environ["PRECLASSIFIER_ENABLED"] = "false"
+
+
+def _answer(emails, writer_mode: str) -> list[float]:
+    from src.graph.email_graph import EmailSupportGraph
+    from src.utils.cache import set_categorization_cache
+
+    set_categorization_cache(None)
+    graph = EmailSupportGraph(batch=True, writer_mode=writer_mode, checkpointer="none")
+    durations = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for email in emails:
+            start = time.perf_counter()
+            graph.process_email(email, defer_send=True)
+            durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def _print_trace(exporter: InMemorySpanExporter):
+    spans = exporter.spans()
+    root = next(span for span in reversed(spans) if span.name == "email")
+    trace = sorted(exporter.spans(root.trace_id), key=lambda span: span.start)
+    children: dict[str | None, list] = {}
+    for span in trace:
+        children.setdefault(span.parent_id, []).append(span)
+
+    def walk(span, depth: int):
+        print(f"{'  ' * depth}{span.name:<{48 - 2 * depth}}{span.duration_ms:>8.1f} ms  {span.status}")
+        for child in children.get(span.span_id, []):
+            walk(child, depth + 1)
+
+    print(f"\nspans of email {root.attributes['email_id']}:")
+    walk(root, 0)
+
+
+def run(emails: int, llm_latency: float, writer_mode: str, rounds: int):
+    batch = [_parse_email_message(make_gmail_message(index)) for index in range(emails)]
+
+    install_fakes(llm_latency=llm_latency, retriever_latency=llm_latency / 5)
+    registry, exporter = MetricsRegistry(), InMemorySpanExporter()
+    set_metrics(registry)
+    set_tracer(Tracer(exporter))
+    _answer(batch, writer_mode)
+    from src.utils.instrumentation import metrics_report
+    print(metrics_report())
+    _print_trace(exporter)
+    exposition = registry.to_prometheus()
+    print(f"\nprometheus exposition: {len(exposition.splitlines())} lines, {len(exposition) / 1024:.1f} KiB; "
+          f"{len(exporter.spans())} spans kept")
+
+    install_fakes()
+    # the modes take turns, so drift in machine load hits all of them alike; medians over the rounds
+    modes = {"off": (False, False), "metrics": (True, False), "metrics+traces": (True, True)}
+    means: dict[str, list[float]] = {mode: [] for mode in modes}
+    _answer(batch[:10], writer_mode)
+    for _ in range(rounds):
+        for mode, (metrics, traces) in modes.items():
+            set_metrics(MetricsRegistry(enabled=metrics))
+            set_tracer(Tracer(InMemorySpanExporter() if traces else None))
+            means[mode].append(statistics.mean(_answer(batch, writer_mode)))
+    baseline = statistics.median(means["off"])
+    print(f"\n{'instrumentation':>16}{'ms/email':>10}{'overhead':>10}{'stdev':>8}   (median of {rounds} rounds)")
+    for mode, values in means.items():
+        median = statistics.median(values)
+        print(f"{mode:>16}{median:>10.2f}{median - baseline:>+10.2f}{statistics.stdev(values) if rounds > 1 else 0.0:>8.2f}")
+
+    # the end-to-end difference is within the run-to-run noise, so also price the instrumentation directly:
+    # calls per email, from the spans of the first run, times what one call costs
+    spans = exporter.spans()
+    requests = sum(span.name.startswith(("llm.", "retriever.")) for span in spans) / emails
+    wrapped = len(spans) / emails - requests
+    print(f"\nper email: {wrapped:.1f} timed() calls, {requests:.1f} LLM requests and retrievals")
+    for mode, (metrics, traces) in list(modes.items())[1:]:
+        call, request = _call_cost(metrics, traces), _request_cost(metrics, traces)
+        print(f"{mode:>16}{call:>7.1f} us/call{request:>7.1f} us/request"
+              f"{(wrapped * call + requests * request) / 1000:>8.3f} ms/email")
+
+
+def _use(metrics: bool, traces: bool):
+    set_metrics(MetricsRegistry(enabled=metrics))
+    set_tracer(Tracer(InMemorySpanExporter() if traces else None))
+
+
+def _call_cost(metrics: bool, traces: bool, calls: int = 100_000) -> float:
+    """Microseconds a timed() wrapper adds to a call, over an uninstrumented call"""
+    from src.utils.instrumentation import timed
+
+    def noop():
+        return None
+
+    wrapped = timed("node", node="noop")(noop)
+    _use(metrics, traces)
+    timings = []
+    for func in (noop, wrapped):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        timings.append((time.perf_counter() - start) / calls * 1e6)
+    return timings[1] - timings[0]
+
+
+def _request_cost(metrics: bool, traces: bool, requests: int = 20_000) -> float:
+    """Microseconds the metrics callback handler spends on one LLM request, tokens and cost included"""
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, LLMResult
+    from src.utils.instrumentation import MetricsCallbackHandler
+
+    handler = MetricsCallbackHandler()
+    usage = {"input_tokens": 900, "output_tokens": 150, "total_tokens": 1050, "input_token_details": {"cache_read": 600}}
+    response = LLMResult(generations=[[ChatGeneration(message=AIMessage(content="", usage_metadata=usage))]]) # type: ignore
+    metadata = {"langgraph_node": "write_email_with_context", "ls_model_name": "us.amazon.nova-lite-v1:0"}
+    run_ids = [uuid.uuid4() for _ in range(requests)]
+    _use(metrics, traces)
+    start = time.perf_counter()
+    for run_id in run_ids:
+        handler.on_chat_model_start({}, [], run_id=run_id, tags=["agent:email_writer_with_context"], metadata=metadata)
+        handler.on_llm_end(response, run_id=run_id)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=100)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--writer-mode", choices=("two_pass", "single_pass"), default="two_pass")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    run(emails=args.emails, llm_latency=args.llm_latency, writer_mode=args.writer_mode, rounds=args.rounds)
@@ -0,0 +1,114 @@
+"""
+Body extraction over the MIME fixtures in benchmarks/data/mime (Gmail, Outlook, Apple Mail and
+iPhone replies, newsletters, latin-1 quoted-printable, bounces, invites, nested attachments),
+served by the fake Gmail service as format=full resources. For every fixture: bytes fetched with
+and without the MESSAGE_FIELDS mask, the body the previous top-level-only parser produced, the
+body the MIME walk finds, and what is left after stripping quotes and signatures, in characters
+and estimated prompt tokens. Then parse time per message for both parsers.
+
+    python -m benchmarks.mime_parsing --repeat 200
+"""
+import argparse
+import base64
+import glob
+import os
+import statistics
+import time
+
+from src.utils.gmail_utils import get_unprocessed_emails
+from src.utils.mime import MESSAGE_FIELDS, extract_body, strip_quoted_text
+from .fakes import FakeGmailService, eml_to_gmail_message, estimate_tokens
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "mime")
+
+
+def legacy_body(message: dict) -> str:
+    """The body as _parse_email_message extracted it before: a top-level text/plain part, decoded as UTF-8"""
+    payload = message.get("payload", {})
+    body = ""
+    if "parts" in payload:
+        for part in payload["parts"]:
+            if part.get("mimeType") == "text/plain":
+                body = part.get("body", {}).get("data", "")
+                break
+    else:
+        body = payload.get("body", {}).get("data", "")
+    if body:
+        try:
+            body = base64.urlsafe_b64decode(body).decode("utf-8")
+        except Exception:
+            body = ""
+    return body
+
+
+def _fetched_bytes(service: FakeGmailService, message_id: str, **kwargs) -> int:
+    before = service.bytes_fetched
+    service.users().messages().get(userId="me", id=message_id, **kwargs).execute()
+    return service.bytes_fetched - before
+
+
+def _parse_us(parse, messages: list[dict], repeat: int) -> float:
+    for message in messages:
+        parse(message)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            parse(message)
+    return (time.perf_counter() - start) / (repeat * len(messages)) * 1e6
+
+
+def run(repeat: int):
+    paths = sorted(glob.glob(os.path.join(FIXTURES, "*.eml")))
+    service = FakeGmailService()
+    messages = []
+    for index, path in enumerate(paths):
+        with open(path, "rb") as fixture:
+            message = eml_to_gmail_message(fixture.read(), f"mime{index:03d}")
+        service.add_message(message)
+        messages.append(message)
+
+    print(f"{'fixture':<36}{'full KiB':>9}{'mask KiB':>9}{'legacy':>8}{'walk':>7}{'stripped':>9}{'tokens':>14}")
+    totals = {"full": 0, "masked": 0, "legacy_empty": 0, "legacy_tokens": 0, "tokens": 0}
+    for path, message in zip(paths, messages):
+        full = _fetched_bytes(service, message["id"])
+        masked = _fetched_bytes(service, message["id"], format="full", fields=MESSAGE_FIELDS)
+        legacy, walked = legacy_body(message), extract_body(message["payload"])
+        stripped = strip_quoted_text(walked)
+        totals["full"] += full
+        totals["masked"] += masked
+        totals["legacy_empty"] += not legacy.strip()
+        totals["legacy_tokens"] += estimate_tokens(legacy) if legacy else 0
+        totals["tokens"] += estimate_tokens(stripped)
+        tokens = f"{estimate_tokens(walked)} -> {estimate_tokens(stripped)}"
+        print(
+            f"{os.path.basename(path)[:35]:<36}{full / 1024:>9.1f}{masked / 1024:>9.1f}{len(legacy):>8}"
+            f"{len(walked):>7}{len(stripped):>9}{tokens:>14}"
+        )
+
+    print(
+        f"\n{len(messages)} messages: {totals['full'] / 1024:.1f} KiB fetched with format=full, "
+        f"{totals['masked'] / 1024:.1f} KiB with the fields mask ({1 - totals['masked'] / totals['full']:.0%} less)"
+    )
+    print(
+        f"legacy parser: {totals['legacy_empty']} empty bodies, {totals['legacy_tokens']} body tokens; "
+        f"MIME walk + stripping: {sum(not extract_body(message['payload']).strip() for message in messages)} empty, "
+        f"{totals['tokens']} body tokens sent to each LLM call"
+    )
+
+    masked_messages = [service.users().messages().get(userId="me", id=message["id"], fields=MESSAGE_FIELDS).execute() for message in messages]
+    legacy_us = _parse_us(legacy_body, masked_messages, repeat)
+    walk_us = _parse_us(lambda message: extract_body(message["payload"]), masked_messages, repeat)
+    strip_us = _parse_us(lambda message: strip_quoted_text(extract_body(message["payload"])), masked_messages, repeat)
+    print(f"parse time per message: legacy {legacy_us:.1f} us, MIME walk {walk_us:.1f} us, walk + stripping {strip_us:.1f} us")
+
+    service.bytes_fetched = 0
+    emails = get_unprocessed_emails(service=service)
+    print(f"get_unprocessed_emails: {len(emails)} emails, {service.bytes_fetched / 1024:.1f} KiB of message resources")
+    print(f"median body length after stripping: {statistics.median(len(email.body) for email in emails):.0f} chars")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="passes over the fixtures when timing the parsers")
+    args = parser.parse_args()
+    run(repeat=args.repeat)
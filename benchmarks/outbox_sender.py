@@ -0,0 +1,102 @@
+"""
+Send replies through a stub Gmail transport that answers 429 above a per-second quota and
+fails a share of sends with 503. Compares the old direct send_reply_email loop with the
+outbox sender with and without the token bucket, then replays a crash mid-send to check
+that recovery neither loses nor duplicates replies.
+
+    python -m benchmarks.outbox_sender --replies 150 --quota 25 --error-rate 0.05
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+
+from src.state import Email
+from src.utils.gmail_utils import _parse_email_message, send_reply_email
+from src.utils.outbox import OutboxSender, OutboxStore, TokenBucket
+from .fakes import FakeGmailService, install_fake_gmail, make_gmail_message
+
+
+def _replies(count: int) -> list[tuple[Email, Email]]:
+    reply = Email(subject="Re: Consulta", sender="Cellfone SA <eedani116@gmail.com>", date="", body="Gracias por escribirnos.")
+    return [(_parse_email_message(make_gmail_message(index)), reply) for index in range(count)]
+
+
+def _report(name: str, replies: int, service: FakeGmailService, elapsed: float, extra: str = ""):
+    delivered = len(service._sent_by_message_id)
+    duplicates = len(service.sent) - delivered
+    print(f"{name:>22}: {delivered}/{replies} sent, {replies - delivered} lost, {duplicates} duplicates, "
+          f"{dict(service.send_errors)} errors, {elapsed:.2f}s ({delivered / elapsed:.1f} sends/s){extra}")
+
+
+def _direct(replies, service):
+    install_fake_gmail(service)
+    for original, reply in replies:
+        send_reply_email(original_email=original, reply_email=reply)
+
+
+def _outbox(replies, service, directory: str, rate: float | None, burst: float) -> OutboxSender:
+    sender = OutboxSender(
+        OutboxStore(os.path.join(directory, f"outbox-{rate}.sqlite")),
+        bucket=TokenBucket(rate=rate, capacity=burst),
+        service=service,
+        base_delay=0.1,
+        max_delay=2.0,
+        max_attempts=10,
+        rng=random.Random(0)
+    )
+    for original, reply in replies:
+        sender.enqueue(original_email=original, reply_email=reply)
+    sender.flush(wait=True)
+    return sender
+
+
+def _crash_and_recover(replies, directory: str, quota: float):
+    """Claim a batch, send half of it and die before recording anything, then restart"""
+    service = FakeGmailService(send_quota=quota)
+    path = os.path.join(directory, "outbox-crash.sqlite")
+    sender = OutboxSender(OutboxStore(path), service=service)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for original, reply in replies:
+            sender.enqueue(original_email=original, reply_email=reply)
+    claimed = sender.store.claim_due(limit=20)
+    for item in claimed[:10]:
+        service.users().messages().send(userId="me", body=item.payload).execute()
+
+    restarted = OutboxSender(OutboxStore(path), bucket=TokenBucket(rate=quota * 0.9, capacity=quota / 2), service=service)
+    start = time.perf_counter()
+    restarted.flush(wait=True)
+    _report("crash + restart", len(replies), service, time.perf_counter() - start,
+            f", {restarted.stats['recovered']:.0f} in-flight reconciled")
+
+
+def run(replies: int, quota: float, error_rate: float):
+    batch = _replies(replies)
+    with tempfile.TemporaryDirectory() as directory:
+        service = FakeGmailService(send_quota=quota, send_error_rate=error_rate)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            _direct(batch, service)
+        _report("direct send", replies, service, time.perf_counter() - start)
+
+        for name, rate in (("outbox, backoff only", None), ("outbox + token bucket", quota * 0.9)):
+            service = FakeGmailService(send_quota=quota, send_error_rate=error_rate)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                sender = _outbox(batch, service, directory, rate=rate, burst=quota / 2)
+            _report(name, replies, service, time.perf_counter() - start,
+                    f", {sender.stats['retried']:.0f} retries, {sender.store.status_counts()}")
+
+        _crash_and_recover(batch, directory, quota)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replies", type=int, default=150)
+    parser.add_argument("--quota", type=float, default=25, help="sends per second before the stub answers 429")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="share of sends failing with 503")
+    args = parser.parse_args()
+    run(replies=args.replies, quota=args.quota, error_rate=args.error_rate)
@@ -0,0 +1,66 @@
+"""
+Offline evaluation of the local pre-classifier against labels produced by the LLM categorizer.
+
+The corpus is JSONL with sender, subject, body, llm_category and (optionally) llm_latency_ms,
+the observed latency of the LLM categorization for that email.
+
+    python -m benchmarks.preclassifier_eval --corpus benchmarks/data/categorized_emails.jsonl
+"""
+import argparse
+import json
+import statistics
+import time
+
+from src.state import Email
+from src.utils.preclassifier import Preclassifier
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percentile / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run(corpus: str, threshold: float, default_llm_latency_ms: float, verbose: bool):
+    with open(corpus, encoding="utf-8") as corpus_file:
+        records = [json.loads(line) for line in corpus_file if line.strip()]
+
+    preclassifier = Preclassifier(threshold=threshold)
+    short_circuited = agreed = 0
+    saved_ms, overhead_ms = [], []
+    for record in records:
+        email = Email(sender=record["sender"], subject=record["subject"], date="", body=record["body"])
+        start = time.perf_counter()
+        result = preclassifier.classify(email)
+        local_ms = (time.perf_counter() - start) * 1000
+        overhead_ms.append(local_ms)
+        if not result.decided:
+            # the LLM still runs, the local tier only added its own latency
+            saved_ms.append(-local_ms)
+            continue
+        short_circuited += 1
+        agreed += result.category.value == record["llm_category"]
+        saved_ms.append(record.get("llm_latency_ms", default_llm_latency_ms) - local_ms)
+        if verbose and result.category.value != record["llm_category"]:
+            print(f"disagreement ({result.reason}): local={result.category.value} llm={record['llm_category']} :: {record['subject']}")
+
+    total = len(records)
+    print(f"emails:               {total}")
+    print(f"short-circuited:      {short_circuited} ({short_circuited / total:.1%})")
+    if short_circuited:
+        print(f"agreement with LLM:   {agreed / short_circuited:.1%} of short-circuited emails")
+    print(f"local overhead:       mean {statistics.mean(overhead_ms):.3f} ms")
+    print(f"latency saved/email:  p50 {_percentile(saved_ms, 50):.1f} ms, p95 {_percentile(saved_ms, 95):.1f} ms, "
+          f"mean {statistics.mean(saved_ms):.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default="benchmarks/data/categorized_emails.jsonl")
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0, help="used when a record has no llm_latency_ms")
+    parser.add_argument("--verbose", action="store_true", help="print every disagreement")
+    args = parser.parse_args()
+    run(corpus=args.corpus, threshold=args.threshold, default_llm_latency_ms=args.llm_latency_ms, verbose=args.verbose)
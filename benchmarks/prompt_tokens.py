@@ -0,0 +1,91 @@
+"""
+Input tokens per email for the categorizer and writer prompts: the previous single user string
+(indented source text, re-sent in full on every call) against the compacted system/human split,
+with and without a Bedrock cache point after the static system segment.
+
+Token counts are the ~4 characters per token estimate of the fake model. Bedrock only creates a
+cache checkpoint when the cached prefix reaches the model's minimum (about 1K tokens for Nova),
+so the last row applies that minimum.
+
+    python -m benchmarks.prompt_tokens --emails 40
+"""
+import argparse
+import contextlib
+import io
+import os
+
+from langchain_core.prompts import PromptTemplate
+
+from src.agents.prompt_cache import build_chat_prompt
+from src.prompts import (
+    EMAIL_CATEGORIZER,
+    EMAIL_CATEGORIZER_HUMAN_PROMPT,
+    EMAIL_CATEGORIZER_INPUT,
+    EMAIL_CATEGORIZER_SYSTEM_PROMPT,
+    EMAIL_CATEGORIZER_TASK,
+    EMAIL_WRITER,
+    EMAIL_WRITER_HUMAN_PROMPT,
+    EMAIL_WRITER_INPUT,
+    EMAIL_WRITER_SYSTEM_PROMPT,
+    EMAIL_WRITER_TASK,
+)
+from src.utils.gmail_utils import _parse_email_message
+from src.utils.instrumentation import usage_totals
+from src.utils.metrics import MetricsRegistry, set_metrics
+from .fakes import estimate_tokens, fake_agent_registry, install_fakes, make_gmail_message
+
+# every email goes through the LLM categorizer
+os.environ["PRECLASSIFIER_ENABLED"] = "false"
+
+VARIANTS = {
+    "single user string": ({
+        "categorizer": PromptTemplate.from_template(f"{EMAIL_CATEGORIZER}\n{EMAIL_CATEGORIZER_TASK}\n{EMAIL_CATEGORIZER_INPUT}"),
+        "writer": PromptTemplate.from_template(f"{EMAIL_WRITER}\n{EMAIL_WRITER_TASK}\n{EMAIL_WRITER_INPUT}"),
+    }, 0),
+    "compact system/human": ({
+        "categorizer": build_chat_prompt(EMAIL_CATEGORIZER_SYSTEM_PROMPT, EMAIL_CATEGORIZER_HUMAN_PROMPT, cache=False),
+        "writer": build_chat_prompt(EMAIL_WRITER_SYSTEM_PROMPT, EMAIL_WRITER_HUMAN_PROMPT, cache=False),
+    }, 0),
+    "+ cache point": (None, 0),
+    "+ cache point, 1K min": (None, 1000),
+}
+
+
+def run(emails: int, cache_read_price: float):
+    from src.agents import AGENT_REGISTRY
+    from src.graph.email_graph import EmailSupportGraph
+    from src.utils.cache import set_categorization_cache
+
+    install_fakes()
+    print(f"static system segments: categorizer ~{estimate_tokens(EMAIL_CATEGORIZER_SYSTEM_PROMPT)} tokens, "
+          f"writer ~{estimate_tokens(EMAIL_WRITER_SYSTEM_PROMPT)} tokens")
+    print(f"{'prompt layout':<24}{'input':>8}{'cache read':>12}{'cache write':>13}{'billed input':>14}   (per email)")
+    baseline = None
+    for name, (prompts, cache_min_tokens) in VARIANTS.items():
+        AGENT_REGISTRY.update(fake_agent_registry(prompts=prompts, cache_min_tokens=cache_min_tokens))
+        set_categorization_cache(None)
+        graph = EmailSupportGraph(batch=True, writer_mode="two_pass").email_graph
+        set_metrics(MetricsRegistry())
+        with contextlib.redirect_stdout(io.StringIO()):
+            for index in range(emails):
+                graph.invoke(
+                    {"current_email": _parse_email_message(make_gmail_message(index)),
+                     "email_category": "", "email_response": "", "messages": [""]},
+                )
+        totals = usage_totals()
+        input_tokens = totals.get("input_tokens", 0) / emails
+        cache_read = totals.get("cache_read_tokens", 0) / emails
+        cache_write = totals.get("cache_write_tokens", 0) / emails
+        billed = input_tokens + cache_write + cache_read * cache_read_price
+        baseline = baseline or billed
+        print(f"{name:<24}{input_tokens:>8.0f}{cache_read:>12.0f}{cache_write:>13.0f}{billed:>14.0f}"
+              f"   {billed / baseline - 1:+.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=40)
+    parser.add_argument("--cache-read-price", type=float, default=0.25,
+                        help="price of a cached input token relative to a regular one (Nova: 0.25)")
+    args = parser.parse_args()
+    run(emails=args.emails, cache_read_price=args.cache_read_price)
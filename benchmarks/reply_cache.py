@@ -0,0 +1,191 @@
+"""
+Reply reuse for near-duplicate emails (src/utils/reply_cache.py). A synthetic inbox draws its
+emails from a pool of distinct questions (benchmarks/corpus.py templates, each about one product
+or order) with Zipf popularity. Each email is a question as is, with its punctuation changed, with
+a closing added, or with an unrelated sentence added. The whole graph runs with fake agents and
+retriever, without and with the reply cache, and the run reports:
+
+- hit rate, overall and per category, and how many repeated questions were caught;
+- false reuses, replies written for another question (each written reply is tagged with its question);
+- writer LLM calls, tokens and latency per email;
+- lookup latency, evictions, and invalidations when the knowledge base version changes mid-run.
+
+    python -m benchmarks.reply_cache --emails 600 --questions 200 --kb-change-at 0.5
+"""
+from collections import Counter
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import statistics
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+from src.utils.cache import InMemoryCache, set_categorization_cache
+from src.utils.instrumentation import node_usage, usage_totals
+from src.utils.metrics import get_metrics
+from src.utils.reply_cache import ReplyCache, set_reply_cache
+from .corpus import CATEGORY_WEIGHTS, CITIES, FILLER, NAMES, TEMPLATES, _products
+from .fakes import fake_agent_registry, install_fake_retriever, install_fakes, make_gmail_message
+
+CLOSINGS = ["Gracias.", "Saludos.", "Quedo atento.", "Muchas gracias de antemano."]
+_TAG = re.compile(r" \[q(\d+)\]$")
+
+
+def _inbox(count: int, questions: int, seed: int) -> list[tuple[str, str, int]]:
+    """(category, body, question) per email, in arrival order"""
+    rng = random.Random(seed)
+    products = _products()
+    categories, weights = zip(*CATEGORY_WEIGHTS.items())
+    pool = []
+    for _ in range(questions):
+        category = rng.choices(categories, weights)[0]
+        values = {"product": rng.choice(products), "city": rng.choice(CITIES), "name": rng.choice(NAMES),
+                  "order": rng.randint(1000, 99999), "days": rng.randint(2, 40), "hour": rng.randint(8, 18),
+                  "years": rng.randint(1, 10)}
+        pool.append((category, rng.choice(TEMPLATES[category]).format(**values), values))
+
+    # the same template about the same product is the same question, whichever pool entry it came from
+    labels = {}
+    popularity = [1 / (rank + 1) for rank in range(questions)]
+    emails = []
+    for _ in range(count):
+        category, text, values = pool[rng.choices(range(questions), popularity)[0]]
+        question = labels.setdefault(text, len(labels))
+        variation = rng.random()
+        if variation < 0.3:
+            body = text
+        elif variation < 0.5:
+            body = re.sub(r"[¿¡,]", "", text).replace("?", ".")
+        elif variation < 0.8:
+            body = f"{text} {rng.choice(CLOSINGS)}"
+        else:
+            body = f"{text} {rng.choice(FILLER).format(**values)}"
+        emails.append((category, body, question))
+    return emails
+
+
+def _tagging_writer(writer, questions: dict[str, int]):
+    """The fake writer, marking each reply with the question of the email it was written for"""
+    def write(inputs: dict, config):
+        reply = writer.invoke(inputs, config)
+        return reply.model_copy(update={"body": f"{reply.body} [q{questions[inputs['email_content']]}]"})
+    return RunnableLambda(write)
+
+
+def _writer_calls() -> float:
+    return node_usage().get("write_email_with_context", {}).get("llm_calls", 0)
+
+
+def _run(emails: list[tuple[str, str, int]], args, cache: ReplyCache | None) -> dict:
+    from src.agents import AGENT_REGISTRY
+    from src.graph.email_graph import EmailSupportGraph
+    from src.utils.gmail_utils import _parse_email_message
+
+    registry = fake_agent_registry(latency=args.llm_latency)
+    questions = {body: question for _, body, question in emails}
+    AGENT_REGISTRY.update({**registry, "email_writer_with_context": _tagging_writer(registry["email_writer_with_context"], questions)})
+    # both runs start cold: categorization and retrieval caches would otherwise favour the second
+    set_categorization_cache(InMemoryCache())
+    install_fake_retriever(latency=args.retriever_latency)
+    set_reply_cache(cache)
+    get_metrics().reset()
+    os.environ["KNOWLEDGE_BASE_VERSION"] = "kb-1"
+    graph = EmailSupportGraph(writer_mode=args.writer_mode).email_graph
+
+    change_at = int(len(emails) * args.kb_change_at) if args.kb_change_at else None
+    answered = set()
+    hits, repeats, caught, false_reuses = Counter(), 0, 0, 0
+    latencies = []
+    for index, (_, body, question) in enumerate(emails):
+        if index == change_at:
+            # e.g. a new price list was ingested: the replies written so far may be out of date
+            os.environ["KNOWLEDGE_BASE_VERSION"] = "kb-2"
+            answered.clear()
+        written = _writer_calls()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = graph.invoke(
+                {"current_email": _parse_email_message(make_gmail_message(index, body=body)),
+                 "email_category": "", "email_response": "", "messages": []},
+            )
+        latencies.append((time.perf_counter() - start) * 1000)
+        category = result["email_category"]
+        # a question the cache could have answered: asked before, since the last knowledge-base change
+        repeat = category in args.categories and question in answered
+        answered.add(question)
+        repeats += repeat
+        if _writer_calls() == written:
+            hits[category] += 1
+            caught += repeat
+            false_reuses += int(_TAG.search(result["email_response"].body).group(1)) != question
+
+    totals = usage_totals()
+    lookups = get_metrics().snapshot().get("reply_cache_latency_seconds", [{}])[0]
+    return {
+        "hits": hits,
+        "repeats": repeats,
+        "caught": caught,
+        "false_reuses": false_reuses,
+        "llm_calls": totals.get("llm_calls", 0) / len(emails),
+        "writer_calls": _writer_calls() / len(emails),
+        "tokens": sum(totals.get(name, 0) for name in ("input_tokens", "cache_read_tokens", "cache_write_tokens", "output_tokens")) / len(emails),
+        "ms": statistics.mean(latencies),
+        "lookup_p50": lookups.get("p50", 0.0) * 1000,
+        "lookup_p95": lookups.get("p95", 0.0) * 1000,
+        "cache": cache,
+    }
+
+
+def run(args):
+    install_fakes()
+    emails = _inbox(args.emails, args.questions, args.seed)
+    by_category = Counter(category for category, _, _ in emails)
+    print(f"{len(emails)} emails from {args.questions} questions ({dict(by_category)}), {args.writer_mode}, "
+          f"LLM {args.llm_latency * 1000:.0f} ms, knowledge base changes after {args.kb_change_at:.0%} of the emails")
+
+    results = {
+        "no cache": _run(emails, args, None),
+        "reply cache": _run(emails, args, ReplyCache(max_size=args.cache_size, threshold=args.threshold)),
+    }
+    set_reply_cache(None)
+    os.environ.pop("KNOWLEDGE_BASE_VERSION", None)
+
+    print(f"\n{'':<13}{'hits':>6}{'hit rate':>10}{'repeats caught':>16}{'false reuses':>14}"
+          f"{'LLM calls':>11}{'writer':>8}{'tokens':>8}{'ms/email':>10}{'lookup p50/p95 ms':>19}")
+    for label, result in results.items():
+        hits = result["hits"].total()
+        print(
+            f"{label:<13}{hits:>6}{hits / len(emails):>10.1%}{result['caught']:>9}/{result['repeats']:<6}{result['false_reuses']:>14}"
+            f"{result['llm_calls']:>11.2f}{result['writer_calls']:>8.2f}{result['tokens']:>8.0f}{result['ms']:>10.1f}"
+            f"{result['lookup_p50']:>11.2f}/{result['lookup_p95']:.2f}"
+        )
+    cached = results["reply cache"]
+    cache = cached["cache"]
+    print("\nhit rate per category: " + ", ".join(
+        f"{category} {cached['hits'][category] / count:.0%}" for category, count in sorted(by_category.items())))
+    print(f"cache: {len(cache)} entries, {cache.stats.evictions} evictions, {cache.invalidations} invalidations, "
+          f"{cache.stats.expirations} expirations")
+    baseline = results["no cache"]
+    print(f"{1 - cached['llm_calls'] / baseline['llm_calls']:.0%} fewer LLM calls, "
+          f"{1 - cached['tokens'] / baseline['tokens']:.0%} fewer tokens, "
+          f"{1 - cached['ms'] / baseline['ms']:.0%} lower latency per email")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=600)
+    parser.add_argument("--questions", type=int, default=200, help="distinct questions the emails are drawn from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--writer-mode", choices=("two_pass", "single_pass"), default="two_pass")
+    parser.add_argument("--llm-latency", type=float, default=0.01)
+    parser.add_argument("--retriever-latency", type=float, default=0.005)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--cache-size", type=int, default=5000)
+    parser.add_argument("--kb-change-at", type=float, default=0.5, help="share of the emails after which the knowledge base changes, 0 for never")
+    args = parser.parse_args()
+    args.categories = {"customer_feedback", "product_enquiry"}
+    run(args)
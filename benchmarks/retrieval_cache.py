@@ -0,0 +1,100 @@
+"""
+Hit rate and latency of CachingRetriever against a local stand-in retriever, with a skewed
+(Zipf-like) query mix where many customers ask about the same products.
+
+    python -m benchmarks.retrieval_cache --queries 2000 --concurrency 16 --latency 0.05
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.cache import InMemoryCache
+from src.utils.retrieval_cache import CachingRetriever
+from .fakes import FakeRetriever
+
+PRODUCT_QUESTIONS = [
+    "precio del iPhone 13 128 GB",
+    "precio del iPhone 13 Pro Max 256 GB",
+    "precio del iPhone 14 Pro",
+    "financiamiento a 12 meses iPhone 13",
+    "garantía de equipos open box",
+    "política de devoluciones",
+    "tiempo de envío de pedidos",
+    "precio Samsung Galaxy S23",
+    "iPhone 12 disponible",
+    "cambio de equipo defectuoso",
+    "métodos de pago aceptados",
+    "reembolso por pedido no entregado",
+]
+
+
+def _variant(question: str, rng: random.Random) -> str:
+    """Same question written the way different customers would."""
+    return rng.choice([question, question.lower(), f"¿{question}?", f"  {question.upper()}  "])
+
+
+def _workload(queries: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, len(PRODUCT_QUESTIONS) + 1)]
+    return [_variant(rng.choices(PRODUCT_QUESTIONS, weights)[0], rng) for _ in range(queries)]
+
+
+def _percentiles(latencies: list[float]) -> str:
+    quantiles = statistics.quantiles(latencies, n=100)
+    return f"p50 {quantiles[49] * 1000:7.2f} ms  p95 {quantiles[94] * 1000:7.2f} ms"
+
+
+def _run_threads(retriever, workload: list[str], concurrency: int) -> list[float]:
+    def _timed(query):
+        start = time.perf_counter()
+        retriever.invoke(query)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(_timed, workload))
+
+
+async def _run_async(retriever, workload: list[str], concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _timed(query):
+        async with semaphore:
+            start = time.perf_counter()
+            await retriever.ainvoke(query)
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*(_timed(query) for query in workload))
+
+
+def run(queries: int, concurrency: int, latency: float, ttl: float, size: int, seed: int):
+    workload = _workload(queries, seed)
+    for mode in ("threads", "async"):
+        for label in ("uncached", "cached"):
+            remote = FakeRetriever(latency=latency)
+            retriever = remote if label == "uncached" else CachingRetriever(
+                retriever=remote, cache=InMemoryCache(max_size=size, ttl=ttl)
+            )
+            start = time.perf_counter()
+            if mode == "threads":
+                latencies = _run_threads(retriever, workload, concurrency)
+            else:
+                latencies = asyncio.run(_run_async(retriever, workload, concurrency))
+            elapsed = time.perf_counter() - start
+            stats = f"  {retriever.stats}" if label == "cached" else ""
+            print(f"{mode:>7} {label:>8}: {remote.calls:5d} remote calls  {_percentiles(latencies)}  "
+                  f"{queries / elapsed:8.1f} queries/s{stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per remote retrieval")
+    parser.add_argument("--ttl", type=float, default=3600)
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    run(queries=args.queries, concurrency=args.concurrency, latency=args.latency, ttl=args.ttl, size=args.size, seed=args.seed)
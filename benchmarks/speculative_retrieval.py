@@ -0,0 +1,45 @@
+"""
+End-to-end latency versus retriever cost for the speculative retrieval policies (off, likely,
+always) in single_pass mode, with fake LLMs, a fake retriever and a fake Gmail client.
+
+    python -m benchmarks.speculative_retrieval --emails 40 --llm-latency 0.08 --retriever-latency 0.05
+"""
+import argparse
+import os
+import statistics
+import time
+
+from .fakes import install_fakes, make_gmail_message
+
+
+def run(emails: int, llm_latency: float, retriever_latency: float):
+    # count every retrieval the policies trigger, not what the retrieval cache absorbs
+    os.environ["RETRIEVAL_CACHE_ENABLED"] = "false"
+    _, retriever = install_fakes(llm_latency=llm_latency, retriever_latency=retriever_latency)
+    from src.graph.email_graph import EmailSupportGraph
+    from src.utils.cache import set_categorization_cache
+    from src.utils.gmail_utils import _parse_email_message
+
+    # every email must hit the categorizer model for the comparison to be fair
+    set_categorization_cache(None)
+    corpus = [_parse_email_message(make_gmail_message(index)) for index in range(emails)]
+    for policy in ("off", "likely", "always"):
+        graph = EmailSupportGraph(batch=True, writer_mode="single_pass", speculative_retrieval=policy).email_graph
+        retriever.calls = 0
+        latencies = []
+        for email in corpus:
+            start = time.perf_counter()
+            graph.invoke({"current_email": email, "email_category": "", "email_response": "", "messages": [""]})
+            latencies.append((time.perf_counter() - start) * 1000)
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f"{policy:>7}: p50 {quantiles[49]:6.1f} ms  p95 {quantiles[94]:6.1f} ms  "
+              f"retriever calls {retriever.calls / emails:.2f}/email")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=40)
+    parser.add_argument("--llm-latency", type=float, default=0.08, help="simulated seconds per LLM call")
+    parser.add_argument("--retriever-latency", type=float, default=0.05, help="simulated seconds per retrieval")
+    args = parser.parse_args()
+    run(emails=args.emails, llm_latency=args.llm_latency, retriever_latency=args.retriever_latency)
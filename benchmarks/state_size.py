@@ -0,0 +1,85 @@
+"""
+Size and serialization cost of the per-email graph state at every step, as the checkpointer
+stores it: answers synthetic emails (bodies padded with quoted history to --body-chars) through
+the checkpointed workflow with fake LLMs, then serializes each checkpointed state with the
+checkpointer's serializer. Compares bodies kept in the state with bodies kept in the body store.
+
+    python -m benchmarks.state_size --emails 200 --body-chars 8000
+"""
+import argparse
+import contextlib
+import io
+import statistics
+import time
+
+from src.utils.cache import create_cache
+from src.utils.gmail_utils import _parse_email_message
+from .corpus import synthetic_corpus
+from .fakes import install_fakes
+
+
+def _emails(count: int, body_chars: int):
+    emails = []
+    for message in synthetic_corpus(count):
+        email = _parse_email_message(message)
+        quoted = "\n> Mensaje anterior del hilo, citado por el cliente al responder."
+        padding = quoted * max(0, (body_chars - len(email.body)) // len(quoted))
+        emails.append(email.model_copy(update={"body": email.body + padding}))
+    return emails
+
+
+def _measure(emails, writer_mode: str, body_store) -> dict[str, dict[str, list[float]]]:
+    """step (node that wrote the checkpoint) -> bytes, messages, dump and load microseconds"""
+    from src.graph.email_graph import EmailSupportGraph
+    from src.utils.body_store import set_body_store
+
+    set_body_store(body_store)
+    graph = EmailSupportGraph(writer_mode=writer_mode, checkpointer="memory")
+    serde = graph.checkpointer.serde
+    with contextlib.redirect_stdout(io.StringIO()):
+        for email in emails:
+            graph.process_email(email, defer_send=True)
+
+    steps: dict[str, dict[str, list[float]]] = {}
+    for email in emails:
+        for snapshot in graph.email_graph.get_state_history({"configurable": {"thread_id": email.id}}):
+            writes = snapshot.metadata.get("writes") or {}
+            step = ", ".join(writes) or "(start)"
+            start = time.perf_counter()
+            payload = serde.dumps_typed(snapshot.values)
+            dumped = time.perf_counter()
+            serde.loads_typed(payload)
+            loaded = time.perf_counter()
+            row = steps.setdefault(step, {"bytes": [], "messages": [], "dump_us": [], "load_us": []})
+            row["bytes"].append(len(payload[1]))
+            row["messages"].append(len(snapshot.values.get("messages") or []))
+            row["dump_us"].append((dumped - start) * 1e6)
+            row["load_us"].append((loaded - dumped) * 1e6)
+    return steps
+
+
+def run(emails: int, body_chars: int, writer_mode: str):
+    batch = _emails(emails, body_chars)
+    install_fakes()
+    print(f"{emails} emails, bodies of {statistics.mean(len(email.body) for email in batch):.0f} chars on average, {writer_mode}")
+    for label, store in (("bodies in state", None), ("bodies by reference", create_cache("memory"))):
+        steps = _measure(batch, writer_mode, store)
+        print(f"\n{label}:")
+        print(f"{'written by':<28}{'states':>7}{'mean KiB':>10}{'max KiB':>9}{'messages':>10}{'dump us':>9}{'load us':>9}")
+        for step, row in steps.items():
+            print(
+                f"{step:<28}{len(row['bytes']):>7}{statistics.mean(row['bytes']) / 1024:>10.2f}{max(row['bytes']) / 1024:>9.2f}"
+                f"{max(row['messages']):>10}{statistics.mean(row['dump_us']):>9.0f}{statistics.mean(row['load_us']):>9.0f}"
+            )
+        total = sum(sum(row["bytes"]) for row in steps.values()) / emails
+        serde_us = sum(sum(row["dump_us"]) + sum(row["load_us"]) for row in steps.values()) / emails
+        print(f"per email: {total / 1024:.1f} KiB of checkpointed state, {serde_us / 1000:.2f} ms serializing and loading it")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--body-chars", type=int, default=8000, help="pad bodies with quoted history to this length")
+    parser.add_argument("--writer-mode", choices=("two_pass", "single_pass"), default="two_pass")
+    args = parser.parse_args()
+    run(emails=args.emails, body_chars=args.body_chars, writer_mode=args.writer_mode)
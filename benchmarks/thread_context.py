@@ -0,0 +1,140 @@
+"""
+Thread history for follow-up emails, against a fake mailbox of synthetic conversations (customer
+emails quoting the previous message, our replies in between) delivered interleaved across threads.
+For every follow-up, in arrival order, builds the writer context twice, as the two_pass writer
+does, and compares:
+
+- naive: threads().get with full bodies on every call, every earlier message in the context
+- cached: src/utils/thread_context.py, one masked threads.get per follow-up, cached thread and token-budgeted summary
+
+    python -m benchmarks.thread_context --threads 200 --max-length 12 --gmail-latency 0.01
+"""
+from collections import Counter
+import argparse
+import random
+import statistics
+import time
+
+from src.utils.cache import create_cache
+from src.utils.gmail_utils import _parse_email_message
+from src.utils.thread_context import get_thread_context, set_thread_cache
+from .corpus import CITIES, NAMES, TEMPLATES, _products
+from .fakes import FakeGmailService, estimate_tokens, make_gmail_message
+
+REPLY = (
+    "Estimado cliente, gracias por comunicarse con Cellfone SA. Sobre su consulta del {product}: "
+    "contamos con stock en nuestra tienda de {city} y el envío demora entre 2 y 5 días hábiles. "
+    "Puede pagar al contado o con financiamiento a 12 meses con tarjetas participantes. "
+    "Si el equipo presenta fallas dentro de los primeros 30 días, lo cambiamos sin costo "
+    "presentando la boleta. Quedamos atentos a cualquier otra consulta. Saludos cordiales, Cellfone SA."
+)
+
+
+def _mailbox(threads: int, max_length: int, seed: int) -> list[dict]:
+    """Messages in arrival order: each thread alternates customer emails and our replies, threads interleave"""
+    rng = random.Random(seed)
+    products = _products()
+    conversations = []
+    for thread in range(threads):
+        values = {"product": rng.choice(products), "city": rng.choice(CITIES), "name": rng.choice(NAMES),
+                  "order": rng.randint(1000, 99999), "days": rng.randint(2, 40)}
+        category = rng.choice(["product_enquiry", "customer_complaint"])
+        conversations.append([(thread, turn, category, values) for turn in range(rng.randint(1, max_length))])
+
+    messages, previous = [], {}
+    index = 0
+    while any(conversations):
+        conversation = rng.choice([conversation for conversation in conversations if conversation])
+        thread, turn, category, values = conversation.pop(0)
+        thread_id = f"thread{thread:05d}"
+        earlier = previous.get(thread)
+        subject = f"Consulta {thread}" if earlier is None else f"Re: Consulta {thread}"
+        if turn % 2 == 0:
+            body = rng.choice(TEMPLATES[category]).format(**values)
+            if earlier is not None:
+                quoted = "\n".join(f"> {line}" for line in earlier["body"].splitlines())
+                body = f"{body}\n\nEl lun, 6 oct 2025 a las 10:00, Cellfone SA escribió:\n{quoted}"
+            message = make_gmail_message(index, body=body, thread_id=thread_id, subject=subject,
+                                         sender=f"{values['name']} <cliente{thread}@example.com>",
+                                         in_reply_to=earlier and earlier["message_id"])
+        else:
+            body = REPLY.format(**values)
+            message = make_gmail_message(index, body=body, thread_id=thread_id, subject=subject,
+                                         sender="Cellfone SA <soporte@example.com>", in_reply_to=earlier["message_id"])
+            message["labelIds"] = ["SENT"]
+        previous[thread] = {"body": body, "message_id": f"<{message['id']}@mail.example.com>"}
+        messages.append(message)
+        index += 1
+    return messages
+
+
+def naive_context(service: FakeGmailService, email) -> str:
+    """Every earlier message of the thread, fetched with full bodies on each call"""
+    thread = service.users().threads().get(userId="me", id=email.thread_id, format="full").execute()
+    earlier = []
+    for message in thread["messages"]:
+        if message["id"] == email.id:
+            break
+        parsed = _parse_email_message(message)
+        earlier.append(f"{parsed.sender}: {parsed.body}")
+    return "\n".join(earlier)
+
+
+def _run(messages: list[dict], latency: float, build) -> dict:
+    service = FakeGmailService(latency=latency)
+    tokens, elapsed = [], []
+    for message in messages:
+        service.add_message(message)
+        if "SENT" in message["labelIds"]:
+            continue
+        email = _parse_email_message(message)
+        if not email.references:
+            continue
+        start = time.perf_counter()
+        # two_pass builds the context for query_or_email and again for the structured writer
+        context = build(service, email)
+        build(service, email)
+        elapsed.append((time.perf_counter() - start) * 1000)
+        tokens.append(estimate_tokens(context))
+    return {
+        "follow_ups": len(tokens),
+        "round_trips": service.round_trips,
+        "kib": service.bytes_fetched / 1024,
+        "tokens": tokens,
+        "ms": elapsed,
+    }
+
+
+def run(threads: int, max_length: int, seed: int, latency: float):
+    messages = _mailbox(threads, max_length, seed)
+    longest = max(Counter(message["threadId"] for message in messages).values())
+    print(f"{len(messages)} messages in {threads} threads (longest {longest}), Gmail latency {latency * 1000:.0f} ms")
+
+    set_thread_cache(None)
+    naive = _run(messages, latency, naive_context)
+    set_thread_cache(create_cache("memory"))
+    cached = _run(messages, latency, lambda service, email: get_thread_context(email, service=service))
+    set_thread_cache(None)
+
+    print(f"\n{'':<8}{'follow-ups':>11}{'round trips':>13}{'KiB fetched':>13}{'ctx tokens':>12}{'p95':>7}{'max':>7}{'ms/email':>10}")
+    for label, result in (("naive", naive), ("cached", cached)):
+        tokens = sorted(result["tokens"])
+        print(
+            f"{label:<8}{result['follow_ups']:>11}{result['round_trips']:>13}{result['kib']:>13.1f}"
+            f"{statistics.mean(tokens):>12.0f}{tokens[int(len(tokens) * 0.95)]:>7}{tokens[-1]:>7}"
+            f"{statistics.mean(result['ms']):>10.2f}"
+        )
+    saved = 1 - sum(cached["tokens"]) / sum(naive["tokens"])
+    print(f"\ncontext tokens per follow-up {saved:.0%} lower, "
+          f"{cached['round_trips'] / naive['round_trips']:.2f}x the Gmail round trips, "
+          f"{cached['kib'] / naive['kib']:.2f}x the bytes fetched")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--max-length", type=int, default=12, help="messages per thread, ours included")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--gmail-latency", type=float, default=0.0, help="seconds per Gmail round trip")
+    args = parser.parse_args()
+    run(threads=args.threads, max_length=args.max_length, seed=args.seed, latency=args.gmail_latency)
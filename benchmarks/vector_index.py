@@ -0,0 +1,78 @@
+"""
+Query latency and recall@k of the local flat and IVF indexes against a brute-force baseline
+(full scoring plus a complete sort), on a synthetic clustered corpus.
+
+    python -m benchmarks.vector_index --vectors 50000 --dimensions 256 --queries 200
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from src.utils.vector_index import FlatIndex, IVFIndex, _normalize_rows
+
+
+def _corpus(vectors: int, dimensions: int, clusters: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimensions))
+    labels = rng.integers(0, clusters, size=vectors)
+    corpus = _normalize_rows(centers[labels] + 0.6 * rng.normal(size=(vectors, dimensions)))
+    query_labels = rng.integers(0, clusters, size=vectors // 100 or 1)
+    queries = _normalize_rows(centers[query_labels] + 0.6 * rng.normal(size=(len(query_labels), dimensions)))
+    return corpus, queries
+
+
+def _brute_force(corpus: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(corpus @ query))[:k]
+
+
+def _measure(search, queries: np.ndarray, k: int) -> tuple[list[np.ndarray], list[float]]:
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query, k))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, latencies
+
+
+def run(vectors: int, dimensions: int, queries: int, k: int, clusters: int, nprobes: list[int], seed: int):
+    corpus, query_pool = _corpus(vectors, dimensions, clusters, seed)
+    query_set = query_pool[:queries]
+    baseline, baseline_latencies = _measure(lambda query, k: _brute_force(corpus, query, k), query_set, k)
+
+    def _report(label: str, latencies: list[float], results: list[np.ndarray] | None = None):
+        quantiles = statistics.quantiles(latencies, n=100)
+        recall = 1.0 if results is None else statistics.mean(
+            len(set(result.tolist()) & set(truth.tolist())) / k for result, truth in zip(results, baseline)
+        )
+        print(f"{label:>14}: p50 {quantiles[49]:7.3f} ms  p95 {quantiles[94]:7.3f} ms  recall@{k} {recall:.3f}")
+
+    print(f"{vectors} vectors x {dimensions} dims, {len(query_set)} queries")
+    _report("brute force", baseline_latencies)
+
+    flat = FlatIndex(corpus)
+    results, latencies = _measure(lambda query, k: flat.search(query, k)[0], query_set, k)
+    _report("flat", latencies, results)
+
+    start = time.perf_counter()
+    ivf = IVFIndex(corpus, seed=seed)
+    print(f"{'ivf build':>14}: {time.perf_counter() - start:.2f}s, {len(ivf.centroids)} lists")
+    for nprobe in nprobes:
+        ivf.nprobe = nprobe
+        results, latencies = _measure(lambda query, k: ivf.search(query, k)[0], query_set, k)
+        _report(f"ivf nprobe={nprobe}", latencies, results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--nprobes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(vectors=args.vectors, dimensions=args.dimensions, queries=args.queries, k=args.k,
+        clusters=args.clusters, nprobes=args.nprobes, seed=args.seed)
@@ -0,0 +1,157 @@
+"""
+Throughput of the multi-process worker pool (src/graph/workers.py) from 1 to N workers: several
+fake mailboxes, each with its own synthetic inbox (benchmarks/corpus.py) and fake Gmail client,
+fake Bedrock agents and retriever with fixed latency in every worker process. For each pool size,
+one round queues every email, drains the queue and sends the replies. Checks that every email was
+answered once, from its own mailbox, and that emails of the same thread were answered in order.
+
+    python -m benchmarks.worker_scaling --mailboxes 4 --emails 60 --workers 1,2,4,8
+"""
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from .corpus import synthetic_corpus
+from .fakes import FakeGmailService, install_fake_agents, install_fake_retriever
+
+
+def _mailbox_names(count: int) -> list[str]:
+    return [f"support{index}" for index in range(count)]
+
+
+def install_mailbox_fakes(mailboxes: int, emails: int, seed: int, gmail_latency: float) -> dict[str, FakeGmailService]:
+    """A fake Gmail service per mailbox, each holding its own synthetic inbox"""
+    from src.utils.gmail_service import GmailServiceManager, set_gmail_service_manager
+
+    services = {}
+    for index, name in enumerate(_mailbox_names(mailboxes)):
+        service = FakeGmailService(messages=synthetic_corpus(emails, seed=seed + index), latency=gmail_latency)
+        set_gmail_service_manager(GmailServiceManager(service_factory=lambda service=service: service), mailbox=name)
+        services[name] = service
+    return services
+
+
+def setup_worker(mailboxes: int, emails: int, seed: int, llm_latency: float, retriever_latency: float, gmail_latency: float):
+    """Runs in every worker process before its graph is built"""
+    # the graph's progress output would bury the table
+    sys.stdout = open(os.devnull, "w")
+    install_fake_agents(latency=llm_latency)
+    install_fake_retriever(latency=retriever_latency)
+    install_mailbox_fakes(mailboxes, emails, seed, gmail_latency)
+
+
+def _ordered_threads(directory: str, names: list[str], services: dict[str, FakeGmailService]) -> tuple[int, int]:
+    """(threads with several emails, those answered out of order), from outbox enqueue times"""
+    queue = sqlite3.connect(os.path.join(directory, "work_queue.sqlite"))
+    multi = out_of_order = 0
+    for name in names:
+        outbox = sqlite3.connect(os.path.join(directory, f"outbox-{name}.sqlite"))
+        written = dict(outbox.execute("SELECT original_id, created_at FROM outbox").fetchall())
+        threads = {}
+        for email_id, in queue.execute("SELECT email_id FROM work_items WHERE mailbox = ? ORDER BY id", (name,)):
+            threads.setdefault(services[name].store[email_id]["threadId"], []).append(written.get(email_id, 0.0))
+        for times in threads.values():
+            if len(times) > 1:
+                multi += 1
+                out_of_order += times != sorted(times)
+    return multi, out_of_order
+
+
+def _run(workers: int, args) -> dict:
+    from src.graph.workers import WorkerPool
+    from src.utils.gmail_history import HistoryListener, HistoryStore, set_history_listener
+    from src.utils.mailboxes import Mailbox, mailbox_path
+    from src.utils.outbox import OutboxSender, OutboxStore, set_outbox_sender
+
+    names = _mailbox_names(args.mailboxes)
+    with tempfile.TemporaryDirectory() as directory:
+        # inherited by the spawned workers: queue and outboxes are shared files, one per mailbox
+        os.environ["WORK_QUEUE_PATH"] = os.path.join(directory, "work_queue.sqlite")
+        os.environ["OUTBOX_PATH"] = os.path.join(directory, "outbox.sqlite")
+        os.environ["GMAIL_HISTORY_DB"] = os.path.join(directory, "history.sqlite")
+        services = install_mailbox_fakes(args.mailboxes, args.emails, args.seed, args.gmail_latency)
+        # every run starts from an empty history, the previous run claimed all of its emails
+        history = HistoryStore(os.environ["GMAIL_HISTORY_DB"])
+        for name in names:
+            set_history_listener(HistoryListener(history, mailbox=name), mailbox=name)
+            # the parent sends for every mailbox, without the send-rate limit
+            set_outbox_sender(OutboxSender(OutboxStore(mailbox_path(os.environ["OUTBOX_PATH"], name))), mailbox=name)
+
+        pool = WorkerPool(
+            workers=workers,
+            mailboxes=[Mailbox(name) for name in names],
+            graph_options={"writer_mode": args.writer_mode, "checkpointer": "none"},
+            worker_setup=setup_worker,
+            setup_args=(args.mailboxes, args.emails, args.seed, args.llm_latency, args.retriever_latency, args.gmail_latency)
+        )
+        try:
+            start = time.perf_counter()
+            pool.start()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                queued = pool.enqueue()
+                enqueued = time.perf_counter()
+                outcome = pool.drain()
+                drained = time.perf_counter()
+                pool.settle()
+            settled = time.perf_counter()
+        finally:
+            pool.close()
+
+        sent = {name: len(service.sent) for name, service in services.items()}
+        own_threads = all(
+            body.get("threadId") in {message["threadId"] for message in service.store.values()}
+            for service in services.values() for body in service.sent
+        )
+        multi, out_of_order = _ordered_threads(directory, names, services)
+    return {
+        "startup": started - start,
+        "queued": queued,
+        "enqueue": enqueued - started,
+        "drain": drained - enqueued,
+        "settle": settled - drained,
+        "answered": outcome["answered"],
+        "failed": outcome["failed"],
+        "waits": outcome["waits"],
+        "sent": sum(sent.values()),
+        "own_threads": own_threads,
+        "threads": multi,
+        "out_of_order": out_of_order,
+    }
+
+
+def run(args):
+    total = args.mailboxes * args.emails
+    print(f"{args.mailboxes} mailboxes x {args.emails} emails, {args.writer_mode}, LLM {args.llm_latency * 1000:.0f} ms, "
+          f"retriever {args.retriever_latency * 1000:.0f} ms, Gmail {args.gmail_latency * 1000:.0f} ms, {os.cpu_count()} CPUs")
+    print(f"{'workers':>7}{'startup s':>10}{'drain s':>9}{'emails/s':>10}{'speedup':>9}{'answered':>10}{'sent':>6}{'waits':>7}{'ordered':>12}")
+    baseline = None
+    for workers in args.workers:
+        result = _run(workers, args)
+        throughput = result["answered"] / result["drain"]
+        baseline = baseline or throughput
+        ordered = f"{result['threads'] - result['out_of_order']}/{result['threads']}"
+        print(
+            f"{workers:>7}{result['startup']:>10.1f}{result['drain']:>9.2f}{throughput:>10.1f}{throughput / baseline:>8.2f}x"
+            f"{result['answered']:>10}{result['sent']:>6}{result['waits']:>7}{ordered:>12}"
+        )
+        if result["answered"] != total or result["sent"] != total or not result["own_threads"] or result["out_of_order"]:
+            print(f"  unexpected result: {result}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mailboxes", type=int, default=4)
+    parser.add_argument("--emails", type=int, default=60, help="emails per mailbox")
+    parser.add_argument("--workers", type=lambda value: [int(part) for part in value.split(",")], default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--writer-mode", choices=("two_pass", "single_pass"), default="two_pass")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--retriever-latency", type=float, default=0.01)
+    parser.add_argument("--gmail-latency", type=float, default=0.002)
+    run(parser.parse_args())
@@ -0,0 +1,50 @@
+"""
+Writer LLM calls, tokens and latency per email for the two_pass and single_pass writer modes,
+using fake LLMs (real prompt templates, estimated token usage) and a fake retriever.
+
+    python -m benchmarks.writer_passes --emails 40 --llm-latency 0.05
+"""
+import argparse
+import time
+
+from src.utils.instrumentation import metrics_report, node_usage
+from src.utils.metrics import MetricsRegistry, set_metrics
+from .fakes import install_fakes, make_gmail_message
+
+WRITER_NODES = ("query_or_email", "write_email_with_context")
+
+
+def run(emails: int, llm_latency: float):
+    install_fakes(llm_latency=llm_latency)
+    from src.graph.email_graph import EmailSupportGraph
+    from src.utils.gmail_utils import _parse_email_message
+
+    for mode in ("two_pass", "single_pass"):
+        graph = EmailSupportGraph(batch=True, writer_mode=mode).email_graph
+        # a fresh registry per mode, so the usage below covers this run only
+        set_metrics(MetricsRegistry())
+        start = time.perf_counter()
+        for index in range(emails):
+            graph.invoke(
+                {"current_email": _parse_email_message(make_gmail_message(index)),
+                 "email_category": "", "email_response": "", "messages": [""]},
+            )
+        elapsed = time.perf_counter() - start
+        summary = node_usage()
+        writer = {name: sum(summary.get(node, {}).get(name, 0) for node in WRITER_NODES)
+                  for name in ("llm_calls", "input_tokens", "cache_read_tokens", "cache_write_tokens",
+                               "output_tokens", "llm_latency_ms")}
+        tokens = sum(writer[name] for name in ("input_tokens", "cache_read_tokens", "cache_write_tokens", "output_tokens"))
+        print(f"\n== {mode}: {elapsed / emails * 1000:.1f} ms/email end to end")
+        print(metrics_report())
+        print(f"writer per email: {writer['llm_calls'] / emails:.2f} LLM calls, "
+              f"{tokens / emails:.0f} tokens, "
+              f"{writer['llm_latency_ms'] / emails:.1f} ms in LLM requests")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=40)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="simulated seconds per LLM call")
+    args = parser.parse_args()
+    run(emails=args.emails, llm_latency=args.llm_latency)
@@ -1,8 +1,13 @@
 from .email_categorizer import categorize_email
 from .email_writer import query_or_email, write_email_with_context
+from ..utils.instrumentation import instrument_agent
+from ..utils.lazy import LazyRegistry
 
-AGENT_REGISTRY = {
-    "email_categorizer": categorize_email(),
-    "query_or_email": query_or_email(),
-    "email_writer_with_context": write_email_with_context()
-}
\ No newline at end of file
+# chains are built on first use; AGENT_REGISTRY.update({...}) injects fakes before that
+AGENT_REGISTRY = LazyRegistry({
+    "email_categorizer": categorize_email,
+    "query_or_email": query_or_email,
+    "email_writer_with_context": write_email_with_context
+})
+# every chain, built or injected, reports LLM latency, tokens and cost
+AGENT_REGISTRY.wrap(instrument_agent)
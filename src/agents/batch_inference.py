@@ -0,0 +1,195 @@
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from pydantic import BaseModel
+from typing import Callable
+from ..prompts import (
+    EMAIL_CATEGORIZER_SYSTEM_PROMPT,
+    EMAIL_CATEGORIZER_HUMAN_PROMPT,
+    EMAIL_WRITER_SYSTEM_PROMPT,
+    EMAIL_WRITER_HUMAN_PROMPT,
+)
+from ..state import Email
+from ..structured_outputs import CategorizerEmailOutput
+from .bedrock import get_bedrock_batch_client, get_s3_client
+from .prompt_cache import build_chat_prompt
+import json
+import os
+import time
+import uuid
+
+load_dotenv()
+
+# statuses after which a job produces no more output
+FINAL_STATUSES = {"Completed", "PartiallyCompleted", "Failed", "Stopped", "Expired"}
+
+
+@dataclass(frozen=True)
+class BatchPrompt:
+    """What a batch record needs from an agent: its prompt segments, output schema and model"""
+    system: str
+    human: str
+    output: type[BaseModel]
+    model_env: str
+
+    def model_id(self) -> str:
+        return os.getenv(self.model_env, "")
+
+
+# agent name (see AGENT_REGISTRY) -> batch prompt; jobs have no tool use, so structured output is requested as JSON
+BATCH_PROMPTS = {
+    "email_categorizer": BatchPrompt(EMAIL_CATEGORIZER_SYSTEM_PROMPT, EMAIL_CATEGORIZER_HUMAN_PROMPT, CategorizerEmailOutput, "LLM_CATEGORIZER"),
+    "email_writer_with_context": BatchPrompt(EMAIL_WRITER_SYSTEM_PROMPT, EMAIL_WRITER_HUMAN_PROMPT, Email, "LLM_WRITER"),
+}
+
+
+def _split_s3_uri(uri: str) -> tuple[str, str]:
+    if not uri.startswith("s3://"):
+        raise ValueError(f"Not an S3 URI: {uri}")
+    bucket, _, prefix = uri[len("s3://"):].partition("/")
+    return bucket, prefix.strip("/")
+
+
+def build_record(record_id: str, prompt: BatchPrompt, inputs: dict, max_tokens: int) -> dict:
+    """
+    One JSONL line in the Nova messages-v1 format. The human segment is rendered with the same
+    template as the on-demand chain; the JSON schema instruction is appended to the static system segment.
+    """
+    system, human = build_chat_prompt(prompt.system, prompt.human, cache=False).invoke(inputs).to_messages()
+    schema = json.dumps(prompt.output.model_json_schema(), ensure_ascii=False)
+    instructions = f"Respond only with a JSON object that follows this JSON schema, without any other text:\n{schema}"
+    return {
+        "recordId": record_id,
+        "modelInput": {
+            "schemaVersion": "messages-v1",
+            "system": [{"text": f"{system.content}\n{instructions}"}],
+            "messages": [{"role": "user", "content": [{"text": human.content}]}],
+            "inferenceConfig": {"maxTokens": max_tokens},
+        },
+    }
+
+
+def parse_output(record: dict, output: type[BaseModel]) -> BaseModel:
+    """Validate the JSON answer of one output record, raises ValueError when the record failed"""
+    if record.get("error"):
+        raise ValueError(f"Record {record.get('recordId')} failed: {record['error']}")
+    content = record.get("modelOutput", {}).get("output", {}).get("message", {}).get("content", [])
+    text = "".join(block.get("text", "") for block in content)
+    # models sometimes wrap the object in a markdown fence
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError(f"Record {record.get('recordId')} has no JSON answer")
+    return output.model_validate_json(text[start:end + 1])
+
+
+class BatchInferenceJob:
+    """
+    Runs agent inputs as a Bedrock batch inference job: the records are written as JSONL under
+    `s3_uri`, a model invocation job reads them with `role_arn`, and the output JSONL is mapped
+    back to the inputs by recordId. Results come back in input order, a record that failed or
+    returned invalid JSON comes back as the exception, like chain.batch(return_exceptions=True).
+    """
+
+    def __init__(
+        self,
+        s3_uri: str,
+        role_arn: str,
+        client=None,
+        s3=None,
+        poll_interval: float = 60.0,
+        timeout: float = 24 * 3600,
+        max_tokens: int = 1024,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.bucket, self.prefix = _split_s3_uri(s3_uri)
+        self.role_arn = role_arn
+        self.client = client
+        self.s3 = s3
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+        self._sleep = sleep
+        self._clock = clock
+
+    def _key(self, *parts: str) -> str:
+        return "/".join(part for part in (self.prefix, *parts) if part)
+
+    def run(self, agent: str, inputs: list[dict]) -> list[BaseModel | Exception]:
+        prompt = BATCH_PROMPTS[agent]
+        client = self.client or get_bedrock_batch_client()
+        s3 = self.s3 or get_s3_client()
+        job_name = f"{agent.replace('_', '-')}-{uuid.uuid4().hex[:12]}"
+        input_name = f"{job_name}.jsonl"
+        records = [build_record(str(index), prompt, item, self.max_tokens) for index, item in enumerate(inputs)]
+        body = "\n".join(json.dumps(record, ensure_ascii=False) for record in records)
+        s3.put_object(Bucket=self.bucket, Key=self._key("input", input_name), Body=body.encode("utf-8"))
+
+        job = client.create_model_invocation_job(
+            jobName=job_name,
+            roleArn=self.role_arn,
+            modelId=prompt.model_id(),
+            inputDataConfig={"s3InputDataConfig": {"s3Uri": f"s3://{self.bucket}/{self._key('input', input_name)}"}},
+            outputDataConfig={"s3OutputDataConfig": {"s3Uri": f"s3://{self.bucket}/{self._key('output')}/"}},
+        )
+        job_arn = job["jobArn"]
+        print(f"Submitted batch inference job {job_name} with {len(records)} records")
+        status = self._wait(client, job_arn)
+        if status not in ("Completed", "PartiallyCompleted"):
+            error = RuntimeError(f"Batch inference job {job_name} ended with status {status}")
+            return [error] * len(inputs)
+
+        # Bedrock writes <output prefix>/<job id>/<input file name>.out
+        job_id = job_arn.rsplit("/", 1)[-1]
+        output = s3.get_object(Bucket=self.bucket, Key=self._key("output", job_id, f"{input_name}.out"))
+        answered = {}
+        for line in output["Body"].read().decode("utf-8").splitlines():
+            if line.strip():
+                record = json.loads(line)
+                answered[record["recordId"]] = record
+
+        results = []
+        for record in records:
+            try:
+                if record["recordId"] not in answered:
+                    raise ValueError(f"Record {record['recordId']} is missing from the job output")
+                results.append(parse_output(answered[record["recordId"]], prompt.output))
+            except Exception as error:
+                results.append(error)
+        return results
+
+    def _wait(self, client, job_arn: str) -> str:
+        deadline = self._clock() + self.timeout
+        while True:
+            status = client.get_model_invocation_job(jobIdentifier=job_arn)["status"]
+            if status in FINAL_STATUSES:
+                return status
+            if self._clock() >= deadline:
+                client.stop_model_invocation_job(jobIdentifier=job_arn)
+                return "Timeout"
+            self._sleep(self.poll_interval)
+
+
+def batch_inference_configured() -> bool:
+    return bool(os.getenv("BATCH_INFERENCE_S3_URI") and os.getenv("BATCH_INFERENCE_ROLE_ARN"))
+
+
+_job = None
+
+def get_batch_inference_job() -> BatchInferenceJob:
+    """Process-wide job runner writing under BATCH_INFERENCE_S3_URI as BATCH_INFERENCE_ROLE_ARN"""
+    global _job
+    if _job is None:
+        if not batch_inference_configured():
+            raise ValueError("Batch inference needs BATCH_INFERENCE_S3_URI and BATCH_INFERENCE_ROLE_ARN")
+        _job = BatchInferenceJob(
+            s3_uri=os.getenv("BATCH_INFERENCE_S3_URI", ""),
+            role_arn=os.getenv("BATCH_INFERENCE_ROLE_ARN", ""),
+            poll_interval=float(os.getenv("BATCH_INFERENCE_POLL_INTERVAL", "60")),
+            timeout=float(os.getenv("BATCH_INFERENCE_TIMEOUT", "86400"))
+        )
+    return _job
+
+def set_batch_inference_job(job: BatchInferenceJob | None):
+    """Replace the process-wide job runner, None rebuilds it from the environment on next use"""
+    global _job
+    _job = job
@@ -1,24 +1,59 @@
-import boto3
-from langchain_aws import ChatBedrock
 from dotenv import load_dotenv
+from ..utils.lazy import LazyRegistry
 
 import os
 
 load_dotenv()
 
-bedrock_client = boto3.client("bedrock-runtime", region_name=os.getenv("AWS_REGION", "us-east-1"))
-
-llm_writer = ChatBedrock(
-    model=os.getenv("LLM_WRITER", ""),
-    client=bedrock_client
-)
-
-llm_categorizer = ChatBedrock(
-    model=os.getenv("LLM_CATEGORIZER", ""),
-    client=bedrock_client
-)
-
-
-
-
-
+# boto3 and langchain_aws are imported inside the factories: they are slow to import and
+# the clients need AWS configuration, neither should be paid just for importing the graph
+
+def _create_bedrock_client():
+    import boto3
+    return boto3.client("bedrock-runtime", region_name=os.getenv("AWS_REGION", "us-east-1"))
+
+def _create_bedrock_batch_client():
+    """Control-plane client, batch inference jobs are not part of bedrock-runtime"""
+    import boto3
+    return boto3.client("bedrock", region_name=os.getenv("AWS_REGION", "us-east-1"))
+
+def _create_s3_client():
+    import boto3
+    return boto3.client("s3", region_name=os.getenv("AWS_REGION", "us-east-1"))
+
+def _create_llm_writer():
+    from langchain_aws import ChatBedrock
+    return ChatBedrock(
+        model=os.getenv("LLM_WRITER", ""),
+        client=BEDROCK["client"]
+    )
+
+def _create_llm_categorizer():
+    from langchain_aws import ChatBedrock
+    return ChatBedrock(
+        model=os.getenv("LLM_CATEGORIZER", ""),
+        client=BEDROCK["client"]
+    )
+
+BEDROCK = LazyRegistry({
+    "client": _create_bedrock_client,
+    "batch_client": _create_bedrock_batch_client,
+    "s3": _create_s3_client,
+    "llm_writer": _create_llm_writer,
+    "llm_categorizer": _create_llm_categorizer
+})
+
+def get_bedrock_client():
+    return BEDROCK["client"]
+
+def get_bedrock_batch_client():
+    return BEDROCK["batch_client"]
+
+def get_s3_client():
+    return BEDROCK["s3"]
+
+def get_llm_writer():
+    return BEDROCK["llm_writer"]
+
+def get_llm_categorizer():
+    return BEDROCK["llm_categorizer"]
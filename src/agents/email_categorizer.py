@@ -1,11 +1,13 @@
-from ..prompts import EMAIL_CATEGORIZER_PROMPT
+from ..prompts import EMAIL_CATEGORIZER_SYSTEM_PROMPT, EMAIL_CATEGORIZER_HUMAN_PROMPT
 from ..structured_outputs import CategorizerEmailOutput
-from .bedrock import llm_categorizer
-from langchain_core.prompts import PromptTemplate
+from .bedrock import get_llm_categorizer
+from .prompt_cache import build_chat_prompt, prompt_caching_enabled
 
 def categorize_email():
-    email_categorizer_prompt = PromptTemplate(
-        template=EMAIL_CATEGORIZER_PROMPT,
-        input_variables=["email"]
+    llm = get_llm_categorizer()
+    email_categorizer_prompt = build_chat_prompt(
+        system=EMAIL_CATEGORIZER_SYSTEM_PROMPT,
+        human=EMAIL_CATEGORIZER_HUMAN_PROMPT,
+        cache=prompt_caching_enabled(llm.model_id)
     )
-    return email_categorizer_prompt | llm_categorizer.with_structured_output(CategorizerEmailOutput)
\ No newline at end of file
+    return email_categorizer_prompt | llm.with_structured_output(CategorizerEmailOutput)
\ No newline at end of file
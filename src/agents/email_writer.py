@@ -1,19 +1,19 @@
 from ..utils.rag_utils import get_retriever_tool
-from ..prompts import EMAIL_WRITER_PROMPT
+from ..prompts import EMAIL_WRITER_SYSTEM_PROMPT, EMAIL_WRITER_HUMAN_PROMPT
 from ..state import Email
-from .bedrock import llm_writer
-from langchain_core.prompts import PromptTemplate
+from .bedrock import get_llm_writer
+from .prompt_cache import build_chat_prompt, prompt_caching_enabled
 
 def _create_email_writer_chain(use_rag: bool, use_structured_output: bool):
     """Create an email writer chain with configurable RAG and structured output"""
-    llm = llm_writer
+    llm = get_llm_writer()
+    email_writer_prompt_template = build_chat_prompt(
+        system=EMAIL_WRITER_SYSTEM_PROMPT,
+        human=EMAIL_WRITER_HUMAN_PROMPT,
+        cache=prompt_caching_enabled(llm.model_id)
+    )
     if use_rag:
         llm = llm.bind_tools([get_retriever_tool()])
-    
-    email_writer_prompt_template = PromptTemplate(
-        template=EMAIL_WRITER_PROMPT,
-        input_variables=["email_category", "email_content", "context"]
-    )
 
     email_writer_chain = email_writer_prompt_template | llm
 
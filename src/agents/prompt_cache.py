@@ -0,0 +1,26 @@
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+# Converse API content block: everything before it (tools, system) is cached by Bedrock
+CACHE_POINT = {"cachePoint": {"type": "default"}}
+# ChatBedrock talks Converse to Nova models by default, the only path where cachePoint blocks are valid
+PROMPT_CACHING_MODELS = ("amazon.nova",)
+
+def prompt_caching_enabled(model_id: str) -> bool:
+    """PROMPT_CACHING=auto (default) enables cache points for supported models, on/off forces it"""
+    mode = os.getenv("PROMPT_CACHING", "auto")
+    if mode in ("on", "off"):
+        return mode == "on"
+    return any(family in model_id for family in PROMPT_CACHING_MODELS)
+
+def build_chat_prompt(system: str, human: str, cache: bool) -> ChatPromptTemplate:
+    """
+    Static system segment, optionally closed by a cache point, followed by the per-email human template.
+    The system message is a literal, not a template, so it renders byte-identical on every call.
+    """
+    content = [{"type": "text", "text": system}, CACHE_POINT] if cache else system
+    return ChatPromptTemplate.from_messages([SystemMessage(content=content), ("human", human)])
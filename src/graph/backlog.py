@@ -0,0 +1,181 @@
+"""
+Offline backlog processing: categorize every email of the backlog in one batched stage, retrieve
+context for the RAG categories, write every reply in a second batched stage, then queue the
+replies in the outbox and send them together.
+
+    python -m src.graph.backlog --max-emails 500 --mode batch_job
+"""
+from collections import Counter
+from langchain_core.runnables import RunnableConfig
+from ..agents import AGENT_REGISTRY
+from ..agents.batch_inference import get_batch_inference_job, BatchInferenceJob
+from ..nodes.context_retriever import _retriever_tool_call
+from ..nodes.email_categorizer import _get_email_body, _lookup_category, _store_category
+from ..nodes.email_listener import _history_mode, mark_processed_node, release_failed_emails
+from ..nodes.email_sender import email_sender_node, flush_outbox_node
+from ..nodes.email_writer import _email_writer_with_context_inputs, _thread_context
+from ..state import GraphState, Email
+from ..structured_outputs import RAG_CATEGORIES
+from ..utils.gmail_history import get_new_emails
+from ..utils.gmail_utils import get_unprocessed_emails
+from ..utils.rag_utils import get_retriever_tool
+from dotenv import load_dotenv
+import argparse
+import os
+
+load_dotenv()
+
+BACKLOG_MODES = ("batch", "batch_job")
+
+
+class BacklogProcessor:
+    """
+    Answers a backlog stage by stage instead of email by email. mode (default: BACKLOG_MODE env
+    var, else batch) picks how the LLM stages run:
+
+    batch sends on-demand requests through chain.batch with at most `max_concurrency`
+    (BACKLOG_MAX_CONCURRENCY) in flight.
+
+    batch_job submits each stage as a Bedrock batch inference job (see
+    src/agents/batch_inference.py), which is billed at the batch discount but can take hours.
+    Stages with fewer than `min_job_records` (BATCH_INFERENCE_MIN_RECORDS, Bedrock's per-job
+    minimum) pending emails, and records the job could not answer, go through chain.batch.
+
+    The pre-classifier and the categorization cache are consulted before any request, and
+    retrieval follows the single_pass writer mode: context is fetched directly for RAG categories.
+    """
+
+    def __init__(
+        self,
+        mode: str | None = None,
+        max_concurrency: int | None = None,
+        min_job_records: int | None = None,
+        batch_job: BatchInferenceJob | None = None
+    ):
+        self.mode = mode or os.getenv("BACKLOG_MODE", "batch")
+        if self.mode not in BACKLOG_MODES:
+            raise ValueError(f"Unknown backlog mode: {self.mode}")
+        self.max_concurrency = max_concurrency or int(os.getenv("BACKLOG_MAX_CONCURRENCY", "8"))
+        self.min_job_records = min_job_records if min_job_records is not None else int(os.getenv("BATCH_INFERENCE_MIN_RECORDS", "100"))
+        self.batch_job = batch_job
+        self.stats = Counter()
+
+    def process(self, emails: list[Email], config: RunnableConfig | None = None) -> list[GraphState]:
+        """Categorize, retrieve and write for every email; returns one state per email, ready to send"""
+        states: list[GraphState] = [
+            {"current_email": email, "email_category": "", "email_response": "", "messages": []} # type: ignore
+            for email in emails
+        ]
+        self._categorize(states, config)
+        self._retrieve(states, config)
+        self._write(states, config)
+        return states
+
+    def send(self, states: list[GraphState]) -> list[str]:
+        """Queue every written reply in the outbox, flush it once, and return the answered email ids"""
+        answered = []
+        for state in states:
+            if not isinstance(state["email_response"], Email):
+                continue
+            try:
+                email_sender_node(state, {"configurable": {"defer_send": True}})
+                answered.append(state["current_email"].id) # type: ignore
+            except Exception as error:
+                print(f"An error occurred while queueing the reply to email {state['current_email'].id}: {error}") # type: ignore
+                release_failed_emails([state["current_email"].id]) # type: ignore
+        flush_outbox_node({"emails": [], "processed_email_ids": answered})
+        return answered
+
+    def run(self, max_emails: int | None = None, config: RunnableConfig | None = None) -> list[GraphState]:
+        """Load up to `max_emails` unprocessed emails, answer them and mark the answered ones processed"""
+        emails = get_new_emails(max_messages=max_emails) if _history_mode() else get_unprocessed_emails(max_messages=max_emails)
+        print(f"Loaded {len(emails)} backlog emails")
+        states = self.process(emails, config)
+        answered = self.send(states)
+        mark_processed_node({"emails": emails, "processed_email_ids": answered})
+        print(f"Answered {len(answered)}/{len(emails)} backlog emails: {dict(self.stats)}")
+        return states
+
+    def _run_agent(self, agent: str, inputs: list[dict], config: RunnableConfig | None) -> list:
+        """Results in input order, a failed input comes back as its exception"""
+        if not inputs:
+            return []
+        if self.mode == "batch_job" and len(inputs) >= self.min_job_records:
+            results = (self.batch_job or get_batch_inference_job()).run(agent, inputs)
+            self.stats["job_records"] += len(inputs)
+            retry = [index for index, result in enumerate(results) if isinstance(result, Exception)]
+            if retry:
+                print(f"Retrying {len(retry)} {agent} records on demand")
+                for index, result in zip(retry, self._chain_batch(agent, [inputs[index] for index in retry], config)):
+                    results[index] = result
+            return results
+        return self._chain_batch(agent, inputs, config)
+
+    def _chain_batch(self, agent: str, inputs: list[dict], config: RunnableConfig | None) -> list:
+        self.stats["on_demand_calls"] += len(inputs)
+        return AGENT_REGISTRY[agent].batch(
+            inputs,
+            config={**(config or {}), "max_concurrency": self.max_concurrency},
+            return_exceptions=True
+        )
+
+    def _categorize(self, states: list[GraphState], config: RunnableConfig | None):
+        pending = []
+        for state in states:
+            body = _get_email_body(state) or ""
+            category, key = _lookup_category(state, body)
+            if category is None:
+                pending.append((state, key, body))
+            else:
+                state["email_category"] = category
+                self.stats["categorized_locally"] += 1
+        results = self._run_agent("email_categorizer", [{"email": body} for _, _, body in pending], config)
+        for (state, key, _), result in zip(pending, results):
+            if isinstance(result, Exception):
+                self._fail(state, "categorizing", result)
+                continue
+            state["email_category"] = result.category.value
+            _store_category(key, state["email_category"])
+
+    def _retrieve(self, states: list[GraphState], config: RunnableConfig | None):
+        calls = [(state, _retriever_tool_call(state)) for state in states if state["email_category"] in RAG_CATEGORIES]
+        calls = [(state, tool_call) for state, tool_call in calls if tool_call is not None]
+        if not calls:
+            return
+        messages = get_retriever_tool().batch(
+            [tool_call for _, tool_call in calls],
+            config={**(config or {}), "max_concurrency": self.max_concurrency},
+            return_exceptions=True
+        )
+        for (state, _), message in zip(calls, messages):
+            if isinstance(message, Exception):
+                self._fail(state, "retrieving context for", message)
+            else:
+                state["messages"].append(message)
+
+    def _write(self, states: list[GraphState], config: RunnableConfig | None):
+        pending = [(state, _email_writer_with_context_inputs(state, _thread_context(state))) for state in states if state["email_category"]]
+        pending = [(state, inputs) for state, inputs in pending if inputs is not None]
+        results = self._run_agent("email_writer_with_context", [inputs for _, inputs in pending], config)
+        for (state, _), result in zip(pending, results):
+            if isinstance(result, Exception):
+                self._fail(state, "writing the reply to", result)
+            else:
+                state["email_response"] = result
+                self.stats["written"] += 1
+
+    def _fail(self, state: GraphState, stage: str, error: Exception):
+        # the email stays unprocessed, the next backlog run picks it up again
+        print(f"An error occurred while {stage} email {state['current_email'].id}: {error}") # type: ignore
+        release_failed_emails([state["current_email"].id]) # type: ignore
+        state["email_category"] = ""
+        self.stats["failed"] += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-emails", type=int, default=int(os.getenv("BACKLOG_MAX_EMAILS", "500")))
+    parser.add_argument("--mode", choices=BACKLOG_MODES, default=None)
+    parser.add_argument("--max-concurrency", type=int, default=None)
+    args = parser.parse_args()
+    BacklogProcessor(mode=args.mode, max_concurrency=args.max_concurrency).run(max_emails=args.max_emails)
@@ -1,36 +1,387 @@
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import START, StateGraph, END
 from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.types import Send
 from ..utils.rag_utils import get_retriever_tool
-from ..nodes import NODES
-from ..state import GraphState
+from ..nodes import NODES, ASYNC_NODES, BATCH_NODES
+from ..nodes.email_listener import finish_emails, release_failed_emails
+from ..state import GraphState, BatchGraphState, Email
+from ..structured_outputs import RAG_CATEGORIES
+from ..utils.body_store import adetach_body, attach_body, awith_body, detach_body
+from ..utils.preclassifier import get_preclassifier
+from ..utils.reply_cache import get_reply_cache
+from ..utils.checkpointer import create_checkpointer
+from ..utils.metrics import start_metrics_server
+from ..utils.tracing import trace
+from dotenv import load_dotenv
+from typing import Callable
+import asyncio
+import functools
+import inspect
+import os
+
+load_dotenv()
+
+WRITER_MODES = ("two_pass", "single_pass")
+SPECULATION_MODES = ("off", "likely", "always")
 
 
 class EmailSupportGraph:
-    def __init__(self):
+    def __init__(
+        self,
+        batch: bool = False,
+        use_async: bool = False,
+        writer_mode: str | None = None,
+        speculative_retrieval: str | None = None,
+        checkpointer: BaseCheckpointSaver | str | None = None
+    ):
+        """
+        Build the support workflow. By default each run loads and answers the most recent email;
+        with batch=True each run loads every unprocessed email and fans them out in parallel.
+        With use_async=True the nodes are native coroutines, drive the graph with
+        ainvoke/astream/abatch to answer many emails concurrently in one process.
+
+        writer_mode (default: WRITER_MODE env var, else two_pass) picks the writer topology:
+        two_pass lets the writer model decide whether to call the retriever and then writes the
+        structured reply in a second call; single_pass retrieves context for RAG categories
+        directly and writes the structured reply in one call.
+
+        speculative_retrieval (default: SPECULATIVE_RETRIEVAL env var, else off) starts retrieval
+        on the email body in parallel with categorization in single_pass mode: always speculates
+        on every email, likely skips it when the local pre-classifier is confident the email does
+        not need RAG. Retrieved context is discarded when the category turns out not to need it.
+
+        checkpointer (default: CHECKPOINTER env var, else none) is a saver instance or a backend
+        name from src/utils/checkpointer.py. Each email then runs on its own thread keyed by the
+        email id: a run interrupted by a crash resumes from its last completed node, and an email
+        that was already answered is skipped. See process_email and resume_interrupted.
+
+        With a reply cache (REPLY_CACHE_ENABLED=true, or set_reply_cache before building, see
+        src/utils/reply_cache.py), a reuse_reply step after categorization answers near-duplicates
+        of earlier emails with their cached reply and skips retrieval and the writer.
+        """
+        self.nodes = ASYNC_NODES if use_async else NODES
+        self.writer_mode = writer_mode or os.getenv("WRITER_MODE", "two_pass")
+        if self.writer_mode not in WRITER_MODES:
+            raise ValueError(f"Unknown writer mode: {self.writer_mode}")
+        self.speculative_retrieval = speculative_retrieval or os.getenv("SPECULATIVE_RETRIEVAL", "off")
+        if self.speculative_retrieval not in SPECULATION_MODES:
+            raise ValueError(f"Unknown speculative retrieval mode: {self.speculative_retrieval}")
+        if self.speculative_retrieval != "off" and self.writer_mode != "single_pass":
+            raise ValueError("Speculative retrieval requires the single_pass writer mode")
+        if checkpointer is None or isinstance(checkpointer, str):
+            checkpointer = create_checkpointer(checkpointer, use_async=use_async)
+        self.checkpointer = checkpointer
+        self.reuse_replies = get_reply_cache() is not None
+        # METRICS_PORT exposes the node, LLM, retriever and Gmail metrics to Prometheus
+        start_metrics_server()
+        # the per-email workflow, the unit that gets checkpointed
+        self.email_graph = self._build_email_workflow(include_listener=False).compile(checkpointer=checkpointer)
+        if batch:
+            self.graph = self._build_batch_workflow().compile()
+        elif checkpointer is not None:
+            # the thread key is only known once the email is loaded, so the listener stays outside
+            self.graph = self._build_listener_workflow().compile()
+        else:
+            self.graph = self._build_email_workflow(include_listener=True).compile()
+
+    def _build_email_workflow(self, include_listener: bool) -> StateGraph:
         workflow = StateGraph(GraphState)
-        workflow.add_node("load_email", NODES["email_listener"])
-        workflow.add_node("categorize_email", NODES["email_categorizer"])
-        workflow.add_node("query_or_email", NODES["query_or_email"])
-        workflow.add_node("retrieve", ToolNode([get_retriever_tool()]))
-        workflow.add_node("write_email_with_context", NODES["email_writer_with_context"])
-        workflow.add_node("send_email", NODES["email_sender"])
+        nodes = self.nodes
+        if include_listener:
+            # the graph claims its own email, so a step that fails hands the claim back
+            nodes = {name: node if name == "email_listener" else _release_on_error(node) for name, node in nodes.items()}
+        workflow.add_node("categorize_email", nodes["email_categorizer"])
+        workflow.add_node("write_email_with_context", nodes["email_writer_with_context"])
+        workflow.add_node("send_email", nodes["email_sender"])
 
-        workflow.add_edge(START, "load_email")
-        workflow.add_edge("load_email", "categorize_email")
-        workflow.add_edge("categorize_email", "query_or_email")
-
-        workflow.add_conditional_edges(
-            "query_or_email",
-            tools_condition,
-            {
-                "tools": "retrieve",
-                END: "write_email_with_context"
-            }
-        )
+        entry = START
+        if include_listener:
+            workflow.add_node("load_email", nodes["email_listener"])
+            workflow.add_edge(START, "load_email")
+            entry = "load_email"
+
+        if self.speculative_retrieval != "off":
+            workflow.add_node("speculative_retrieve", nodes["speculative_retriever"])
+            workflow.add_node("join_context", nodes["context_join"])
+            workflow.add_node("retrieve_context", nodes["context_retriever"])
+            workflow.add_conditional_edges(
+                entry,
+                RunnableLambda(self._speculation_targets, afunc=self._aspeculation_targets),
+                ["categorize_email", "speculative_retrieve"]
+            )
+            # both branches run in the same step, join_context runs once after them
+            workflow.add_edge("categorize_email", "join_context")
+            workflow.add_edge("speculative_retrieve", "join_context")
+            self._route_to_writer(workflow, nodes, "join_context", _route_after_join, ["retrieve_context", "write_email_with_context"])
+            workflow.add_edge("retrieve_context", "write_email_with_context")
+        elif self.writer_mode == "single_pass":
+            workflow.add_edge(entry, "categorize_email")
+            workflow.add_node("retrieve_context", nodes["context_retriever"])
+            self._route_to_writer(workflow, nodes, "categorize_email", _route_by_category, ["retrieve_context", "write_email_with_context"])
+            workflow.add_edge("retrieve_context", "write_email_with_context")
+        else:
+            workflow.add_edge(entry, "categorize_email")
+            workflow.add_node("query_or_email", nodes["query_or_email"])
+            workflow.add_node("retrieve", ToolNode([get_retriever_tool()]))
+            self._route_to_writer(workflow, nodes, "categorize_email", None, ["query_or_email"])
+            workflow.add_conditional_edges(
+                "query_or_email",
+                _route_after_query,
+                {
+                    "tools": "retrieve",
+                    END: "write_email_with_context"
+                }
+            )
+            workflow.add_edge("retrieve", "write_email_with_context")
 
-        workflow.add_edge("retrieve", "write_email_with_context")
         workflow.add_edge("write_email_with_context", "send_email")
         workflow.add_edge("send_email", END)
+        return workflow
+
+    def _route_to_writer(self, workflow: StateGraph, nodes: dict, source: str, route: Callable | None, targets: list[str]):
+        """
+        Edges from source on to the writer (targets[0] when there is no route). With the reply
+        cache they go through reuse_reply, and a reused reply goes straight to send_email.
+        """
+        if self.reuse_replies:
+            workflow.add_node("reuse_reply", nodes["reply_reuse"])
+            workflow.add_edge(source, "reuse_reply")
+            workflow.add_conditional_edges("reuse_reply", _unless_reused(route or (lambda state: targets[0])), [*targets, "send_email"])
+        elif route is None:
+            workflow.add_edge(source, targets[0])
+        else:
+            workflow.add_conditional_edges(source, route, targets)
+
+    def _speculation_targets(self, state: GraphState) -> list[str]:
+        """Run categorization, plus retrieval on the side when the speculation policy allows it"""
+        email = attach_body(state.get("current_email"))
+        if not isinstance(email, Email) or not email.body:
+            return ["categorize_email"]
+        if self.speculative_retrieval == "likely":
+            preclassifier = get_preclassifier()
+            result = preclassifier.classify(email) if preclassifier is not None else None
+            if result is not None and result.decided and result.category.value not in RAG_CATEGORIES: # type: ignore
+                return ["categorize_email"]
+        return ["categorize_email", "speculative_retrieve"]
+
+    async def _aspeculation_targets(self, state: GraphState) -> list[str]:
+        return self._speculation_targets(await awith_body(state))
+
+    def _build_batch_workflow(self) -> StateGraph:
+        workflow = StateGraph(BatchGraphState)
+        workflow.add_node("load_emails", BATCH_NODES["email_batch_listener"])
+        workflow.add_node(
+            "process_email",
+            RunnableLambda(self._process_email, afunc=self._aprocess_email),
+            input=GraphState
+        )
+        workflow.add_node("flush_outbox", BATCH_NODES["flush_outbox"])
+        workflow.add_node("mark_processed", BATCH_NODES["mark_processed"])
+
+        workflow.add_edge(START, "load_emails")
+        workflow.add_conditional_edges("load_emails", _fan_out_emails, ["process_email"])
+        # replies are only queued per email and sent together once every email has been written
+        workflow.add_edge("process_email", "flush_outbox")
+        workflow.add_edge("flush_outbox", "mark_processed")
+        workflow.add_edge("mark_processed", END)
+        return workflow
+
+    def _build_listener_workflow(self) -> StateGraph:
+        workflow = StateGraph(GraphState)
+        workflow.add_node("load_email", self.nodes["email_listener"])
+        workflow.add_node("process_email", RunnableLambda(self._answer_loaded_email, afunc=self._aanswer_loaded_email))
+        workflow.add_edge(START, "load_email")
+        workflow.add_edge("load_email", "process_email")
+        workflow.add_edge("process_email", END)
+        return workflow
+
+    def process_email(self, email: Email, config: RunnableConfig | None = None, defer_send: bool = False) -> dict:
+        """
+        Answer one email on its own thread (the email id). With a checkpointer, an interrupted
+        run resumes from its last completed node and an answered email is returned as is.
+        """
+        with trace("email", email_id=email.id):
+            return self._run_email(email, _email_run_config(email, config, defer_send))
+
+    def _run_email(self, email: Email, config: RunnableConfig) -> dict:
+        if self.checkpointer is not None:
+            snapshot = self.email_graph.get_state(config)
+            if snapshot.values and not snapshot.next:
+                print(f"Email {email.id} was already answered, skipping")
+                return snapshot.values
+            if snapshot.next:
+                print(f"Resuming email {email.id} at {', '.join(snapshot.next)}")
+                return self.email_graph.invoke(None, config)
+        return self.email_graph.invoke(_initial_state(detach_body(email)), config)
+
+    async def aprocess_email(self, email: Email, config: RunnableConfig | None = None, defer_send: bool = False) -> dict:
+        """Async variant of process_email"""
+        with trace("email", email_id=email.id):
+            return await self._arun_email(email, _email_run_config(email, config, defer_send))
+
+    async def _arun_email(self, email: Email, config: RunnableConfig) -> dict:
+        if self.checkpointer is not None:
+            snapshot = await self.email_graph.aget_state(config)
+            if snapshot.values and not snapshot.next:
+                print(f"Email {email.id} was already answered, skipping")
+                return snapshot.values
+            if snapshot.next:
+                print(f"Resuming email {email.id} at {', '.join(snapshot.next)}")
+                return await self.email_graph.ainvoke(None, config)
+        return await self.email_graph.ainvoke(_initial_state(await adetach_body(email)), config)
+
+    def interrupted_emails(self) -> list[str]:
+        """Ids of emails whose last checkpointed run stopped before sending the reply"""
+        if self.checkpointer is None:
+            return []
+        thread_ids = dict.fromkeys(
+            checkpoint.config["configurable"]["thread_id"] for checkpoint in self.checkpointer.list(None)
+        )
+        return [
+            thread_id for thread_id in thread_ids
+            if self.email_graph.get_state({"configurable": {"thread_id": thread_id}}).next
+        ]
+
+    def resume_interrupted(self) -> list[str]:
+        """
+        Finish every interrupted run, e.g. at startup after a crash. Needed because the listener
+        will not hand those emails out again.
+        """
+        resumed = []
+        for thread_id in self.interrupted_emails():
+            try:
+                self.email_graph.invoke(None, {"configurable": {"thread_id": thread_id}})
+                resumed.append(thread_id)
+            except Exception as error:
+                print(f"An error occurred while resuming email {thread_id}: {error}")
+        return resumed
+
+    def _answer_loaded_email(self, state: GraphState, config: RunnableConfig):
+        email = state["current_email"]
+        if not isinstance(email, Email):
+            return {}
+        try:
+            result = self.process_email(email, config)
+        except Exception:
+            release_failed_emails([email.id])
+            raise
+        # also ends the claim of an email the checkpointer had already answered
+        finish_emails([email.id])
+        return _answer_fields(result)
+
+    async def _aanswer_loaded_email(self, state: GraphState, config: RunnableConfig):
+        email = state["current_email"]
+        if not isinstance(email, Email):
+            return {}
+        try:
+            result = await self.aprocess_email(email, config)
+        except Exception:
+            await asyncio.to_thread(release_failed_emails, [email.id])
+            raise
+        await asyncio.to_thread(finish_emails, [email.id])
+        return _answer_fields(result)
+
+    def _process_email(self, state: GraphState, config: RunnableConfig):
+        """Run the single-email workflow for one fanned-out email"""
+        email = state["current_email"]
+        try:
+            self.process_email(email, config, defer_send=True)
+        except Exception as error:
+            # leave the email unprocessed so the next batch run retries it
+            print(f"An error occurred while processing email {email.id}: {error}")
+            release_failed_emails([email.id])
+            return {"processed_email_ids": []}
+        return {"processed_email_ids": [email.id]}
+
+    async def _aprocess_email(self, state: GraphState, config: RunnableConfig):
+        """Async variant of _process_email"""
+        email = state["current_email"]
+        try:
+            await self.aprocess_email(email, config, defer_send=True)
+        except Exception as error:
+            print(f"An error occurred while processing email {email.id}: {error}")
+            await asyncio.to_thread(release_failed_emails, [email.id])
+            return {"processed_email_ids": []}
+        return {"processed_email_ids": [email.id]}
+
+
+def _release_on_error(node: Callable) -> Callable:
+    """
+    node, except that an exception releases the listener claim of the email being answered.
+    The retriever ToolNode is not wrapped, it turns tool errors into messages itself.
+    """
+    def _claimed(state: GraphState) -> list[str]:
+        email = state.get("current_email")
+        return [email.id] if isinstance(email, Email) else []
+
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def async_wrapper(state, *args, **kwargs):
+            try:
+                return await node(state, *args, **kwargs)
+            except Exception:
+                await asyncio.to_thread(release_failed_emails, _claimed(state))
+                raise
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(state, *args, **kwargs):
+        try:
+            return node(state, *args, **kwargs)
+        except Exception:
+            release_failed_emails(_claimed(state))
+            raise
+    return wrapper
+
+def _route_by_category(state: GraphState):
+    if state.get("email_category") in RAG_CATEGORIES:
+        return "retrieve_context"
+    return "write_email_with_context"
+
+def _route_after_query(state: GraphState):
+    """tools_condition, for a run where the writer had no email to answer and added no message"""
+    if not state.get("messages"):
+        return END
+    return tools_condition(state) # type: ignore
+
+def _route_after_join(state: GraphState):
+    """RAG categories without speculative context still need a regular retrieval"""
+    messages = state.get("messages") or []
+    if state.get("email_category") in RAG_CATEGORIES and not (messages and messages[-1].type == "tool"):
+        return "retrieve_context"
+    return "write_email_with_context"
+
+def _unless_reused(route: Callable) -> Callable:
+    """route, except for an email the reply cache already answered"""
+    def _route(state: GraphState):
+        if isinstance(state.get("email_response"), Email):
+            return "send_email"
+        return route(state)
+    return _route
+
+def _initial_state(email: Email) -> GraphState:
+    """The state a run starts from, for an email whose body was already detached"""
+    return {
+        "current_email": email,
+        "email_category": "",
+        "email_response": "",
+        "messages": []
+    }
+
+def _email_run_config(email: Email, config: RunnableConfig | None, defer_send: bool) -> RunnableConfig:
+    """
+    A standalone run on the email's own thread. The caller's callbacks are kept, its configurable
+    is not: inheriting the parent's checkpoint namespace would make the thread unresumable.
+    """
+    configurable = {"thread_id": email.id}
+    if defer_send:
+        configurable["defer_send"] = True
+    return {"callbacks": (config or {}).get("callbacks"), "configurable": configurable}
 
-        self.graph = workflow.compile()
+def _answer_fields(result: dict) -> dict:
+    return {key: result[key] for key in ("email_category", "email_response") if key in result}
 
+def _fan_out_emails(state: BatchGraphState):
+    return [Send("process_email", _initial_state(email)) for email in state["emails"]]
@@ -0,0 +1,200 @@
+"""
+Multi-process runner for one or more support mailboxes (MAILBOXES_PATH, see
+src/utils/mailboxes.py). Each round loads the new emails of every mailbox into the work queue
+(src/utils/work_queue.py), lets a pool of worker processes answer them, each with its own
+EmailSupportGraph and per-mailbox Gmail clients, then sends the queued replies and marks the
+emails processed, mailbox by mailbox. Emails of the same thread are answered one after the other,
+everything else in parallel.
+
+    python -m src.graph.workers --workers 4 --rounds 1
+"""
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from ..nodes.email_listener import _history_mode, mark_processed_node, release_failed_emails
+from ..nodes.email_sender import flush_outbox_node
+from ..utils.gmail_history import get_new_emails
+from ..utils.gmail_utils import get_unprocessed_emails
+from ..utils.mailboxes import Mailbox, load_mailboxes, use_mailbox
+from ..utils.work_queue import create_work_queue
+from dotenv import load_dotenv
+from typing import Callable
+import argparse
+import multiprocessing
+import os
+import socket
+import time
+
+load_dotenv()
+
+# the worker process's graph, built once by the pool initializer
+_worker_graph = None
+
+
+def _init_worker(started, graph_options: dict, setup: Callable | None, setup_args: tuple):
+    global _worker_graph
+    with started.get_lock():
+        started.value += 1
+        index = started.value
+    port = os.getenv("METRICS_PORT")
+    if port:
+        # every worker has its own registry, worker n serves it on METRICS_PORT + n
+        os.environ["METRICS_PORT"] = str(int(port) + index)
+    if setup is not None:
+        # e.g. install fake backends before anything is built
+        setup(*setup_args)
+    from .email_graph import EmailSupportGraph
+    _worker_graph = EmailSupportGraph(**graph_options)
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+def drain_queue(queue_backend: str | None = None, queue_path: str | None = None, idle_wait: float = 0.05) -> Counter:
+    """
+    Worker loop: answer queued emails until nothing can be claimed and no worker holds an item.
+    Replies are only queued in the mailbox's outbox, the pool sends them once the round is over.
+    """
+    queue = create_work_queue(queue_backend, queue_path)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    stats = Counter()
+    while True:
+        items = queue.claim(worker)
+        if not items:
+            if not queue.status_counts().get("running"):
+                return stats
+            # the next email of a thread waits for the one another worker is answering
+            stats["waits"] += 1
+            time.sleep(idle_wait)
+            continue
+        for item in items:
+            with use_mailbox(item.mailbox):
+                try:
+                    _worker_graph.process_email(item.email, defer_send=True) # type: ignore
+                    queue.complete(item.id)
+                    stats["answered"] += 1
+                except Exception as error:
+                    print(f"An error occurred while processing email {item.email.id} of {item.mailbox}: {error}")
+                    if queue.fail(item.id, str(error)):
+                        # out of queue attempts, the listener delivers it again on a later sync
+                        release_failed_emails([item.email.id])
+                    stats["failed"] += 1
+
+
+class WorkerPool:
+    """
+    Answers the emails of several mailboxes with `workers` processes (WORKER_COUNT, default: one
+    per core). The parent process owns the listeners and the outboxes, so every mailbox is polled
+    and sends within its quota from one place; worker processes only run the graph.
+
+    graph_options are passed to EmailSupportGraph in every worker. worker_setup(*setup_args), a
+    module-level function, runs first in each worker, e.g. to install fake backends.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        mailboxes: list[Mailbox] | None = None,
+        queue_backend: str | None = None,
+        queue_path: str | None = None,
+        graph_options: dict | None = None,
+        worker_setup: Callable | None = None,
+        setup_args: tuple = ()
+    ):
+        self.workers = workers or int(os.getenv("WORKER_COUNT", str(os.cpu_count() or 1)))
+        self.mailboxes = mailboxes or load_mailboxes()
+        self.queue_backend = queue_backend
+        self.queue_path = queue_path
+        self.queue = create_work_queue(queue_backend, queue_path)
+        self.graph_options = graph_options or {}
+        self.worker_setup = worker_setup
+        self.setup_args = setup_args
+        self.stats = Counter()
+        self._executor = None
+
+    def start(self) -> list[int]:
+        """Start the worker processes and wait until every one has built its graph; returns their pids"""
+        if self._executor is None:
+            # spawn, a forked worker would share the parent's SQLite connections and HTTP clients
+            context = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(context.Value("i", 0), self.graph_options, self.worker_setup, self.setup_args)
+            )
+        return [future.result() for future in [self._executor.submit(_worker_ready) for _ in range(self.workers)]]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def enqueue(self) -> int:
+        """Queue the new emails of every mailbox, returns how many were added"""
+        added = 0
+        for mailbox in self.mailboxes:
+            with use_mailbox(mailbox.name):
+                # history deltas come oldest first, search results newest first
+                emails = get_new_emails() if _history_mode() else get_unprocessed_emails()[::-1]
+            added += self.queue.put(mailbox.name, emails)
+        self.stats["enqueued"] += added
+        return added
+
+    def drain(self) -> Counter:
+        """Let every worker answer queued emails until the queue has nothing left to hand out"""
+        self.start()
+        futures = [self._executor.submit(drain_queue, self.queue_backend, self.queue_path) for _ in range(self.workers)] # type: ignore
+        outcome = Counter()
+        for future in futures:
+            outcome.update(future.result())
+        self.stats.update(outcome)
+        return outcome
+
+    def settle(self) -> int:
+        """Send the replies written since the last call and mark their emails processed, per mailbox"""
+        settled = 0
+        for mailbox in self.mailboxes:
+            with use_mailbox(mailbox.name):
+                answered = self.queue.settle(mailbox.name)
+                if answered:
+                    flush_outbox_node({"emails": [], "processed_email_ids": answered})
+                    mark_processed_node({"emails": [], "processed_email_ids": answered})
+            settled += len(answered)
+        self.stats["settled"] += settled
+        return settled
+
+    def run_round(self) -> Counter:
+        added = self.enqueue()
+        outcome = self.drain()
+        settled = self.settle()
+        print(f"Queued {added} emails, answered {outcome['answered']}, failed {outcome['failed']}, settled {settled}")
+        return outcome
+
+    def run(self, rounds: int | None = None, poll_interval: float | None = None):
+        """Run `rounds` rounds (forever by default), waiting `poll_interval` seconds (WORKER_POLL_INTERVAL) in between"""
+        poll_interval = poll_interval if poll_interval is not None else float(os.getenv("WORKER_POLL_INTERVAL", "30"))
+        with self:
+            completed = 0
+            while rounds is None or completed < rounds:
+                self.run_round()
+                completed += 1
+                if rounds is None or completed < rounds:
+                    time.sleep(poll_interval)
+        print(f"Worker pool stopped: {dict(self.stats)}, queue: {self.queue.status_counts()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rounds", type=int, default=None, help="stop after this many rounds, run forever by default")
+    parser.add_argument("--poll-interval", type=float, default=None)
+    args = parser.parse_args()
+    WorkerPool(workers=args.workers).run(rounds=args.rounds, poll_interval=args.poll_interval)
@@ -1,12 +1,49 @@
-from .email_categorizer import email_categorizer_node
-from .email_listener import email_listener_node
-from .email_writer import query_or_email_node, email_writer_with_context_node
-from .email_sender import email_sender_node
+from ..utils.instrumentation import instrument_nodes
+from .email_categorizer import email_categorizer_node, aemail_categorizer_node
+from .email_listener import email_listener_node, aemail_listener_node, email_batch_listener_node, mark_processed_node
+from .email_writer import (
+    query_or_email_node,
+    aquery_or_email_node,
+    email_writer_with_context_node,
+    aemail_writer_with_context_node,
+    reuse_reply_node,
+    areuse_reply_node
+)
+from .email_sender import email_sender_node, aemail_sender_node, flush_outbox_node
+from .context_retriever import (
+    retrieve_context_node,
+    aretrieve_context_node,
+    speculative_retrieve_node,
+    aspeculative_retrieve_node,
+    join_context_node
+)
 
-NODES = {
+NODES = instrument_nodes({
     "email_listener": email_listener_node,
     "email_categorizer": email_categorizer_node,
     "query_or_email": query_or_email_node,
     "email_writer_with_context": email_writer_with_context_node,
-    "email_sender": email_sender_node
-}
\ No newline at end of file
+    "reply_reuse": reuse_reply_node,
+    "email_sender": email_sender_node,
+    "context_retriever": retrieve_context_node,
+    "speculative_retriever": speculative_retrieve_node,
+    "context_join": join_context_node
+})
+
+ASYNC_NODES = instrument_nodes({
+    "email_listener": aemail_listener_node,
+    "email_categorizer": aemail_categorizer_node,
+    "query_or_email": aquery_or_email_node,
+    "email_writer_with_context": aemail_writer_with_context_node,
+    "reply_reuse": areuse_reply_node,
+    "email_sender": aemail_sender_node,
+    "context_retriever": aretrieve_context_node,
+    "speculative_retriever": aspeculative_retrieve_node,
+    "context_join": join_context_node
+})
+
+BATCH_NODES = instrument_nodes({
+    "email_batch_listener": email_batch_listener_node,
+    "flush_outbox": flush_outbox_node,
+    "mark_processed": mark_processed_node
+})
\ No newline at end of file
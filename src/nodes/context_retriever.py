@@ -0,0 +1,56 @@
+from ..state import GraphState, Email
+from ..structured_outputs import RAG_CATEGORIES
+from ..utils.body_store import attach_body, awith_body
+from ..utils.rag_utils import get_retriever_tool
+
+def _retriever_tool_call(state: GraphState) -> dict | None:
+    """Build a retriever tool call that uses the email body as query"""
+    email = attach_body(state.get("current_email"))
+    if not isinstance(email, Email) or not email.body:
+        return None
+    tool = get_retriever_tool()
+    return {"name": tool.name, "args": {"query": email.body}, "id": f"retrieve_{email.id}", "type": "tool_call"}
+
+def retrieve_context_node(state: GraphState):
+    """Retrieve knowledge-base context directly, without asking the writer model to plan the query"""
+    tool_call = _retriever_tool_call(state)
+    if tool_call is None:
+        return {}
+    return {"messages": [get_retriever_tool().invoke(tool_call)]}
+
+async def aretrieve_context_node(state: GraphState):
+    """Async variant of retrieve_context_node"""
+    tool_call = _retriever_tool_call(await awith_body(state))
+    if tool_call is None:
+        return {}
+    return {"messages": [await get_retriever_tool().ainvoke(tool_call)]}
+
+def speculative_retrieve_node(state: GraphState):
+    """Retrieve context while the email is still being categorized"""
+    tool_call = _retriever_tool_call(state)
+    if tool_call is None:
+        return {}
+    try:
+        return {"speculative_context": get_retriever_tool().invoke(tool_call)}
+    except Exception as error:
+        # a failed speculation falls back to regular retrieval after the join
+        print(f"Speculative retrieval failed: {error}")
+        return {}
+
+async def aspeculative_retrieve_node(state: GraphState):
+    """Async variant of speculative_retrieve_node"""
+    tool_call = _retriever_tool_call(await awith_body(state))
+    if tool_call is None:
+        return {}
+    try:
+        return {"speculative_context": await get_retriever_tool().ainvoke(tool_call)}
+    except Exception as error:
+        print(f"Speculative retrieval failed: {error}")
+        return {}
+
+def join_context_node(state: GraphState):
+    """Keep the speculative context for RAG categories, discard it otherwise"""
+    context = state.get("speculative_context")
+    if context is not None and state.get("email_category") in RAG_CATEGORIES:
+        return {"messages": [context], "speculative_context": None}
+    return {"speculative_context": None}
@@ -1,14 +1,77 @@
 from ..agents import AGENT_REGISTRY
 from ..state import GraphState, Email
+from ..utils.body_store import awith_body, with_body
+from ..utils.cache import get_categorization_cache, categorization_cache_key
+from ..utils.preclassifier import get_preclassifier
 
-def email_categorizer_node(state: GraphState):
-    body = ""
+def _get_email_body(state: GraphState) -> str | None:
+    """Return the body to categorize, or None when there is no email in state"""
     email = state.get("current_email")
     if not email:
-        state["email_category"] = "No email"
-        return state
-    if isinstance(email, Email):
-        body = email.body
-    result = AGENT_REGISTRY["email_categorizer"].invoke({"email": body})
-    state["email_category"] = result.category.value # type: ignore
-    return state
+        return None
+    return email.body if isinstance(email, Email) else ""
+
+def _preclassify(state: GraphState) -> str | None:
+    email = state.get("current_email")
+    preclassifier = get_preclassifier()
+    if preclassifier is not None and isinstance(email, Email):
+        result = preclassifier.classify(email)
+        if result.decided:
+            print(f"Pre-classified email as {result.category.value} ({result.reason})") # type: ignore
+            return result.category.value # type: ignore
+    return None
+
+def _lookup_category(state: GraphState, body: str) -> tuple[str | None, str]:
+    """
+    Resolve the category without the LLM when possible: first the local pre-classifier,
+    then the categorization cache. Returns the category (if any) and the cache key.
+    """
+    category = _preclassify(state)
+    if category is not None:
+        return category, ""
+    cache = get_categorization_cache()
+    key = categorization_cache_key(body)
+    return (cache.get(key) if cache is not None else None), key
+
+async def _alookup_category(state: GraphState, body: str) -> tuple[str | None, str]:
+    """Async variant of _lookup_category, a SQLite cache is read on a worker thread"""
+    category = _preclassify(state)
+    if category is not None:
+        return category, ""
+    cache = get_categorization_cache()
+    key = categorization_cache_key(body)
+    return (await cache.aget(key) if cache is not None else None), key
+
+def _store_category(key: str, category: str):
+    cache = get_categorization_cache()
+    if cache is not None:
+        cache.set(key, category)
+
+async def _astore_category(key: str, category: str):
+    cache = get_categorization_cache()
+    if cache is not None:
+        await cache.aset(key, category)
+
+def email_categorizer_node(state: GraphState):
+    state = with_body(state) # type: ignore
+    body = _get_email_body(state)
+    if body is None:
+        return {"email_category": "No email"}
+    category, key = _lookup_category(state, body)
+    if category is None:
+        result = AGENT_REGISTRY["email_categorizer"].invoke({"email": body})
+        category = result.category.value # type: ignore
+        _store_category(key, category)
+    return {"email_category": category}
+
+async def aemail_categorizer_node(state: GraphState):
+    state = await awith_body(state) # type: ignore
+    body = _get_email_body(state)
+    if body is None:
+        return {"email_category": "No email"}
+    category, key = await _alookup_category(state, body)
+    if category is None:
+        result = await AGENT_REGISTRY["email_categorizer"].ainvoke({"email": body})
+        category = result.category.value # type: ignore
+        await _astore_category(key, category)
+    return {"email_category": category}
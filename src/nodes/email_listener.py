@@ -1,7 +1,47 @@
-from ..state import GraphState
-from ..utils.gmail_utils import get_most_recent_email
+from ..state import GraphState, BatchGraphState
+from ..utils.gmail_utils import get_most_recent_email, get_unprocessed_emails, mark_emails_as_processed
+from ..utils.gmail_history import get_new_emails, mark_emails_as_done, mark_emails_as_failed
+from ..utils.body_store import detach_body
+import asyncio
+import os
+
+def _history_mode() -> bool:
+    """GMAIL_LISTENER=history (default) syncs Gmail history deltas, query falls back to search polling"""
+    return os.getenv("GMAIL_LISTENER", "history") == "history"
+
+def _load_next_email():
+    if _history_mode():
+        emails = get_new_emails(max_messages=1)
+        return emails[0] if emails else ""
+    return get_most_recent_email()
+
+def _next_email():
+    return detach_body(_load_next_email())
 
 def email_listener_node(state: GraphState):
-    email = get_most_recent_email()
-    state["current_email"] = email
-    return state
\ No newline at end of file
+    return {"current_email": _next_email()}
+
+async def aemail_listener_node(state: GraphState):
+    # the Gmail client and the body store are blocking, run them on a worker thread (each thread gets its own client)
+    return {"current_email": await asyncio.to_thread(_next_email)}
+
+def email_batch_listener_node(state: BatchGraphState):
+    emails = get_new_emails() if _history_mode() else get_unprocessed_emails()
+    print(f"Loaded {len(emails)} unprocessed emails")
+    return {"emails": emails}
+
+def mark_processed_node(state: BatchGraphState):
+    email_ids = state.get("processed_email_ids", [])
+    mark_emails_as_processed(email_ids)
+    finish_emails(email_ids)
+    return {}
+
+def finish_emails(email_ids: list[str]):
+    """End the listener claims of answered emails, so they are never delivered again"""
+    if _history_mode():
+        mark_emails_as_done(email_ids)
+
+def release_failed_emails(email_ids: list[str]):
+    """Let the listener deliver emails that could not be answered again; in query mode they simply stay unread"""
+    if _history_mode():
+        mark_emails_as_failed(email_ids)
@@ -1,9 +1,69 @@
-from ..state import GraphState, Email
+from langchain_core.runnables import RunnableConfig
+from ..state import GraphState, BatchGraphState, Email
+from .email_listener import finish_emails, release_failed_emails
+from ..utils.body_store import arelease_body, release_body
 from ..utils.gmail_utils import send_reply_email
+from ..utils.outbox import get_outbox_sender, outbox_enabled
+import asyncio
 
-def email_sender_node(state: GraphState):
+def _send_reply(original_email: Email, reply_email: Email, defer: bool) -> bool:
+    """
+    Queue the reply in the durable outbox and send whatever is due, or only queue it when the
+    caller flushes later (batch runs). OUTBOX_ENABLED=false sends directly. Returns False when
+    the reply was neither sent nor queued.
+    """
+    if not outbox_enabled():
+        return send_reply_email(original_email=original_email, reply_email=reply_email)
+    sender = get_outbox_sender()
+    sender.enqueue(original_email=original_email, reply_email=reply_email)
+    if not defer:
+        _flush(sender)
+    return True
+
+def _deliver(original_email: Email, reply_email, defer: bool):
+    """
+    Send the reply, then settle the email's listener claim. Deferred runs (batch, backlog, workers)
+    leave that to mark_processed once their replies are sent; a single-email run ends the claim
+    here, or releases it when the reply could not be sent so the listener delivers it again.
+    """
+    sent = _send_reply(original_email, reply_email, defer) if isinstance(reply_email, Email) else True
+    if defer:
+        return
+    if sent:
+        finish_emails([original_email.id])
+    else:
+        release_failed_emails([original_email.id])
+
+def _flush(sender):
+    try:
+        return sender.flush()
+    except Exception as error:
+        # the reply stays queued, the next flush picks it up
+        print(f'An error occurred while flushing the outbox: {error}')
+
+def _defer_send(config: RunnableConfig | None) -> bool:
+    return bool(((config or {}).get("configurable") or {}).get("defer_send"))
+
+def email_sender_node(state: GraphState, config: RunnableConfig):
     current_email = state["current_email"]
     reply_email = state["email_response"]
-    if isinstance(current_email, Email) and isinstance(reply_email, Email):
-        send_reply_email(original_email=current_email, reply_email=reply_email)
-    return state
\ No newline at end of file
+    if isinstance(current_email, Email):
+        # replies only need the headers, a body kept by reference is not loaded back
+        _deliver(current_email, reply_email, defer=_defer_send(config))
+    release_body(current_email)
+    return {}
+
+async def aemail_sender_node(state: GraphState, config: RunnableConfig):
+    current_email = state["current_email"]
+    reply_email = state["email_response"]
+    if isinstance(current_email, Email):
+        await asyncio.to_thread(_deliver, current_email, reply_email, _defer_send(config))
+    await arelease_body(current_email)
+    return {}
+
+def flush_outbox_node(state: BatchGraphState):
+    if outbox_enabled():
+        outcomes = _flush(get_outbox_sender())
+        if outcomes is not None:
+            print(f"Outbox flushed: {dict(outcomes)}")
+    return {}
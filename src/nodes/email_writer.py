@@ -1,6 +1,12 @@
+from langchain_core.messages import RemoveMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
 from ..agents import AGENT_REGISTRY
 from ..state import GraphState, Email
+from ..utils.body_store import awith_body, with_body
+from ..utils.reply_cache import find_reply, remember_reply
+from ..utils.thread_context import get_thread_context
 from pydantic import ValidationError
+import asyncio
 
 def _get_email_data(state: GraphState):
     """Extract common email data from state"""
@@ -13,76 +19,160 @@ def _get_email_data(state: GraphState):
 
     # If it's a dict, try to create an Email with defaults for missing keys
     if isinstance(current_email, dict):
-        # ensure required keys exist to avoid pydantic errors downstream
-        current_email.setdefault("message_id", "")
-        current_email.setdefault("references", [])
-        current_email.setdefault("thread_id", "")
-        try:
-            current_email = Email.model_validate(current_email)
-            # optionally store back to state to keep normalized object
-            state["current_email"] = current_email
-        except ValidationError as e:
-            # fallback: construct a minimal Email
-            current_email = Email(
-                id=current_email.get("id", ""),
-                date=current_email.get("date", ""),
-                subject=current_email.get("subject", ""),
-                body=current_email.get("body", ""),
-                sender=current_email.get("sender", ""),
-                message_id=current_email.get("message_id", ""),
-                references=current_email.get("references", []),
-                thread_id=current_email.get("thread_id", "")
-            )
-            state["current_email"] = current_email
+        current_email = _normalize_email(current_email)
 
     body = current_email.body if isinstance(current_email, Email) else ""
     return body, category
 
-def _process_email_writer_result(result, state: GraphState):
-    """Process the result from email writer and update state"""
+def _normalize_email(current_email: dict) -> Email:
+    # ensure required keys exist to avoid pydantic errors downstream
+    current_email.setdefault("message_id", "")
+    current_email.setdefault("references", [])
+    current_email.setdefault("thread_id", "")
+    try:
+        return Email.model_validate(current_email)
+    except ValidationError as e:
+        # fallback: construct a minimal Email
+        return Email(
+            id=current_email.get("id", ""),
+            date=current_email.get("date", ""),
+            subject=current_email.get("subject", ""),
+            body=current_email.get("body", ""),
+            sender=current_email.get("sender", ""),
+            message_id=current_email.get("message_id", ""),
+            references=current_email.get("references", []),
+            thread_id=current_email.get("thread_id", "")
+        )
+
+def _writer_update(state: GraphState, update: dict) -> dict:
+    """
+    Partial state update of a writer node. An email given as a plain dict (e.g. from LangGraph
+    Studio) is stored back as an Email so the sender can reply to it.
+    """
+    current_email = state.get("current_email")
+    if isinstance(current_email, dict):
+        update["current_email"] = _normalize_email(current_email)
+    return update
 
-    state["messages"] = result
-    state["email_response"] = result
-    return state
+def _current_email(state: GraphState) -> Email | None:
+    current_email = state.get("current_email")
+    if isinstance(current_email, dict):
+        current_email = _normalize_email(current_email)
+    return current_email if isinstance(current_email, Email) else None
 
-def query_or_email_node(state: GraphState):
-    """Email writer node with RAG capabilities and empty context"""
+def _thread_context(state: GraphState) -> str:
+    """Summary of the earlier messages in the email's Gmail thread, cached per thread and email"""
+    current_email = _current_email(state)
+    return get_thread_context(current_email) if current_email is not None else ""
+
+def reuse_reply_node(state: GraphState):
+    """Answer with the cached reply of a near-duplicate earlier email, if the reply cache has one"""
+
+    state = with_body(state) # type: ignore
+    current_email = _current_email(state)
+    category = state.get("email_category")
+    if current_email is None or not category:
+        return {}
+
+    reply = find_reply(current_email, category)
+    if reply is None:
+        return {}
+
+    return _writer_update(state, {"email_response": reply})
 
+async def areuse_reply_node(state: GraphState):
+    """Async variant of reuse_reply_node"""
+    return reuse_reply_node(await awith_body(state))
+
+def _remember(state: GraphState, result):
+    current_email = _current_email(state)
+    if current_email is not None and isinstance(result, Email):
+        remember_reply(current_email, state.get("email_category"), result)
+
+def _query_or_email_inputs(state: GraphState, thread_context: str = "") -> dict | None:
     email_data = _get_email_data(state)
     if not email_data[0]:
-        state["email_response"] = ""
-        return state
+        return None
 
     body, category = email_data
-
-    result = AGENT_REGISTRY["query_or_email"].invoke({
+    return {
         "email_content": body,
         "email_category": category,
-        "context": ""
-    })
-
-    return _process_email_writer_result(result=result, state=state)
-
-def email_writer_with_context_node(state: GraphState):
-    """Email writer node with context from message history and structured output"""
+        "context": thread_context
+    }
 
+def _email_writer_with_context_inputs(state: GraphState, thread_context: str = "") -> dict | None:
     email_data = _get_email_data(state)
     if not email_data[0]:
-        state["email_response"] = ""
-        return state
-    
+        return None
+
     body, category = email_data
 
-    context = state.get("messages")[-1].content if state.get("messages") else ""
+    retrieved = state.get("messages")[-1].content if state.get("messages") else ""
+    context = "\n\n".join(part for part in (thread_context, retrieved) if part)
 
-    result = AGENT_REGISTRY["email_writer_with_context"].invoke({
+    return {
         "email_content": body,
         "email_category": category,
         "context": context,
         "message_id": "",
         "references": "",
         "thread_id": ""
-    })
+    }
+
+def query_or_email_node(state: GraphState):
+    """Email writer node with RAG capabilities, the context holds only the thread history"""
+
+    state = with_body(state) # type: ignore
+    inputs = _query_or_email_inputs(state, _thread_context(state)) # type: ignore
+    if inputs is None:
+        return _writer_update(state, {"email_response": ""})
+
+    result = AGENT_REGISTRY["query_or_email"].invoke(inputs)
+
+    # only the message: the tool call (or draft) is what the next node reads, the reply comes from the writer
+    return _writer_update(state, {"messages": [result]})
+
+async def aquery_or_email_node(state: GraphState):
+    """Async variant of query_or_email_node"""
+
+    state = await awith_body(state) # type: ignore
+    # the thread lookup may call Gmail, whose client is blocking
+    inputs = _query_or_email_inputs(state, await asyncio.to_thread(_thread_context, state)) # type: ignore
+    if inputs is None:
+        return _writer_update(state, {"email_response": ""})
+
+    result = await AGENT_REGISTRY["query_or_email"].ainvoke(inputs)
+
+    return _writer_update(state, {"messages": [result]})
+
+def email_writer_with_context_node(state: GraphState):
+    """Email writer node with context from message history and structured output"""
+
+    state = with_body(state) # type: ignore
+    inputs = _email_writer_with_context_inputs(state, _thread_context(state)) # type: ignore
+    if inputs is None:
+        return _writer_update(state, {"email_response": ""})
+
+    result = AGENT_REGISTRY["email_writer_with_context"].invoke(inputs)
+    _remember(state, result)
+
+    return _writer_update(state, _written(result))
+
+async def aemail_writer_with_context_node(state: GraphState):
+    """Async variant of email_writer_with_context_node"""
+
+    state = await awith_body(state) # type: ignore
+    # the thread lookup may call Gmail, whose client is blocking
+    inputs = _email_writer_with_context_inputs(state, await asyncio.to_thread(_thread_context, state)) # type: ignore
+    if inputs is None:
+        return _writer_update(state, {"email_response": ""})
+
+    result = await AGENT_REGISTRY["email_writer_with_context"].ainvoke(inputs)
+    _remember(state, result)
+
+    return _writer_update(state, _written(result))
 
-    state["email_response"] = result
-    return state
\ No newline at end of file
+def _written(result) -> dict:
+    # the history only fed the writer's context, the sender needs the reply alone
+    return {"email_response": result, "messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES)]}
@@ -1,6 +1,14 @@
 from .agents import EMAIL_CATEGORIZER, EMAIL_WRITER
-from .tasks import EMAIL_CATEGORIZER_TASK, EMAIL_WRITER_TASK
+from .tasks import EMAIL_CATEGORIZER_TASK, EMAIL_CATEGORIZER_INPUT, EMAIL_WRITER_TASK, EMAIL_WRITER_INPUT
 
-EMAIL_CATEGORIZER_PROMPT = f"{EMAIL_CATEGORIZER}\n{EMAIL_CATEGORIZER_TASK}"
+def compact_prompt(text: str) -> str:
+    """Drop the indentation and blank lines that keep the sources readable, the model is billed for them on every call"""
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
 
-EMAIL_WRITER_PROMPT = f"{EMAIL_WRITER}\n{EMAIL_WRITER_TASK}"
\ No newline at end of file
+# static segments, identical on every call so Bedrock can cache them
+EMAIL_CATEGORIZER_SYSTEM_PROMPT = compact_prompt(f"{EMAIL_CATEGORIZER}\n{EMAIL_CATEGORIZER_TASK}")
+EMAIL_WRITER_SYSTEM_PROMPT = compact_prompt(f"{EMAIL_WRITER}\n{EMAIL_WRITER_TASK}")
+
+# per-email segments
+EMAIL_CATEGORIZER_HUMAN_PROMPT = EMAIL_CATEGORIZER_INPUT
+EMAIL_WRITER_HUMAN_PROMPT = EMAIL_WRITER_INPUT
\ No newline at end of file
@@ -6,13 +6,14 @@ Instructions:
       - **customer_complaint**: When the email communicates dissatisfaction or a complaint.
       - **customer_feedback**: When the email provides feedback or suggestions regarding a product or service.
       - **unrelated**: When the email content does not match any of the above categories.
-EMAIL CONTENT:
-{email}
 
 Notes:
     Base your categorization strictly on the email content provided; avoid making assumptions or overgeneralizing.
 """
 
+EMAIL_CATEGORIZER_INPUT = """EMAIL CONTENT:
+{email}"""
+
 EMAIL_WRITER_TASK = """
 Instructions:
     1. Analyze the original email content and category
@@ -40,6 +41,8 @@ Guidelines:
     is about an iPhone, use the tool and query to the db to search for reliable information.
     - If there is additional context retrieved from the knowledge base, use it to write the best
     email possible.
+    - If the context includes earlier messages of the conversation, stay consistent with what was
+    already said and do not repeat information the customer already has.
     - Be concise but thorough
     - Use clear, professional language
     - Avoid technical jargon unless necessary
@@ -50,8 +53,8 @@ Guidelines:
     - Finally, don't use any personal name and phone number at the end of the email, for the name of
     the company use "Cellfone SA".
     - Make sure to write the email in Spanish, not English.
+"""
 
-Original Email Category: {email_category}
+EMAIL_WRITER_INPUT = """Original Email Category: {email_category}
 Original Email Content: {email_content}
-Additional context: {context}
-"""
\ No newline at end of file
+Additional context: {context}"""
\ No newline at end of file
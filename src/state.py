@@ -2,6 +2,10 @@ from pydantic import BaseModel, Field
 from typing_extensions import TypedDict, Annotated
 from langchain_core.messages import AnyMessage
 from langgraph.graph.message import add_messages
+import operator
+
+# the writer's tool call and its result are all a later node reads from the message history
+MAX_MESSAGES = 2
 
 class Email(BaseModel):
     id: str = Field("", description="Unique identifier of the email")
@@ -13,8 +17,22 @@ class Email(BaseModel):
     references: str = Field("", description="References of the email")
     thread_id: str = Field("", description="Thread identifier of the email")
 
+class EmailRef(Email):
+    """An Email whose body is kept in the body store (src/utils/body_store.py) instead of the graph state"""
+
+def add_recent_messages(left: list[AnyMessage], right: list[AnyMessage] | AnyMessage) -> list[AnyMessage]:
+    """add_messages, keeping only the last MAX_MESSAGES so checkpoints do not grow with every step"""
+    return add_messages(left, right)[-MAX_MESSAGES:] # type: ignore
+
 class GraphState(TypedDict):
+    # an EmailRef once the body is large enough to be stored by reference
     current_email: Email | str
     email_category: str
     email_response: Email | str
-    messages: Annotated[list[AnyMessage], add_messages]
\ No newline at end of file
+    messages: Annotated[list[AnyMessage], add_recent_messages]
+    # retriever result fetched in parallel with categorization, kept only for RAG categories
+    speculative_context: AnyMessage | None
+
+class BatchGraphState(TypedDict):
+    emails: list[Email]
+    processed_email_ids: Annotated[list[str], operator.add]
@@ -8,4 +8,7 @@ class EmailCategory(str, Enum):
     unrelated = "unrelated"
 
 class CategorizerEmailOutput(BaseModel):
-    category: EmailCategory = Field(..., description="The category assigned to the email, indicating its type based on predefined rules.")
\ No newline at end of file
+    category: EmailCategory = Field(..., description="The category assigned to the email, indicating its type based on predefined rules.")
+
+# categories the writer answers with knowledge-base context
+RAG_CATEGORIES = {EmailCategory.product_enquiry.value, EmailCategory.customer_complaint.value}
@@ -0,0 +1,104 @@
+from dotenv import load_dotenv
+from ..state import Email, EmailRef
+from .cache import create_cache
+import os
+import threading
+
+load_dotenv()
+
+_UNSET = object()
+_body_store = _UNSET
+_body_store_lock = threading.Lock()
+
+def get_body_store():
+    """
+    Process-wide store of email bodies keyed by email id, configured through the BODY_STORE_*
+    variables. Checkpointed runs resume from the stored reference, so with CHECKPOINTER=sqlite
+    the bodies default to a SQLite store next to the checkpoints.
+    """
+    global _body_store
+    if _body_store is _UNSET:
+        with _body_store_lock:
+            if _body_store is _UNSET:
+                durable = os.getenv("CHECKPOINTER", "none") == "sqlite"
+                _body_store = create_cache(
+                    backend=os.getenv("BODY_STORE_BACKEND", "sqlite" if durable else "memory"),
+                    path=os.getenv("BODY_STORE_PATH", ".cache/bodies.sqlite"),
+                    max_size=int(os.getenv("BODY_STORE_SIZE", "10000")),
+                    ttl=float(os.getenv("BODY_STORE_TTL", "604800"))
+                )
+    return _body_store
+
+def set_body_store(store):
+    """Replace the process-wide body store, pass None to keep every body in the graph state"""
+    global _body_store
+    _body_store = store
+
+def _min_chars() -> int:
+    return int(os.getenv("BODY_STORE_MIN_CHARS", "1024"))
+
+def detach_body(email: Email | str) -> Email | str:
+    """Move a large body to the body store and return an EmailRef without it; other values pass through"""
+    if not isinstance(email, Email) or isinstance(email, EmailRef) or not email.id:
+        return email
+    store = get_body_store()
+    if store is None or len(email.body) < _min_chars():
+        return email
+    store.set(email.id, email.body)
+    return EmailRef(**{**email.model_dump(), "body": ""})
+
+def attach_body(email: Email | str) -> Email | str:
+    """The full Email for an EmailRef, any other value as is"""
+    if not isinstance(email, EmailRef):
+        return email
+    store = get_body_store()
+    body = store.get(email.id) if store is not None else None
+    if body is None:
+        raise LookupError(f"The body of email {email.id} is no longer in the body store")
+    return Email(**{**email.model_dump(), "body": body})
+
+def with_body(state: dict) -> dict:
+    """The state as a node reads it: a shallow copy with the body attached when the email is an EmailRef"""
+    email = state.get("current_email")
+    if not isinstance(email, EmailRef):
+        return state
+    return {**state, "current_email": attach_body(email)}
+
+def release_body(email: Email | str):
+    """Drop the stored body once the email is answered"""
+    store = get_body_store()
+    if isinstance(email, EmailRef) and store is not None:
+        store.delete(email.id)
+
+async def adetach_body(email: Email | str) -> Email | str:
+    """Async variant of detach_body"""
+    if not isinstance(email, Email) or isinstance(email, EmailRef) or not email.id:
+        return email
+    store = get_body_store()
+    if store is None or len(email.body) < _min_chars():
+        return email
+    await store.aset(email.id, email.body)
+    return EmailRef(**{**email.model_dump(), "body": ""})
+
+async def aattach_body(email: Email | str) -> Email | str:
+    """Async variant of attach_body"""
+    if not isinstance(email, EmailRef):
+        return email
+    store = get_body_store()
+    body = await store.aget(email.id) if store is not None else None
+    if body is None:
+        raise LookupError(f"The body of email {email.id} is no longer in the body store")
+    return Email(**{**email.model_dump(), "body": body})
+
+async def awith_body(state: dict) -> dict:
+    """Async variant of with_body"""
+    email = state.get("current_email")
+    if not isinstance(email, EmailRef):
+        return state
+    return {**state, "current_email": await aattach_body(email)}
+
+async def arelease_body(email: Email | str):
+    """Async variant of release_body"""
+    store = get_body_store()
+    if isinstance(email, EmailRef) and store is not None:
+        await store.adelete(email.id)
@@ -0,0 +1,227 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from typing import Any
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+load_dotenv()
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different copies of a text hash the same"""
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+def content_hash(*parts: str) -> str:
+    """Stable hash of the normalized parts, used as cache key"""
+    normalized = "\x1f".join(normalize_text(part or "") for part in parts)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hit_rate, 4)
+        }
+
+
+class InMemoryCache:
+    """Thread-safe LRU cache with a per-entry time to live"""
+
+    def __init__(self, max_size: int = 10_000, ttl: float | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            created_at, value = entry
+            if self.ttl is not None and time.time() - created_at > self.ttl:
+                del self._entries[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    # nothing here blocks, the async variants run inline
+    async def aget(self, key: str) -> Any | None:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any):
+        self.set(key, value)
+
+    async def adelete(self, key: str):
+        self.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    On-disk cache shared across processes and restarts. Values are stored as JSON, entries
+    expire after `ttl` seconds and the least recently used ones are evicted beyond `max_size`.
+    """
+
+    def __init__(self, path: str, max_size: int = 100_000, ttl: float | None = None):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Any | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            value, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.stats.hits += 1
+            return json.loads(value)
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            overflow = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_size
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                    (overflow,)
+                )
+                self.stats.evictions += overflow
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    # the async variants keep the file I/O off the event loop
+    async def aget(self, key: str) -> Any | None:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any):
+        await asyncio.to_thread(self.set, key, value)
+
+    async def adelete(self, key: str):
+        await asyncio.to_thread(self.delete, key)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+def create_cache(backend: str, path: str = "", max_size: int = 10_000, ttl: float | None = None):
+    """Build a cache for the given backend name: memory, sqlite or none"""
+    if backend == "memory":
+        return InMemoryCache(max_size=max_size, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteCache(path=path, max_size=max_size, ttl=ttl)
+    if backend == "none":
+        return None
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+_UNSET = object()
+_categorization_cache = _UNSET
+_categorization_cache_lock = threading.Lock()
+
+def get_categorization_cache():
+    """Process-wide categorization cache configured through the CATEGORY_CACHE_* variables"""
+    global _categorization_cache
+    if _categorization_cache is _UNSET:
+        with _categorization_cache_lock:
+            if _categorization_cache is _UNSET:
+                _categorization_cache = create_cache(
+                    backend=os.getenv("CATEGORY_CACHE_BACKEND", "memory"),
+                    path=os.getenv("CATEGORY_CACHE_PATH", ".cache/categories.sqlite"),
+                    max_size=int(os.getenv("CATEGORY_CACHE_SIZE", "10000")),
+                    ttl=float(os.getenv("CATEGORY_CACHE_TTL", "86400"))
+                )
+    return _categorization_cache
+
+def set_categorization_cache(cache):
+    """Replace the process-wide categorization cache, pass None to disable caching"""
+    global _categorization_cache
+    _categorization_cache = cache
+
+def categorization_cache_key(body: str) -> str:
+    # include the model so switching categorizers does not serve stale labels
+    return content_hash(os.getenv("LLM_CATEGORIZER", ""), body)
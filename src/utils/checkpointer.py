@@ -0,0 +1,57 @@
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from dotenv import load_dotenv
+from typing import Callable
+import asyncio
+import os
+
+load_dotenv()
+
+
+def _sqlite_checkpointer(path: str, use_async: bool) -> BaseCheckpointSaver:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if use_async:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            raise ValueError(
+                "The async SQLite checkpointer binds to the running event loop, build the async graph "
+                "inside the loop or pass an AsyncSqliteSaver instance"
+            ) from None
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        conn = aiosqlite.connect(path)
+        # the saver lives as long as the graph and is never closed, don't let its worker thread block exit
+        conn.daemon = True
+        return AsyncSqliteSaver(conn)
+    import sqlite3
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    # graph nodes run on worker threads, SqliteSaver serializes access with its own lock
+    conn = sqlite3.connect(path, check_same_thread=False)
+    # with WAL, NORMAL only fsyncs at checkpoints: a process crash loses nothing, a power cut the last commits
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return SqliteSaver(conn)
+
+
+# backend name -> factory(path, use_async); register_checkpointer() adds e.g. Postgres or Redis savers
+CHECKPOINTERS: dict[str, Callable[[str, bool], BaseCheckpointSaver | None]] = {
+    "none": lambda path, use_async: None,
+    "memory": lambda path, use_async: InMemorySaver(),
+    "sqlite": _sqlite_checkpointer,
+}
+
+
+def register_checkpointer(name: str, factory: Callable[[str, bool], BaseCheckpointSaver | None]):
+    CHECKPOINTERS[name] = factory
+
+
+def create_checkpointer(backend: str | None = None, path: str | None = None, use_async: bool = False) -> BaseCheckpointSaver | None:
+    """Build the checkpointer for CHECKPOINTER (none, memory, sqlite) stored at CHECKPOINT_PATH"""
+    backend = backend or os.getenv("CHECKPOINTER", "none")
+    if backend not in CHECKPOINTERS:
+        raise ValueError(f"Unknown checkpointer: {backend}")
+    path = path or os.getenv("CHECKPOINT_PATH", ".cache/checkpoints.sqlite")
+    return CHECKPOINTERS[backend](path, use_async)
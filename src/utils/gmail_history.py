@@ -0,0 +1,330 @@
+from googleapiclient.errors import HttpError
+from ..state import Email
+from .gmail_utils import UNPROCESSED_QUERY, _batch_get_messages, _get_gmail_service, _list_message_ids, _parse_email_message
+from .instrumentation import timed
+from .mailboxes import DEFAULT_MAILBOX, current_mailbox
+from collections import Counter, deque
+from dotenv import load_dotenv
+import os
+import sqlite3
+import threading
+import time
+
+load_dotenv()
+
+HISTORY_PAGE_SIZE = 500
+# a message that fails to load this many times in a row is skipped so the checkpoint can advance
+FETCH_ATTEMPTS = 3
+# labels of messages we add ourselves (replies, drafts) that must never be answered
+IGNORED_LABELS = {"SENT", "DRAFT"}
+
+
+class HistoryStore:
+    """
+    SQLite file holding the last synced Gmail historyId per mailbox and every message id already
+    handed to the workflow. Claiming an id is a single upsert, so two listeners sharing the file
+    never both win it. An answered email is marked done and never delivered again. An email whose
+    processing failed is released (status failed) and can be claimed again, as can a claim older
+    than `claim_timeout` seconds that was neither done nor released, e.g. after a crash; either
+    way up to `max_attempts` claims.
+    """
+
+    def __init__(self, path: str, claim_timeout: float = 3600.0, max_attempts: int = 3):
+        self.path = path
+        self.claim_timeout = claim_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "mailbox TEXT PRIMARY KEY, history_id TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed_emails ("
+            "mailbox TEXT NOT NULL, message_id TEXT NOT NULL, status TEXT NOT NULL, "
+            "claimed_at REAL NOT NULL, updated_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 1, "
+            "PRIMARY KEY (mailbox, message_id))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(processed_emails)")}
+        if "attempts" not in columns:
+            # files written before failed emails could be claimed again
+            self._conn.execute("ALTER TABLE processed_emails ADD COLUMN attempts INTEGER NOT NULL DEFAULT 1")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS processed_emails_status ON processed_emails (mailbox, status, claimed_at)"
+        )
+        self._conn.commit()
+
+    def get_history_id(self, mailbox: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT history_id FROM checkpoints WHERE mailbox = ?", (mailbox,)).fetchone()
+        return row[0] if row else None
+
+    def set_history_id(self, mailbox: str, history_id: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (mailbox, history_id, updated_at) VALUES (?, ?, ?)",
+                (mailbox, str(history_id), time.time())
+            )
+            self._conn.commit()
+
+    def unclaimed(self, mailbox: str, message_ids: list[str]) -> list[str]:
+        """Filter out ids that were already claimed, keeping the original order"""
+        claimed = set()
+        with self._lock:
+            # stay below SQLite's bound parameter limit
+            for start in range(0, len(message_ids), 500):
+                chunk = message_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT message_id FROM processed_emails WHERE mailbox = ? AND message_id IN ({','.join('?' * len(chunk))})",
+                    (mailbox, *chunk)
+                ).fetchall()
+                claimed.update(row[0] for row in rows)
+        return [message_id for message_id in message_ids if message_id not in claimed]
+
+    def claim(self, mailbox: str, message_ids: list[str]) -> list[str]:
+        """Atomically claim the ids for processing, returns only the ids this call won"""
+        now = time.time()
+        won = []
+        with self._lock:
+            for message_id in message_ids:
+                # a new id, or one released after a failure or claimed too long ago, with attempts left
+                cursor = self._conn.execute(
+                    "INSERT INTO processed_emails (mailbox, message_id, status, claimed_at, updated_at) "
+                    "VALUES (?, ?, 'claimed', ?, ?) "
+                    "ON CONFLICT (mailbox, message_id) DO UPDATE SET status = 'claimed', attempts = attempts + 1, "
+                    "claimed_at = excluded.claimed_at, updated_at = excluded.updated_at "
+                    "WHERE attempts < ? AND (status = 'failed' OR (status = 'claimed' AND claimed_at < ?))",
+                    (mailbox, message_id, now, now, self.max_attempts, now - self.claim_timeout)
+                )
+                if cursor.rowcount == 1:
+                    won.append(message_id)
+            self._conn.commit()
+        return won
+
+    def retryable(self, mailbox: str) -> list[str]:
+        """Ids released after a failure or claimed too long ago that can be claimed again, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT message_id FROM processed_emails WHERE mailbox = ? AND attempts < ? "
+                "AND (status = 'failed' OR (status = 'claimed' AND claimed_at < ?)) ORDER BY claimed_at",
+                (mailbox, self.max_attempts, time.time() - self.claim_timeout)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def release(self, mailbox: str, message_ids: list[str]):
+        """Hand back ids whose processing failed, the next sync delivers them again"""
+        self.mark(mailbox, message_ids, "failed")
+
+    def mark(self, mailbox: str, message_ids: list[str], status: str):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE processed_emails SET status = ?, updated_at = ? WHERE mailbox = ? AND message_id = ?",
+                [(status, time.time(), mailbox, message_id) for message_id in message_ids]
+            )
+            self._conn.commit()
+
+    def status_counts(self, mailbox: str) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM processed_emails WHERE mailbox = ? GROUP BY status", (mailbox,)
+            ).fetchall()
+        return dict(rows)
+
+
+class HistoryListener:
+    """
+    Incremental inbox listener built on users.history.list. Each sync asks Gmail only for the
+    messages added to INBOX since the stored historyId, instead of re-running a search query.
+
+    The first sync (or a sync whose historyId has expired, HTTP 404) records the current
+    historyId from the profile and backfills with `backfill_query`; pass None to skip the
+    backfill and only answer mail that arrives from now on. The checkpoint advances once every
+    message of a sync has been delivered, and delivered ids are claimed in the HistoryStore,
+    so a crash between the two replays the delta without answering anything twice. A message
+    that fails to load holds the checkpoint back, so the next sync replays the delta and fetches
+    it again, up to FETCH_ATTEMPTS times.
+    """
+
+    def __init__(
+        self,
+        store: HistoryStore,
+        mailbox: str = "me",
+        label_id: str = "INBOX",
+        backfill_query: str | None = UNPROCESSED_QUERY,
+        service=None
+    ):
+        self.store = store
+        self.mailbox = mailbox
+        self.label_id = label_id
+        self.backfill_query = backfill_query
+        self.service = service
+        self.stats = Counter()
+        self._pending: deque[str] = deque()
+        self._pending_history_id: str | None = None
+        self._fetch_failures = Counter()
+        self._incomplete = False
+        self._lock = threading.Lock()
+
+    def _get_service(self):
+        return self.service or _get_gmail_service()
+
+    @timed("gmail", call="history.poll")
+    def poll(self, max_messages: int | None = None) -> list[Email]:
+        """Return up to max_messages new emails (all of them by default), oldest first"""
+        with self._lock:
+            self.stats["polls"] += 1
+            service = self._get_service()
+            if not self._pending:
+                self._sync(service)
+
+            emails = []
+            while self._pending and (max_messages is None or len(emails) < max_messages):
+                count = len(self._pending) if max_messages is None else max_messages - len(emails)
+                message_ids = [self._pending[index] for index in range(min(count, len(self._pending)))]
+                messages = _batch_get_messages(service, message_ids)
+                # only pop once the batch ran, a network error leaves them pending
+                for _ in message_ids:
+                    self._pending.popleft()
+                self._count_failures(message_ids, {message["id"] for message in messages})
+                won = set(self.store.claim(self.mailbox, [message["id"] for message in messages]))
+                self.stats["duplicates_skipped"] += len(messages) - len(won)
+                emails.extend(_parse_email_message(message=message) for message in messages if message["id"] in won)
+
+            if not self._pending and self._pending_history_id is not None:
+                if self._incomplete:
+                    # keep the old checkpoint, the next sync replays the delta and retries the failed ids
+                    self.stats["checkpoints_held"] += 1
+                else:
+                    self.store.set_history_id(self.mailbox, self._pending_history_id)
+                self._pending_history_id = None
+                self._incomplete = False
+            self.stats["delivered"] += len(emails)
+            return emails
+
+    def _count_failures(self, message_ids: list[str], fetched: set[str]):
+        for message_id in message_ids:
+            if message_id in fetched:
+                self._fetch_failures.pop(message_id, None)
+                continue
+            self._fetch_failures[message_id] += 1
+            self.stats["fetch_failures"] += 1
+            if self._fetch_failures[message_id] < FETCH_ATTEMPTS:
+                self._incomplete = True
+            else:
+                print(f"Skipping message {message_id}, it failed to load {FETCH_ATTEMPTS} times")
+
+    def mark_done(self, message_ids: list[str]):
+        self.store.mark(self.mailbox, message_ids, "done")
+
+    def release(self, message_ids: list[str]):
+        self.store.release(self.mailbox, message_ids)
+
+    def _sync(self, service):
+        history_id = self.store.get_history_id(self.mailbox)
+        if history_id is None:
+            message_ids, history_id = self._full_sync(service)
+        else:
+            try:
+                message_ids, history_id = self._history_since(service, history_id)
+            except HttpError as error:
+                if error.resp.status != 404:
+                    raise
+                print(f"History {history_id} is no longer available, running a full sync")
+                message_ids, history_id = self._full_sync(service)
+        # emails that failed or were never finished come first, they arrived before this delta
+        retry = self.store.retryable(self.mailbox)
+        self.stats["retried"] += len(retry)
+        message_ids = list(dict.fromkeys(retry + self.store.unclaimed(self.mailbox, message_ids)))
+        self._pending.extend(
+            message_id for message_id in message_ids if self._fetch_failures[message_id] < FETCH_ATTEMPTS
+        )
+        self._pending_history_id = history_id
+
+    def _full_sync(self, service) -> tuple[list[str], str]:
+        self.stats["full_syncs"] += 1
+        # read the historyId before listing, mail arriving meanwhile shows up in the next delta
+        history_id = service.users().getProfile(userId='me').execute()["historyId"]
+        if not self.backfill_query:
+            return [], history_id
+        # messages().list returns newest first
+        return _list_message_ids(service, query=self.backfill_query)[::-1], history_id
+
+    def _history_since(self, service, start_history_id: str) -> tuple[list[str], str]:
+        message_ids = []
+        page_token = None
+        while True:
+            response = service.users().history().list(
+                userId='me',
+                startHistoryId=start_history_id,
+                historyTypes=['messageAdded'],
+                labelId=self.label_id,
+                maxResults=HISTORY_PAGE_SIZE,
+                pageToken=page_token
+            ).execute()
+            self.stats["history_pages"] += 1
+            for record in response.get("history", []):
+                for added in record.get("messagesAdded", []):
+                    labels = set(added["message"].get("labelIds", []))
+                    if self.label_id in labels and not labels & IGNORED_LABELS:
+                        message_ids.append(added["message"]["id"])
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                # a message can appear in several records, keep the first occurrence
+                return list(dict.fromkeys(message_ids)), response["historyId"]
+
+
+# mailbox name -> listener; every mailbox keeps its checkpoint and claims in the same store
+_listeners: dict[str, HistoryListener] = {}
+_history_store = None
+_listeners_lock = threading.Lock()
+
+def get_history_listener() -> HistoryListener:
+    """The current mailbox's listener, backed by the store at GMAIL_HISTORY_DB"""
+    global _history_store
+    mailbox = current_mailbox()
+    listener = _listeners.get(mailbox)
+    if listener is None:
+        with _listeners_lock:
+            listener = _listeners.get(mailbox)
+            if listener is None:
+                if _history_store is None:
+                    _history_store = HistoryStore(
+                        os.getenv("GMAIL_HISTORY_DB", ".cache/gmail_history.sqlite"),
+                        claim_timeout=float(os.getenv("GMAIL_CLAIM_TIMEOUT", "3600")),
+                        max_attempts=int(os.getenv("GMAIL_CLAIM_MAX_ATTEMPTS", "3"))
+                    )
+                backfill = os.getenv("GMAIL_HISTORY_BACKFILL", "true").lower() == "true"
+                listener = HistoryListener(
+                    store=_history_store,
+                    mailbox=mailbox,
+                    backfill_query=UNPROCESSED_QUERY if backfill else None
+                )
+                _listeners[mailbox] = listener
+    return listener
+
+def set_history_listener(listener: HistoryListener | None, mailbox: str = DEFAULT_MAILBOX):
+    """Replace a mailbox's listener, None rebuilds it from the environment on next use"""
+    if listener is None:
+        _listeners.pop(mailbox, None)
+    else:
+        _listeners[mailbox] = listener
+
+def get_new_emails(max_messages: int | None = None) -> list[Email]:
+    try:
+        return get_history_listener().poll(max_messages=max_messages)
+    except Exception as error:
+        print(f'An error occurred while syncing the mailbox history: {error}')
+        return []
+
+def mark_emails_as_done(email_ids: list[str]):
+    if email_ids:
+        get_history_listener().mark_done(email_ids)
+
+def mark_emails_as_failed(email_ids: list[str]):
+    """Release the claims of emails that could not be answered, so a later sync retries them"""
+    if email_ids:
+        get_history_listener().release(email_ids)
@@ -0,0 +1,147 @@
+from google_auth_oauthlib.flow import InstalledAppFlow
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from .mailboxes import DEFAULT_MAILBOX, current_mailbox, get_mailbox
+from collections import Counter
+from typing import Any, Callable
+import httplib2
+import json
+import os
+import threading
+
+SCOPES = [
+    'https://www.googleapis.com/auth/gmail.modify'
+]
+
+
+class GmailServiceManager:
+    """
+    Process-wide owner of the Gmail credentials and API clients.
+
+    Credentials are loaded once and refreshed under a lock only when they expire. The discovery
+    document is parsed once from the copy bundled with google-api-python-client, and each thread
+    gets its own client because httplib2 transports are not thread-safe. Every thread's client
+    shares the same credentials object, so a refresh is picked up without rebuilding anything.
+    """
+
+    def __init__(
+        self,
+        token_path: str = 'token.json',
+        credentials_path: str = 'credentials.json',
+        scopes: list[str] = SCOPES,
+        service_factory: Callable[[], Any] | None = None
+    ):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.scopes = scopes
+        # tests and benchmarks can hand in a fake client instead of building a real one
+        self._service_factory = service_factory
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._creds = None
+        self._discovery_doc = None
+        self.stats = Counter()
+        # separate from _lock, which is held while some of the counters are bumped
+        self._stats_lock = threading.Lock()
+
+    def get_service(self):
+        """Return this thread's Gmail client, building it on first use"""
+        if self._service_factory is None:
+            self._ensure_valid_credentials()
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._build_service()
+            self._local.service = service
+        else:
+            self._count('service_reuses')
+        return service
+
+    def _count(self, name: str):
+        # Counter updates are not atomic, every thread of the process bumps these
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def reset(self):
+        """Drop cached credentials and clients, e.g. after token.json was replaced"""
+        with self._lock:
+            self._creds = None
+            self._local = threading.local()
+
+    def _build_service(self):
+        self._count('service_builds')
+        if self._service_factory is not None:
+            return self._service_factory()
+        http = AuthorizedHttp(self._creds, http=httplib2.Http())
+        return build_from_document(self._get_discovery_doc(), http=http)
+
+    def _get_discovery_doc(self) -> dict:
+        if self._discovery_doc is None:
+            with self._lock:
+                if self._discovery_doc is None:
+                    self._count('discovery_loads')
+                    self._discovery_doc = self._load_discovery_doc()
+        return self._discovery_doc
+
+    def _load_discovery_doc(self) -> dict:
+        static_doc = get_static_doc('gmail', 'v1')
+        if static_doc:
+            return json.loads(static_doc)
+        # older client libraries ship without static documents, fall back to a single network fetch
+        return build('gmail', 'v1', credentials=self._creds, static_discovery=False)._rootDesc
+
+    def _ensure_valid_credentials(self):
+        creds = self._creds
+        if creds and creds.valid:
+            return
+        with self._lock:
+            # another thread may have refreshed while we waited for the lock
+            if self._creds and self._creds.valid:
+                return
+            self._creds = self._load_credentials(self._creds)
+
+    def _load_credentials(self, creds):
+        if creds is None and os.path.exists(self.token_path):
+            self._count('credential_loads')
+            creds = Credentials.from_authorized_user_file(self.token_path, self.scopes)
+        if creds and creds.valid:
+            return creds
+        if creds and creds.expired and creds.refresh_token:
+            self._count('credential_refreshes')
+            creds.refresh(Request())
+        else:
+            self._count('authorization_flows')
+            flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, self.scopes)
+            creds = flow.run_local_server(port=0)
+            # new credentials object, existing per-thread clients still hold the old one
+            self._local = threading.local()
+        with open(self.token_path, 'w') as token:
+            token.write(creds.to_json())
+        return creds
+
+
+# mailbox name -> manager; each mailbox has its own credentials, token file and clients
+_managers: dict[str, GmailServiceManager] = {DEFAULT_MAILBOX: GmailServiceManager()}
+_managers_lock = threading.Lock()
+
+def get_gmail_service_manager() -> GmailServiceManager:
+    """The manager of the current mailbox (see src/utils/mailboxes.py), built from its config on first use"""
+    mailbox = current_mailbox()
+    manager = _managers.get(mailbox)
+    if manager is None:
+        with _managers_lock:
+            manager = _managers.get(mailbox)
+            if manager is None:
+                config = get_mailbox(mailbox)
+                manager = GmailServiceManager(token_path=config.token_path, credentials_path=config.credentials_path)
+                _managers[mailbox] = manager
+    return manager
+
+def set_gmail_service_manager(manager: GmailServiceManager, mailbox: str = DEFAULT_MAILBOX):
+    """Replace a mailbox's manager, e.g. with one built around a fake service"""
+    _managers[mailbox] = manager
+
+def get_gmail_service():
+    return get_gmail_service_manager().get_service()
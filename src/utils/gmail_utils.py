@@ -1,58 +1,40 @@
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from email.mime.text import MIMEText
 from ..state import Email
+from .gmail_service import get_gmail_service
+from .instrumentation import timed
+from .mime import MESSAGE_FIELDS, extract_body, strip_quoted_text
 import os
 import base64
 import datetime
 import uuid
 
-SCOPES = [
-    'https://www.googleapis.com/auth/gmail.modify'
-]
+# Gmail recommends at most 50 calls per batch request to avoid rate limiting
+BATCH_SIZE = 50
+LIST_PAGE_SIZE = 100
+UNPROCESSED_QUERY = os.getenv("GMAIL_UNPROCESSED_QUERY", "is:unread in:inbox")
+# drop reply history and signatures before the body reaches the categorizer and the writer
+STRIP_QUOTED = os.getenv("GMAIL_STRIP_QUOTED", "true").lower() == "true"
 
 def _get_gmail_service():
-    creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-    return build('gmail', 'v1', credentials=creds)
+    """Return the cached Gmail client for the current thread"""
+    return get_gmail_service()
 
 def _parse_email_message(message) -> Email:
     """
-    Extracts email data from a Gmail API message resource.
-    Returns a dict with id, subject, sender, date, and body.
+    Extracts email data from a Gmail API message resource (format=full, optionally masked
+    with MESSAGE_FIELDS). The body is the first text/plain part anywhere in the MIME tree,
+    else the HTML part as text; attachments are never decoded.
     """
-    headers_list = message.get('payload', {}).get('headers', [])
-    headers = {header['name'].lower(): header['value'] for header in headers_list}
+    payload = message.get('payload', {})
+    headers = {header['name'].lower(): header['value'] for header in payload.get('headers', [])}
     subject = headers.get('subject', 'No Subject')
     sender = headers.get('from', 'No Sender')
     date = headers.get('date', 'No Date')
     message_id = headers.get('message-id', '')
     references = headers.get('references', '')
-    body = ''
-    payload = message.get('payload', {})
-    if 'parts' in payload:
-        for part in payload['parts']:
-            if part.get('mimeType') == 'text/plain':
-                body = part.get('body', {}).get('data', '')
-                break
-    else:
-        body = payload.get('body', {}).get('data', '')
-    if body:
-        try:
-            body = base64.urlsafe_b64decode(body).decode('utf-8')
-        except Exception:
-            body = ''
+    body = extract_body(payload)
+    if STRIP_QUOTED:
+        body = strip_quoted_text(body)
     return Email(
         id=message["id"],
         subject=subject,
@@ -64,6 +46,7 @@ def _parse_email_message(message) -> Email:
         thread_id=message['threadId']
     )
 
+@timed("gmail", call="get_most_recent_email")
 def get_most_recent_email() -> Email | str:
     service = _get_gmail_service()
     today = datetime.datetime.now().date()
@@ -73,47 +56,130 @@ def get_most_recent_email() -> Email | str:
         email_message_data = results.get('messages', [])[0]
         if not email_message_data:
             return ""
-        message = service.users().messages().get(userId='me', id=email_message_data['id']).execute()
+        message = service.users().messages().get(userId='me', id=email_message_data['id'], format='full', fields=MESSAGE_FIELDS).execute()
         return _parse_email_message(message=message)
     except Exception as error:
         print(f'An error occurred: {error}')
         return ""
 
-def send_reply_email(original_email: Email, reply_email: Email) -> bool:
+@timed("gmail", call="messages.list")
+def _list_message_ids(service, query: str, max_messages: int | None = None) -> list[str]:
     """
-    Send a reply email to the original sender that will appear as a threaded reply.
+    Page through messages().list and return every message id matching the query.
+    """
+    message_ids = []
+    page_token = None
+    while True:
+        results = service.users().messages().list(
+            userId='me',
+            q=query,
+            maxResults=LIST_PAGE_SIZE,
+            pageToken=page_token
+        ).execute()
+        message_ids.extend(message['id'] for message in results.get('messages', []))
+        page_token = results.get('nextPageToken')
+        if not page_token or (max_messages and len(message_ids) >= max_messages):
+            break
+    return message_ids[:max_messages] if max_messages else message_ids
+
+@timed("gmail", call="messages.batch_get")
+def _batch_get_messages(service, message_ids: list[str]) -> list[dict]:
+    """
+    Fetch message resources through the Gmail batch endpoint, BATCH_SIZE calls per HTTP round trip.
+    Messages that fail to load are skipped and returned in the original order otherwise.
+    """
+    messages = {}
+
+    def _on_message(request_id, response, exception):
+        if exception is not None:
+            print(f'An error occurred while fetching message {request_id}: {exception}')
+            return
+        messages[request_id] = response
+
+    for start in range(0, len(message_ids), BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=_on_message)
+        for message_id in message_ids[start:start + BATCH_SIZE]:
+            batch.add(service.users().messages().get(userId='me', id=message_id, format='full', fields=MESSAGE_FIELDS), request_id=message_id)
+        batch.execute()
+    return [messages[message_id] for message_id in message_ids if message_id in messages]
+
+@timed("gmail", call="get_unprocessed_emails")
+def get_unprocessed_emails(query: str = UNPROCESSED_QUERY, max_messages: int | None = None, service=None) -> list[Email]:
+    """
+    Return every unprocessed email matching the query, fetched with batched Gmail requests.
     """
     try:
-        service = _get_gmail_service()
+        service = service or _get_gmail_service()
+        message_ids = _list_message_ids(service, query=query, max_messages=max_messages)
+        if not message_ids:
+            return []
+        messages = _batch_get_messages(service, message_ids)
+        return [_parse_email_message(message=message) for message in messages]
+    except Exception as error:
+        print(f'An error occurred: {error}')
+        return []
 
-        sender_email = original_email.sender # Micorreo <micorreo@gmail.com>
-        if '<' in sender_email and '>' in sender_email:
-            sender_email = sender_email.split('<')[1].split('>')[0]
+@timed("gmail", call="messages.batch_modify")
+def mark_emails_as_processed(email_ids: list[str], service=None) -> bool:
+    """
+    Remove the UNREAD label from the given emails so the batch listener does not pick them up again.
+    """
+    if not email_ids:
+        return True
+    try:
+        service = service or _get_gmail_service()
+        # batchModify accepts up to 1000 ids per call
+        for start in range(0, len(email_ids), 1000):
+            service.users().messages().batchModify(
+                userId='me',
+                body={'ids': email_ids[start:start + 1000], 'removeLabelIds': ['UNREAD']}
+            ).execute()
+        return True
+    except Exception as error:
+        print(f'An error occurred while marking emails as processed: {error}')
+        return False
+
+def build_reply_message(original_email: Email, reply_email: Email) -> dict:
+    """
+    Build the Gmail send body for a reply that will appear in the original email's thread.
+    """
+    sender_email = original_email.sender # Micorreo <micorreo@gmail.com>
+    if '<' in sender_email and '>' in sender_email:
+        sender_email = sender_email.split('<')[1].split('>')[0]
 
-        print(f"Reply will be sent to: {sender_email}")
+    print(f"Reply will be sent to: {sender_email}")
 
-        reply_subject = reply_email.subject
-        original_subject = original_email.subject
-        if original_subject.startswith('Re:'):
-            reply_subject = original_subject
-        else:
-            reply_subject = f"Re: {original_subject}" # Re: no me gustan tus productos
-
-        message_id = original_email.message_id
-        references = original_email.references
-        thread_id = original_email.thread_id
-
-        if not message_id:
-            message_id = f"<{original_email.id}@gmail.com>"
-
-        message = _create_reply_message_with_thread(
-            to=sender_email,
-            subject=reply_subject,
-            message_text=reply_email.body,
-            original_message_id=message_id,
-            original_references=references,
-            thread_id=thread_id
-        )
+    reply_subject = reply_email.subject
+    original_subject = original_email.subject
+    if original_subject.startswith('Re:'):
+        reply_subject = original_subject
+    else:
+        reply_subject = f"Re: {original_subject}" # Re: no me gustan tus productos
+
+    message_id = original_email.message_id
+    references = original_email.references
+    thread_id = original_email.thread_id
+
+    if not message_id:
+        message_id = f"<{original_email.id}@gmail.com>"
+
+    return _create_reply_message_with_thread(
+        to=sender_email,
+        subject=reply_subject,
+        message_text=reply_email.body,
+        original_message_id=message_id,
+        original_references=references,
+        thread_id=thread_id
+    )
+
+@timed("gmail", call="messages.send")
+def send_reply_email(original_email: Email, reply_email: Email) -> bool:
+    """
+    Send a reply email to the original sender that will appear as a threaded reply.
+    """
+    try:
+        service = _get_gmail_service()
+        message = build_reply_message(original_email=original_email, reply_email=reply_email)
 
         sent_message = service.users().messages().send(userId='me', body=message).execute()
 
@@ -0,0 +1,278 @@
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import Runnable, RunnableBinding, RunnableConfig, ensure_config
+from langchain_core.runnables.config import merge_configs
+from langchain_core.tools import BaseTool
+from collections import defaultdict
+from typing import Any, Callable
+from uuid import UUID
+from .metrics import _label_key, _token_usage, estimate_cost, get_metrics
+from .tracing import get_tracer
+import functools
+import inspect
+import threading
+import time
+
+# kind -> what its latency histogram measures
+_KINDS = {
+    "node": "Graph node",
+    "gmail": "Gmail API call",
+    "llm": "LLM request",
+    "retriever": "Knowledge-base retrieval",
+    "reply_cache": "Reply cache lookup",
+}
+
+
+def _record(kind: str, labels: dict[str, str], seconds: float, failed: bool, key: tuple | None = None):
+    metrics = get_metrics()
+    metrics.describe(f"{kind}_latency_seconds", f"{_KINDS.get(kind, kind)} latency in seconds")
+    metrics.observe_key(f"{kind}_latency_seconds", seconds, key if key is not None else _label_key(labels))
+    if failed:
+        metrics.inc(f"{kind}_errors_total", **labels)
+
+
+def timed(kind: str, **labels: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator for sync and async functions: records {kind}_latency_seconds and {kind}_errors_total
+    with the given labels and wraps every call in a span named after the kind and label values.
+    The wrapper keeps the signature, so LangGraph still passes config to nodes that accept it.
+    """
+    span_name = ".".join([kind, *labels.values()])
+    # the labels are fixed, sort them once instead of on every call
+    key = _label_key(labels)
+
+    def decorator(func: Callable) -> Callable:
+        if getattr(func, "__instrumented__", False):
+            return func
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not get_metrics().enabled:
+                    return await func(*args, **kwargs)
+                start, failed = time.perf_counter(), False
+                try:
+                    with get_tracer().span(span_name, **labels):
+                        return await func(*args, **kwargs)
+                except BaseException:
+                    failed = True
+                    raise
+                finally:
+                    _record(kind, labels, time.perf_counter() - start, failed, key)
+            async_wrapper.__instrumented__ = True # type: ignore
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not get_metrics().enabled:
+                return func(*args, **kwargs)
+            start, failed = time.perf_counter(), False
+            try:
+                with get_tracer().span(span_name, **labels):
+                    return func(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                _record(kind, labels, time.perf_counter() - start, failed, key)
+        wrapper.__instrumented__ = True # type: ignore
+        return wrapper
+
+    return decorator
+
+
+def instrument_nodes(nodes: dict[str, Callable]) -> dict[str, Callable]:
+    """Wrap every node of a node registry, labelled with its registry key"""
+    return {name: timed("node", node=name)(node) for name, node in nodes.items()}
+
+
+def _agent(tags: list[str] | None) -> str:
+    return next((tag.split(":", 1)[1] for tag in tags or [] if tag.startswith("agent:")), "-")
+
+
+def _model_id(serialized: dict[str, Any] | None, metadata: dict[str, Any] | None, kwargs: dict[str, Any]) -> str:
+    params = kwargs.get("invocation_params") or {}
+    return (
+        (metadata or {}).get("ls_model_name")
+        or params.get("model_id")
+        or params.get("model")
+        or params.get("_type")
+        or (serialized or {}).get("name")
+        or "unknown"
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def _llm_key(node: str, agent: str, model: str) -> tuple:
+    """Label key of an LLM request, the same few node, agent and model combinations repeat"""
+    return _label_key({"node": node, "agent": agent, "model": model})
+
+
+@functools.lru_cache(maxsize=1024)
+def _with_type(key: tuple, token_type: str) -> tuple:
+    """The label key plus type=token_type"""
+    return tuple(sorted((*key, ("type", token_type))))
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Records every LLM request and retriever tool call it sees: latency, errors, token usage and
+    estimated cost, labelled with the graph node (langgraph_node metadata), the agent
+    (agent:<name> tag) and the model; each call is also exported as a span.
+    """
+
+    # called on the caller's thread, so the current span of the node is the parent
+    run_inline = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs: dict[UUID, tuple[str, dict[str, str], tuple, float, float]] = {}
+
+    def _start(self, run_id: UUID, kind: str, labels: dict[str, str], key: tuple | None = None):
+        if get_metrics().enabled:
+            with self._lock:
+                self._runs[run_id] = (kind, labels, key or _label_key(labels), time.perf_counter(), time.time())
+
+    def _finish(self, run_id: UUID, failed: bool) -> tuple[str, dict[str, str], tuple] | None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        kind, labels, key, start, wall_start = run
+        _record(kind, labels, time.perf_counter() - start, failed, key)
+        name = labels.get("agent") or labels.get("tool") or "-"
+        get_tracer().record(f"{kind}.{name}", wall_start, time.time(), "error" if failed else "ok", **labels)
+        return kind, labels, key
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: Any, *, run_id: UUID, tags: list[str] | None = None, metadata: dict[str, Any] | None = None, **kwargs: Any):
+        self._start_llm(run_id, serialized, tags, metadata, kwargs)
+
+    def on_llm_start(self, serialized: dict[str, Any], prompts: list[str], *, run_id: UUID, tags: list[str] | None = None, metadata: dict[str, Any] | None = None, **kwargs: Any):
+        self._start_llm(run_id, serialized, tags, metadata, kwargs)
+
+    def _start_llm(self, run_id: UUID, serialized: dict[str, Any], tags: list[str] | None, metadata: dict[str, Any] | None, kwargs: dict[str, Any]):
+        labels = {
+            "node": (metadata or {}).get("langgraph_node", "-"),
+            "agent": _agent(tags),
+            "model": _model_id(serialized, metadata, kwargs),
+        }
+        self._start(run_id, "llm", labels, _llm_key(labels["node"], labels["agent"], labels["model"]))
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        finished = self._finish(run_id, failed=False)
+        if finished is None:
+            return
+        _, labels, key = finished
+        usage = _token_usage(response)
+        metrics = get_metrics()
+        metrics.describe("llm_tokens_total", "Tokens per LLM request type (input, output, cache_read, cache_write)")
+        for name, value in usage.items():
+            if value:
+                metrics.inc_key("llm_tokens_total", value, _with_type(key, name.removesuffix("_tokens")))
+        metrics.describe("llm_cost_usd_total", "Estimated LLM cost in USD at on-demand prices")
+        metrics.inc_key("llm_cost_usd_total", estimate_cost(labels["model"], usage), key)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id, failed=True)
+
+    def on_tool_start(self, serialized: dict[str, Any], input_str: str, *, run_id: UUID, metadata: dict[str, Any] | None = None, **kwargs: Any):
+        self._start(run_id, "retriever", {
+            "node": (metadata or {}).get("langgraph_node", "-"),
+            "tool": (serialized or {}).get("name") or kwargs.get("name") or "retriever",
+        })
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id, failed=False)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id, failed=True)
+
+
+_handler = MetricsCallbackHandler()
+
+def get_metrics_handler() -> MetricsCallbackHandler:
+    return _handler
+
+
+def instrument_agent(name: str, chain: Any) -> Any:
+    """LazyRegistry wrapper: attach the metrics handler and an agent:<name> tag to an agent chain"""
+    if not isinstance(chain, Runnable):
+        return chain
+    tag = f"agent:{name}"
+
+    def agent_config(config: RunnableConfig) -> RunnableConfig:
+        # with_config(callbacks=...) would replace the callbacks a nested call inherits from its
+        # parent run, so start from the inherited config and add the handler to it
+        inherited = ensure_config(config)
+        callbacks = merge_configs({"callbacks": inherited.get("callbacks")}, {"callbacks": [_handler]})["callbacks"]
+        return {"callbacks": callbacks, "tags": [*inherited.get("tags", []), tag]}
+
+    return RunnableBinding(bound=chain, config_factories=[agent_config])
+
+
+def instrument_retriever_tool(name: str, value: Any) -> Any:
+    """LazyRegistry wrapper: a tool runs its own callbacks next to the caller's, add the metrics handler there"""
+    if isinstance(value, BaseTool) and _handler not in (value.callbacks or []):
+        value.callbacks = [*(value.callbacks or []), _handler] # type: ignore
+    return value
+
+
+def metrics_report() -> str:
+    """Latency percentiles per node, Gmail call, LLM request and retrieval, then LLM tokens and cost per graph node"""
+    snapshot = get_metrics().snapshot()
+    lines = [f"{'series':<96}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"]
+    for kind in _KINDS:
+        errors = {_label_key(series["labels"]): series["value"] for series in snapshot.get(f"{kind}_errors_total", [])}
+        for series in sorted(snapshot.get(f"{kind}_latency_seconds", []), key=lambda series: _label_key(series["labels"])):
+            name = f"{kind} " + ",".join(f"{key}={value}" for key, value in _label_key(series["labels"]))
+            lines.append(
+                f"{name[:95]:<96}{series['count']:>7}{series['p50'] * 1000:>9.1f}{series['p95'] * 1000:>9.1f}"
+                f"{series['p99'] * 1000:>9.1f}{errors.get(_label_key(series['labels']), 0):>8.0f}"
+            )
+
+    usage: dict[tuple, dict[str, float]] = {}
+    for metric in ("llm_tokens_total", "llm_cost_usd_total"):
+        for series in snapshot.get(metric, []):
+            labels = dict(series["labels"])
+            token_type = labels.pop("type", "cost_usd")
+            row = usage.setdefault((labels.get("node", "-"), labels.get("model", "-")), {})
+            row[token_type] = row.get(token_type, 0) + series["value"]
+    if usage:
+        lines.append("")
+        lines.append(f"{'llm node':<28}{'model':<28}{'input':>9}{'output':>9}{'cache read':>12}{'cache write':>13}{'cost USD':>11}")
+        for (node, model), row in sorted(usage.items()):
+            lines.append(
+                f"{node[:27]:<28}{model[:27]:<28}{row.get('input', 0):>9.0f}{row.get('output', 0):>9.0f}"
+                f"{row.get('cache_read', 0):>12.0f}{row.get('cache_write', 0):>13.0f}{row.get('cost_usd', 0):>11.5f}"
+            )
+    return "\n".join(lines)
+
+
+def node_usage() -> dict[str, dict[str, float]]:
+    """
+    Usage per graph node from the current registry: calls, latency_ms and errors of the node
+    itself (labelled with its registry key), llm_calls, llm_latency_ms and input, output,
+    cache_read and cache_write tokens of its LLM requests (labelled with the graph node).
+    Install a fresh registry with set_metrics(MetricsRegistry()) to account a single run.
+    """
+    snapshot = get_metrics().snapshot()
+    usage: dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for kind, calls in (("node", "calls"), ("llm", "llm_calls")):
+        for series in snapshot.get(f"{kind}_latency_seconds", []):
+            row = usage[series["labels"].get("node", "-")]
+            row[calls] += series["count"]
+            row["latency_ms" if kind == "node" else "llm_latency_ms"] += series["sum"] * 1000
+    for series in snapshot.get("node_errors_total", []):
+        usage[series["labels"].get("node", "-")]["errors"] += series["value"]
+    for series in snapshot.get("llm_tokens_total", []):
+        usage[series["labels"].get("node", "-")][f"{series['labels']['type']}_tokens"] += series["value"]
+    return {node: dict(values) for node, values in usage.items()}
+
+
+def usage_totals() -> dict[str, float]:
+    """node_usage() summed over every node"""
+    totals: dict[str, float] = defaultdict(float)
+    for values in node_usage().values():
+        for name, value in values.items():
+            totals[name] += value
+    return dict(totals)
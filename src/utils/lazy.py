@@ -0,0 +1,66 @@
+from collections.abc import Mapping
+from typing import Any, Callable, Iterator
+import threading
+
+
+class LazyRegistry(Mapping):
+    """
+    Read-only mapping whose values are built by their factory on first access and then memoized.
+    Values can be injected up front with override()/update(), e.g. fakes in tests and benchmarks.
+    """
+
+    def __init__(self, factories: dict[str, Callable[[], Any]]):
+        self._factories = dict(factories)
+        self._values: dict[str, Any] = {}
+        self._wrappers: list[Callable[[str, Any], Any]] = []
+        self._lock = threading.RLock()
+
+    def __getitem__(self, name: str) -> Any:
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        factory = self._factories[name]
+        with self._lock:
+            # another thread may have built it while we waited
+            if name not in self._values:
+                self._values[name] = self._wrap(name, factory())
+            return self._values[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._factories)
+
+    def __len__(self) -> int:
+        return len(self._factories)
+
+    def is_built(self, name: str) -> bool:
+        return name in self._values
+
+    def override(self, name: str, value: Any):
+        """Use a ready-made value instead of calling the factory"""
+        with self._lock:
+            self._factories.setdefault(name, lambda: value)
+            self._values[name] = self._wrap(name, value)
+
+    def update(self, values: dict[str, Any]):
+        for name, value in values.items():
+            self.override(name, value)
+
+    def wrap(self, wrapper: Callable[[str, Any], Any]):
+        """Pass every value, built or injected, through wrapper(name, value), e.g. to instrument it"""
+        with self._lock:
+            self._wrappers.append(wrapper)
+            self._values = {name: wrapper(name, value) for name, value in self._values.items()}
+
+    def _wrap(self, name: str, value: Any) -> Any:
+        for wrapper in self._wrappers:
+            value = wrapper(name, value)
+        return value
+
+    def reset(self, name: str | None = None):
+        """Drop built or injected values so the factories run again on next access"""
+        with self._lock:
+            if name is None:
+                self._values.clear()
+            else:
+                self._values.pop(name, None)
@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from typing import Iterator
+import json
+import os
+import re
+
+load_dotenv()
+
+# the mailbox of token.json, and the key the single-mailbox deployment has always used
+DEFAULT_MAILBOX = "me"
+
+_MAILBOX_NAME = re.compile(r"^[\w.-]+$")
+
+
+@dataclass(frozen=True)
+class Mailbox:
+    name: str
+    token_path: str = "token.json"
+    credentials_path: str = "credentials.json"
+
+
+def load_mailboxes(path: str | None = None) -> list[Mailbox]:
+    """
+    The support mailboxes listed in MAILBOXES_PATH (default mailboxes.json), a JSON list of
+    {"name", "token_path", "credentials_path"}. Without the file, the single token.json mailbox.
+    """
+    path = path or os.getenv("MAILBOXES_PATH", "mailboxes.json")
+    if not os.path.exists(path):
+        return [Mailbox(DEFAULT_MAILBOX)]
+    with open(path) as file:
+        mailboxes = [Mailbox(**entry) for entry in json.load(file)]
+    for mailbox in mailboxes:
+        # names end up in file names and cache keys
+        if not _MAILBOX_NAME.match(mailbox.name):
+            raise ValueError(f"Invalid mailbox name: {mailbox.name!r}")
+    if len({mailbox.name for mailbox in mailboxes}) != len(mailboxes):
+        raise ValueError(f"Duplicate mailbox names in {path}")
+    return mailboxes
+
+def get_mailbox(name: str) -> Mailbox:
+    if name == DEFAULT_MAILBOX:
+        return Mailbox(DEFAULT_MAILBOX)
+    for mailbox in load_mailboxes():
+        if mailbox.name == name:
+            return mailbox
+    raise LookupError(f"Unknown mailbox: {name}")
+
+
+# the mailbox the current thread or task works for; LangChain copies the context into its worker threads
+_current_mailbox: ContextVar[str] = ContextVar("current_mailbox", default=DEFAULT_MAILBOX)
+
+def current_mailbox() -> str:
+    return _current_mailbox.get()
+
+@contextmanager
+def use_mailbox(name: str) -> Iterator[str]:
+    """Route Gmail calls, the outbox and the history listener to the given mailbox inside the block"""
+    token = _current_mailbox.set(name)
+    try:
+        yield name
+    finally:
+        _current_mailbox.reset(token)
+
+def mailbox_path(path: str, mailbox: str | None = None) -> str:
+    """A per-mailbox variant of a file path: outbox.sqlite becomes outbox-<mailbox>.sqlite"""
+    mailbox = mailbox or current_mailbox()
+    if mailbox == DEFAULT_MAILBOX or path == ":memory:":
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}-{mailbox}{extension}"
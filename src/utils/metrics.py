@@ -0,0 +1,271 @@
+from langchain_core.outputs import LLMResult
+from collections import defaultdict
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+import bisect
+import functools
+import math
+import os
+import threading
+import time
+
+load_dotenv()
+
+# seconds, from a cache hit to a slow Bedrock call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.0075, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram, constant memory however many values are observed. Quantiles are
+    interpolated inside the bucket that holds them, like Prometheus' histogram_quantile, with the
+    first and last buckets narrowed to the observed min and max.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # one count per bucket plus the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = max(self.buckets[index - 1] if index else 0.0, self.min)
+                upper = min(self.buckets[index] if index < len(self.buckets) else self.max, self.max)
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.max
+
+    def snapshot(self) -> dict[str, float]:
+        values = {"count": self.count, "sum": self.sum, "mean": self.sum / self.count if self.count else 0.0}
+        values.update({f"p{round(q * 100)}": self.quantile(q) for q in QUANTILES})
+        return values
+
+
+def _label_key(labels: dict[str, str]) -> tuple[tuple[str, str], ...]:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _quote(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+def _format_labels(key: tuple[tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f"{name}={_quote(value)}" for name, value in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class MetricsRegistry:
+    """
+    In-memory counters and histograms keyed by metric name and labels. Read it with snapshot()
+    (plain dicts, e.g. to dump as JSON) or to_prometheus() (text exposition format).
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[tuple, float]] = defaultdict(lambda: defaultdict(float))
+        self._histograms: dict[str, dict[tuple, Histogram]] = defaultdict(dict)
+        self._help: dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels: str):
+        if not self.enabled:
+            return
+        self.inc_key(name, value, _label_key(labels))
+
+    def inc_key(self, name: str, value: float, key: tuple[tuple[str, str], ...]):
+        """inc() with the labels already turned into a key by _label_key, for callers that reuse one"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name][key] += value
+
+    def observe(self, name: str, value: float, **labels: str):
+        self.observe_key(name, value, _label_key(labels))
+
+    def observe_key(self, name: str, value: float, key: tuple[tuple[str, str], ...]):
+        """observe() with the labels already turned into a key by _label_key, for callers that reuse one"""
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self._histograms[name]
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> dict[str, list[dict]]:
+        """{metric: [{"labels": {...}, "value": x} or {"labels": {...}, "count": .., "p50": .., ...}]}"""
+        with self._lock:
+            result: dict[str, list[dict]] = {}
+            for name, series in self._counters.items():
+                result[name] = [{"labels": dict(key), "value": value} for key, value in series.items()]
+            for name, series in self._histograms.items():
+                result[name] = [{"labels": dict(key), **histogram.snapshot()} for key, histogram in series.items()]
+            return result
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip((*histogram.buckets, math.inf), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == math.inf else f"{bound:g}"
+                        lines.append(f"{name}_bucket{_format_labels(key, 'le=' + _quote(le))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """USD per million tokens"""
+    input: float
+    output: float
+    cache_read: float
+    cache_write: float
+
+
+# on-demand list prices at the time of writing, matched as a substring of the model id, first match wins
+MODEL_PRICES: dict[str, ModelPrice] = {
+    "nova-2-lite": ModelPrice(input=0.30, output=2.50, cache_read=0.075, cache_write=0.30),
+    "nova-micro": ModelPrice(input=0.035, output=0.14, cache_read=0.00875, cache_write=0.035),
+    "nova-lite": ModelPrice(input=0.06, output=0.24, cache_read=0.015, cache_write=0.06),
+    "nova-pro": ModelPrice(input=0.80, output=3.20, cache_read=0.20, cache_write=0.80),
+}
+
+def set_model_price(model: str, price: ModelPrice):
+    """Add or override the price for model ids containing `model`, checked before the built-in ones"""
+    MODEL_PRICES.pop(model, None)
+    prices = {model: price, **MODEL_PRICES}
+    MODEL_PRICES.clear()
+    MODEL_PRICES.update(prices)
+    _model_price.cache_clear()
+
+@functools.lru_cache(maxsize=256)
+def _model_price(model_id: str) -> ModelPrice | None:
+    return next((price for family, price in MODEL_PRICES.items() if family in model_id), None)
+
+def estimate_cost(model_id: str, usage: dict[str, int]) -> float:
+    """Estimated USD for one call's token usage (as returned by _token_usage), 0 for unknown models"""
+    price = _model_price(model_id)
+    if price is None:
+        return 0.0
+    return (
+        usage.get("input_tokens", 0) * price.input
+        + usage.get("output_tokens", 0) * price.output
+        + usage.get("cache_read_tokens", 0) * price.cache_read
+        + usage.get("cache_write_tokens", 0) * price.cache_write
+    ) / 1_000_000
+
+
+_metrics = None
+
+def get_metrics() -> MetricsRegistry:
+    """Process-wide registry, METRICS_ENABLED=false turns recording off"""
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsRegistry(enabled=os.getenv("METRICS_ENABLED", "true").lower() == "true")
+    return _metrics
+
+def set_metrics(registry: MetricsRegistry | None):
+    """Replace the process-wide registry, None rebuilds it from the environment on next use"""
+    global _metrics
+    _metrics = registry
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = get_metrics().to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+
+_server = None
+
+def start_metrics_server(port: int | None = None, host: str | None = None) -> ThreadingHTTPServer | None:
+    """
+    Serve /metrics for Prometheus on `port` (default: METRICS_PORT env var, unset means no server).
+    Binds `host` (default: METRICS_HOST env var, else 127.0.0.1), the labels name mailboxes and
+    categories, so only listen on other interfaces on purpose.
+    """
+    global _server
+    if _server is None:
+        port = port if port is not None else int(os.getenv("METRICS_PORT", "0") or 0)
+        if not port:
+            return None
+        host = host or os.getenv("METRICS_HOST") or "127.0.0.1"
+        _server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        print(f"Serving metrics on http://{host}:{port}/metrics")
+    return _server
+
+
+def _token_usage(response: LLMResult) -> dict[str, int]:
+    """
+    Read token usage from the generated message, falling back to the provider's llm_output.
+    Bedrock reports prompt-cache reads and writes apart from input_tokens.
+    """
+    usage_totals = {"input_tokens": 0, "output_tokens": 0, "cache_read_tokens": 0, "cache_write_tokens": 0}
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                details = usage.get("input_token_details") or {}
+                usage_totals["input_tokens"] += usage.get("input_tokens", 0)
+                usage_totals["output_tokens"] += usage.get("output_tokens", 0)
+                usage_totals["cache_read_tokens"] += details.get("cache_read", 0)
+                usage_totals["cache_write_tokens"] += details.get("cache_creation", 0)
+    if not usage_totals["input_tokens"] and not usage_totals["output_tokens"] and response.llm_output:
+        usage = response.llm_output.get("usage", {}) or {}
+        usage_totals["input_tokens"] = usage.get("prompt_tokens", usage.get("input_tokens", 0))
+        usage_totals["output_tokens"] = usage.get("completion_tokens", usage.get("output_tokens", 0))
+    return usage_totals
@@ -0,0 +1,177 @@
+from html.parser import HTMLParser
+from typing import Iterator
+import base64
+import re
+
+# Gmail masks cannot recurse, list enough levels for mixed > related > alternative > text and some slack
+_MIME_DEPTH = 6
+
+def _part_fields(depth: int) -> str:
+    fields = "mimeType,filename,headers,body/data"
+    return f"{fields},parts({_part_fields(depth - 1)})" if depth else fields
+
+# partial response for messages.get: the headers and text we parse, not snippets, sizes, part ids or attachment ids
+MESSAGE_FIELDS = f"id,threadId,labelIds,payload({_part_fields(_MIME_DEPTH)})"
+
+
+def _headers(part: dict) -> dict[str, str]:
+    return {header["name"].lower(): header["value"] for header in part.get("headers", [])}
+
+def _is_attachment(part: dict) -> bool:
+    if part.get("filename") or part.get("body", {}).get("attachmentId"):
+        return True
+    return _headers(part).get("content-disposition", "").lower().startswith("attachment")
+
+def iter_parts(payload: dict) -> Iterator[dict]:
+    """
+    Leaf parts of a Gmail payload in document order, depth first. Attachments and embedded
+    messages (forwarded .eml, the original of a bounce) are not entered.
+    """
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        mime_type = part.get("mimeType", "")
+        if mime_type.startswith("message/") or _is_attachment(part):
+            continue
+        if "parts" in part:
+            stack.extend(reversed(part["parts"]))
+        else:
+            yield part
+
+def _charset(part: dict) -> str:
+    match = re.search(r'charset="?([\w.:-]+)"?', _headers(part).get("content-type", ""), flags=re.IGNORECASE)
+    return match.group(1) if match else "utf-8"
+
+def decode_part(part: dict) -> str:
+    """Text of a leaf part: Gmail returns the transfer-decoded bytes as base64url, in the part's charset"""
+    data = part.get("body", {}).get("data", "")
+    if not data:
+        return ""
+    try:
+        raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    except Exception:
+        return ""
+    try:
+        return raw.decode(_charset(part), errors="replace")
+    except LookupError:
+        return raw.decode("utf-8", errors="replace")
+
+def extract_body(payload: dict) -> str:
+    """The first text/plain part of the MIME tree, else the first text/html part converted to text"""
+    html_part = None
+    for part in iter_parts(payload):
+        mime_type = part.get("mimeType", "")
+        if mime_type == "text/plain":
+            text = decode_part(part)
+            if text.strip():
+                return text
+        elif mime_type == "text/html" and html_part is None:
+            html_part = part
+    return html_to_text(decode_part(html_part)) if html_part is not None else ""
+
+
+_BLOCK_TAGS = {"p", "div", "br", "tr", "li", "ul", "ol", "table", "h1", "h2", "h3", "h4", "h5", "h6", "hr", "blockquote", "pre"}
+_SKIPPED_TAGS = {"script", "style", "head", "title", "noscript"}
+_VOID_TAGS = {"br", "hr", "img", "meta", "link", "input", "wbr", "col", "area", "base", "source"}
+
+
+class _TextExtractor(HTMLParser):
+    """Visible text with line breaks at block elements; blockquote lines get a '> ' prefix like plain-text quotes"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: list[str] = []
+        self._line: list[str] = []
+        self._skipping = 0
+        self._quote_depth = 0
+
+    def _break(self):
+        collapsed = re.sub(r"\s+", " ", "".join(self._line))
+        # keep the trailing space of a signature delimiter, see _SIGNATURE
+        text = "-- " if collapsed.lstrip() == "-- " else collapsed.strip()
+        self._line = []
+        if text:
+            self.lines.append("> " * self._quote_depth + text)
+        elif self.lines and self.lines[-1]:
+            self.lines.append("")
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skipping += 1
+        elif tag in _BLOCK_TAGS:
+            self._break()
+            if tag == "blockquote":
+                self._quote_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self._break()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in _BLOCK_TAGS and tag not in _VOID_TAGS:
+            self._break()
+            if tag == "blockquote":
+                self._quote_depth = max(0, self._quote_depth - 1)
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self._line.append(data)
+
+def html_to_text(html: str) -> str:
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    extractor._break()
+    return "\n".join(extractor.lines).strip()
+
+
+# the date opening an attribution line: up to a weekday and a month name, the day, then a year or a time
+_DATE = r"([^\W\d]+\.?,?\s+){0,2}\d{1,2}\b.*(\d{4}|\d{1,2}:\d{2})"
+# "El lun, 6 oct 2025 a las 10:00, Ana <ana@example.com> escribió:" and the English, Portuguese, French and German
+# forms: the opening word, straight followed by the date, then the verb of the same language; "El" alone is
+# just the Spanish article.
+_ATTRIBUTION = re.compile(
+    rf"^\s*(On\s+{_DATE}.*\bwrote|El\s+{_DATE}.*\bescribió|Em\s+{_DATE}.*\bescreveu|Le\s+{_DATE}.*\ba écrit"
+    rf"|Am\s+{_DATE}.*\bschrieb\b.*)\s*:\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+# a forwarded email is the content, not history: nothing after this marker is stripped
+_FORWARDED = re.compile(r"^\s*-{2,}\s*(Forwarded message|Mensaje reenviado|Mensagem encaminhada|Message transféré)\s*-{2,}", re.IGNORECASE)
+_ORIGINAL_MESSAGE = re.compile(r"^\s*-{2,}\s*(Original Message|Mensaje original|Mensagem original|Message d'origine)\s*-{2,}", re.IGNORECASE)
+# Outlook's header block: From/De, then Sent/Enviado/Date/Fecha within the next lines
+_HEADER_FROM = re.compile(r"^\s*\**(From|De)\s*:\**\s", re.IGNORECASE)
+_HEADER_SENT = re.compile(r"^\s*\**(Sent|Enviado|Date|Fecha|To|Para)\s*:", re.IGNORECASE)
+# the RFC 3676 delimiter is "-- " with its trailing space, a bare "--" or "___" line may be part of the message
+_SIGNATURE = re.compile(
+    r"^(-- |\s*(Sent from my \w+|Enviado desde mi \w+|Get Outlook for \w+|Obtener Outlook para \w+|Sent from Mail for Windows)\s*)$",
+    re.IGNORECASE
+)
+
+def _history_start(lines: list[str]) -> int:
+    for index, line in enumerate(lines):
+        if _FORWARDED.match(line):
+            return len(lines)
+        following = lines[index + 1] if index + 1 < len(lines) else ""
+        if (
+            _ATTRIBUTION.match(line)
+            # clients wrap long attribution lines
+            or (following and _ATTRIBUTION.match(f"{line} {following}") and not _ATTRIBUTION.match(following))
+            or _ORIGINAL_MESSAGE.match(line)
+            or _SIGNATURE.match(line)
+            or (_HEADER_FROM.match(line) and any(_HEADER_SENT.match(next_line) for next_line in lines[index + 1:index + 4]))
+        ):
+            return index
+    return len(lines)
+
+def strip_quoted_text(text: str) -> str:
+    """
+    Drop the reply history (attribution line or Outlook header block and everything after it,
+    '>' quoted lines) and the signature; a forwarded email is kept whole. Returns the text
+    unchanged when nothing would be left, e.g. for an email that is only a quote.
+    """
+    lines = text.replace("\r\n", "\n").split("\n")
+    kept = [line.rstrip() for line in lines[:_history_start(lines)] if not line.lstrip().startswith(">")]
+    stripped = re.sub(r"\n{3,}", "\n\n", "\n".join(kept)).strip()
+    return stripped or text.strip()
@@ -0,0 +1,362 @@
+from googleapiclient.errors import HttpError
+from ..state import Email
+from .gmail_utils import BATCH_SIZE, _get_gmail_service, build_reply_message
+from .instrumentation import timed
+from .mailboxes import DEFAULT_MAILBOX, current_mailbox, mailbox_path
+from collections import Counter
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from email import message_from_bytes
+from typing import Callable
+import base64
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+load_dotenv()
+
+# 429 and transient server errors are retried, anything else fails the reply
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Gmail signals per-user quota as 403 with one of these reasons
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second refill up to `capacity`.
+    acquire() blocks until a token is available; a rate of None disables limiting.
+    """
+
+    def __init__(
+        self,
+        rate: float | None,
+        capacity: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens, returns the seconds spent waiting"""
+        if self.rate is None:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(self._clock())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait = (tokens - self._tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+    def drain(self):
+        """Throw away the burst allowance, used when the server says we are going too fast"""
+        if self.rate is None:
+            return
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens = min(self._tokens, 0.0)
+
+
+def backoff_delay(attempt: int, base: float, cap: float, rng: random.Random = random) -> float:
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base * 2 ** attempt)]"""
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _retry_after(error: Exception) -> float | None:
+    """Seconds requested by a Retry-After header, when the server sent one"""
+    resp = getattr(error, "resp", None)
+    value = resp.get("retry-after") if resp is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status in RETRYABLE_STATUSES:
+            return True
+        content = error.content.decode("utf-8", "replace") if isinstance(error.content, bytes) else str(error.content)
+        return status == 403 and any(reason in content for reason in RATE_LIMIT_REASONS)
+    # dropped connections and timeouts
+    return isinstance(error, (ConnectionError, TimeoutError, OSError))
+
+
+@dataclass
+class OutboxItem:
+    original_id: str
+    message_id: str
+    payload: dict
+    attempts: int
+
+
+class OutboxStore:
+    """
+    Durable SQLite queue of outgoing replies keyed by the id of the email they answer, so
+    enqueueing the same reply twice is a no-op. Rows move pending -> sending -> sent, or
+    back to pending with a later next_attempt_at on retryable errors, or to failed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "original_id TEXT PRIMARY KEY, message_id TEXT NOT NULL, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, "
+            "last_error TEXT, sent_id TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+        self._conn.commit()
+
+    def enqueue(self, original_id: str, message_id: str, payload: dict) -> bool:
+        """Returns False when a reply to this email is already queued or sent"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox (original_id, message_id, payload, status, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'pending', ?, ?, ?)",
+                (original_id, message_id, json.dumps(payload), now, now, now)
+            )
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    def _items(self, rows) -> list[OutboxItem]:
+        return [
+            OutboxItem(original_id=original_id, message_id=message_id, payload=json.loads(payload), attempts=attempts)
+            for original_id, message_id, payload, attempts in rows
+        ]
+
+    def claim_due(self, limit: int, now: float | None = None) -> list[OutboxItem]:
+        """Move up to `limit` due pending replies to sending and return them"""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT original_id, message_id, payload, attempts FROM outbox "
+                "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE outbox SET status = 'sending', updated_at = ? WHERE original_id = ?",
+                [(now, row[0]) for row in rows]
+            )
+            self._conn.commit()
+        return self._items(rows)
+
+    def in_flight(self) -> list[OutboxItem]:
+        """Replies left in sending by a process that stopped mid-send"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT original_id, message_id, payload, attempts FROM outbox WHERE status = 'sending'"
+            ).fetchall()
+        return self._items(rows)
+
+    def _update(self, original_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE outbox SET {assignments} WHERE original_id = ?", (*fields.values(), original_id))
+            self._conn.commit()
+
+    def mark_sent(self, original_id: str, sent_id: str):
+        self._update(original_id, status="sent", sent_id=sent_id, last_error=None)
+
+    def reschedule(self, original_id: str, attempts: int, next_attempt_at: float, error: str | None = None):
+        self._update(original_id, status="pending", attempts=attempts, next_attempt_at=next_attempt_at, last_error=error)
+
+    def mark_failed(self, original_id: str, attempts: int, error: str):
+        self._update(original_id, status="failed", attempts=attempts, last_error=error)
+
+    def next_attempt_at(self) -> float | None:
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()
+        return row[0]
+
+    def status_counts(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+
+class OutboxSender:
+    """
+    Drains the OutboxStore through Gmail batch requests of up to `batch_size` sends (and no more
+    than the bucket's burst), pacing them through a TokenBucket sized to the per-user quota. Retryable failures (429,
+    5xx, 403 rate limits, dropped connections) are rescheduled with jittered exponential
+    backoff, or after Retry-After when Gmail sends one; after `max_attempts` the reply is
+    marked failed. A rate-limit error also drains the bucket so the next sends slow down.
+
+    Replies claimed by a process that died mid-send are reconciled on the first flush: a
+    reply whose Message-ID already shows up in the mailbox is marked sent, the rest go back
+    to pending. That keeps a restart from losing or duplicating replies.
+    """
+
+    def __init__(
+        self,
+        store: OutboxStore,
+        bucket: TokenBucket | None = None,
+        service=None,
+        batch_size: int = BATCH_SIZE,
+        max_attempts: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        rng: random.Random | None = None,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.store = store
+        self.bucket = bucket or TokenBucket(rate=None)
+        self.service = service
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = Counter()
+        self._rng = rng or random.Random()
+        self._sleep = sleep
+        self._recovered = False
+        self._lock = threading.Lock()
+
+    def _get_service(self):
+        return self.service or _get_gmail_service()
+
+    def enqueue(self, original_email: Email, reply_email: Email) -> bool:
+        payload = build_reply_message(original_email=original_email, reply_email=reply_email)
+        mime = message_from_bytes(base64.urlsafe_b64decode(payload["raw"]))
+        queued = self.store.enqueue(original_email.id, mime.get("Message-ID", ""), payload)
+        self.stats["enqueued" if queued else "duplicates_ignored"] += 1
+        return queued
+
+    def flush(self, wait: bool = False) -> Counter:
+        """
+        Send every reply that is due now. With wait=True keep going, sleeping through
+        backoffs, until nothing is left pending. Returns the outcome counts of this call.
+        """
+        with self._lock:
+            service = self._get_service()
+            if not self._recovered:
+                self._recover(service)
+                self._recovered = True
+            outcomes = Counter()
+            # every call in a batch hits the quota at the same instant, so a batch is at most one burst
+            limit = self.batch_size if self.bucket.rate is None else max(1, min(self.batch_size, int(self.bucket.capacity)))
+            while True:
+                items = self.store.claim_due(limit=limit)
+                if items:
+                    self._send_batch(service, items, outcomes)
+                    continue
+                next_attempt_at = self.store.next_attempt_at()
+                if not wait or next_attempt_at is None:
+                    break
+                self._sleep(max(0.0, next_attempt_at - time.time()))
+            self.stats.update(outcomes)
+            return outcomes
+
+    @timed("gmail", call="messages.batch_send")
+    def _send_batch(self, service, items: list[OutboxItem], outcomes: Counter):
+        by_id = {item.original_id: item for item in items}
+
+        def _on_sent(request_id, response, exception):
+            item = by_id[request_id]
+            if exception is None:
+                self.store.mark_sent(item.original_id, response["id"])
+                outcomes["sent"] += 1
+            else:
+                self._handle_error(item, exception, outcomes)
+
+        self.stats["throttled_seconds"] += self.bucket.acquire(len(items))
+        batch = service.new_batch_http_request(callback=_on_sent)
+        for item in items:
+            batch.add(service.users().messages().send(userId='me', body=item.payload), request_id=item.original_id)
+        try:
+            batch.execute()
+        except Exception as error:
+            # the whole round trip failed, nothing in it was sent
+            for item in items:
+                self._handle_error(item, error, outcomes)
+
+    def _handle_error(self, item: OutboxItem, error: Exception, outcomes: Counter):
+        attempts = item.attempts + 1
+        if not is_retryable(error) or attempts >= self.max_attempts:
+            print(f'Giving up on the reply to {item.original_id} after {attempts} attempts: {error}')
+            self.store.mark_failed(item.original_id, attempts, str(error))
+            outcomes["failed"] += 1
+            return
+        if isinstance(error, HttpError) and error.resp.status in (403, 429):
+            self.bucket.drain()
+            outcomes["rate_limited"] += 1
+        delay = _retry_after(error)
+        if delay is None:
+            delay = backoff_delay(attempts - 1, self.base_delay, self.max_delay, self._rng)
+        self.store.reschedule(item.original_id, attempts, time.time() + delay, str(error))
+        outcomes["retried"] += 1
+
+    def _recover(self, service):
+        for item in self.store.in_flight():
+            found = service.users().messages().list(
+                userId='me', q=f"rfc822msgid:{item.message_id}", maxResults=1
+            ).execute().get("messages", [])
+            if found:
+                self.store.mark_sent(item.original_id, found[0]["id"])
+            else:
+                self.store.reschedule(item.original_id, item.attempts, time.time())
+            self.stats["recovered"] += 1
+
+
+def outbox_enabled() -> bool:
+    return os.getenv("OUTBOX_ENABLED", "true").lower() == "true"
+
+
+# mailbox name -> sender, the send quota is per Gmail user
+_senders: dict[str, OutboxSender] = {}
+_senders_lock = threading.Lock()
+
+def get_outbox_sender() -> OutboxSender:
+    """
+    The current mailbox's sender, backed by OUTBOX_PATH (outbox-<mailbox>.sqlite for mailboxes
+    other than the default one). OUTBOX_SEND_RATE defaults to 2 sends/s, just under Gmail's 250
+    quota units per user per second at 100 units per messages.send.
+    """
+    mailbox = current_mailbox()
+    sender = _senders.get(mailbox)
+    if sender is None:
+        with _senders_lock:
+            sender = _senders.get(mailbox)
+            if sender is None:
+                sender = OutboxSender(
+                    store=OutboxStore(mailbox_path(os.getenv("OUTBOX_PATH", ".cache/outbox.sqlite"), mailbox)),
+                    bucket=TokenBucket(
+                        rate=float(os.getenv("OUTBOX_SEND_RATE", "2")),
+                        capacity=float(os.getenv("OUTBOX_BURST", "5"))
+                    ),
+                    max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+                )
+                _senders[mailbox] = sender
+    return sender
+
+def set_outbox_sender(sender: OutboxSender | None, mailbox: str = DEFAULT_MAILBOX):
+    """Replace a mailbox's sender, None rebuilds it from the environment on next use"""
+    if sender is None:
+        _senders.pop(mailbox, None)
+    else:
+        _senders[mailbox] = sender
@@ -0,0 +1,136 @@
+from ..state import Email
+from ..structured_outputs import EmailCategory
+from dataclasses import dataclass
+from dotenv import load_dotenv
+import math
+import os
+import re
+import unicodedata
+
+load_dotenv()
+
+AUTOMATED_SENDER = re.compile(
+    r"(mailer-daemon|postmaster|no-?reply|do-?not-?reply|bounce[s]?@|notifications?@|newsletter|marketing@|news@)",
+    re.IGNORECASE
+)
+AUTOMATED_SUBJECT = re.compile(
+    r"(delivery status notification|undeliverable|mail delivery (failed|subsystem)|returned mail|"
+    r"out of office|automatic reply|auto-?reply|respuesta autom[aá]tica|fuera de la oficina|newsletter|webinar)",
+    re.IGNORECASE
+)
+MARKETING_BODY = re.compile(
+    r"(unsubscribe|darse de baja|darte de baja|cancelar (la )?suscripci[oó]n|view (this email )?in (your )?browser|"
+    r"ver en el navegador)",
+    re.IGNORECASE
+)
+
+# hand-picked cue words per category (Spanish and English, accents stripped)
+CATEGORY_KEYWORDS = {
+    EmailCategory.product_enquiry: (
+        "precio", "precios", "cuesta", "cuanto", "costo", "disponible", "disponibilidad", "stock", "modelo",
+        "financiamiento", "cuotas", "meses", "informacion", "quisiera", "saber", "tienen", "venden", "garantia",
+        "price", "pricing", "cost", "available", "availability", "model", "information", "interested",
+    ),
+    EmailCategory.customer_complaint: (
+        "molesto", "molesta", "queja", "reclamo", "problema", "falla", "defectuoso", "roto", "devolucion",
+        "reembolso", "demora", "retraso", "pesimo", "terrible", "inaceptable", "nunca", "llego", "danado",
+        "complaint", "broken", "defective", "refund", "delay", "late", "unacceptable", "disappointed", "issue",
+    ),
+    EmailCategory.customer_feedback: (
+        "gracias", "excelente", "felicitaciones", "sugerencia", "sugiero", "recomendaria", "encanto", "satisfecho",
+        "opinion", "comentario", "mejorar", "genial",
+        "thanks", "great", "excellent", "suggestion", "suggest", "feedback", "recommend", "love", "improve",
+    ),
+    EmailCategory.unrelated: (
+        "seo", "marketing", "oferta", "promocion", "descuento", "webinar", "suscripcion", "newsletter",
+        "inversion", "criptomonedas", "prestamo", "ganador", "premio",
+        "offer", "discount", "subscribe", "investment", "crypto", "loan", "winner", "prize", "services",
+    ),
+}
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _tokenize(text: str) -> list[str]:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _TOKEN.findall(text)
+
+
+@dataclass
+class PreclassifierResult:
+    category: EmailCategory | None
+    confidence: float
+    reason: str
+
+    @property
+    def decided(self) -> bool:
+        return self.category is not None
+
+
+class KeywordScorer:
+    """
+    TF-IDF style scorer: each category is a bag of cue words, a word shared by several
+    categories carries less weight, and the confidence is the winning category's share
+    of the total score.
+    """
+
+    def __init__(self, keywords: dict[EmailCategory, tuple[str, ...]] = CATEGORY_KEYWORDS):
+        document_frequency: dict[str, int] = {}
+        for words in keywords.values():
+            for word in set(words):
+                document_frequency[word] = document_frequency.get(word, 0) + 1
+        self.weights = {
+            category: {word: math.log(1 + len(keywords) / document_frequency[word]) for word in words}
+            for category, words in keywords.items()
+        }
+
+    def scores(self, text: str) -> dict[EmailCategory, float]:
+        term_counts: dict[str, int] = {}
+        for token in _tokenize(text):
+            term_counts[token] = term_counts.get(token, 0) + 1
+        return {
+            category: sum(weight * (1 + math.log(term_counts[word])) for word, weight in weights.items() if word in term_counts)
+            for category, weights in self.weights.items()
+        }
+
+    def classify(self, text: str, min_score: float) -> PreclassifierResult:
+        scores = self.scores(text)
+        best = max(scores, key=scores.get)
+        total = sum(scores.values())
+        if scores[best] < min_score or not total:
+            return PreclassifierResult(category=None, confidence=0.0, reason="keywords")
+        return PreclassifierResult(category=best, confidence=scores[best] / total, reason="keywords")
+
+
+class Preclassifier:
+    """Cheap local tier in front of the LLM categorizer, decides only when it is confident"""
+
+    def __init__(self, threshold: float = 0.85, min_score: float = 2.0, scorer: KeywordScorer | None = None):
+        self.threshold = threshold
+        self.min_score = min_score
+        self.scorer = scorer or KeywordScorer()
+
+    def classify(self, email: Email) -> PreclassifierResult:
+        if AUTOMATED_SENDER.search(email.sender):
+            return PreclassifierResult(category=EmailCategory.unrelated, confidence=1.0, reason="sender_rule")
+        if AUTOMATED_SUBJECT.search(email.subject):
+            return PreclassifierResult(category=EmailCategory.unrelated, confidence=1.0, reason="subject_rule")
+        if MARKETING_BODY.search(email.body):
+            return PreclassifierResult(category=EmailCategory.unrelated, confidence=0.95, reason="marketing_rule")
+        result = self.scorer.classify(f"{email.subject}\n{email.body}", min_score=self.min_score)
+        if result.confidence < self.threshold:
+            return PreclassifierResult(category=None, confidence=result.confidence, reason=result.reason)
+        return result
+
+
+_preclassifier = None
+
+def get_preclassifier() -> Preclassifier | None:
+    """Process-wide pre-classifier, None when PRECLASSIFIER_ENABLED is false"""
+    global _preclassifier
+    if os.getenv("PRECLASSIFIER_ENABLED", "true").lower() != "true":
+        return None
+    if _preclassifier is None:
+        _preclassifier = Preclassifier(threshold=float(os.getenv("PRECLASSIFIER_THRESHOLD", "0.85")))
+    return _preclassifier
@@ -1,24 +1,103 @@
-from langchain.tools.retriever import create_retriever_tool
-from langchain_aws.retrievers import AmazonKnowledgeBasesRetriever
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 from dotenv import load_dotenv
+from .cache import InMemoryCache, content_hash
+from .instrumentation import instrument_retriever_tool
+from .lazy import LazyRegistry
+from .retrieval_cache import CachingRetriever
 
+import functools
 import os
 
 load_dotenv()
 
-retriever = AmazonKnowledgeBasesRetriever(
-    knowledge_base_id=os.getenv("KNOWLEDGE_BASE_ID", ""),
-    retrieval_config={"vectorSearchConfiguration": {"numberOfResults": 4}},
-    region_name="us-east-2",
-    min_score_confidence=0.5
-)
+def _create_backend():
+    """Build the retrieval backend selected by RETRIEVER_BACKEND (bedrock or local)"""
+    backend = os.getenv("RETRIEVER_BACKEND", "bedrock")
+    if backend == "bedrock":
+        from langchain_aws.retrievers import AmazonKnowledgeBasesRetriever
+        return AmazonKnowledgeBasesRetriever(
+            knowledge_base_id=os.getenv("KNOWLEDGE_BASE_ID", ""),
+            retrieval_config={"vectorSearchConfiguration": {"numberOfResults": 4}},
+            region_name="us-east-2",
+            min_score_confidence=0.5
+        )
+    if backend == "local":
+        from .vector_index import load_local_retriever
+        return load_local_retriever()
+    raise ValueError(f"Unknown retriever backend: {backend}")
 
-retriever_tool = create_retriever_tool(
-    retriever,
-    "retrieve_prodcuts_and_services_information",
-    "Search and return information about products or services."
-)
+
+class LazyRetriever(BaseRetriever):
+    """Stand-in that resolves the configured backend only when a query actually runs"""
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        return RAG["backend"].invoke(query, config={"callbacks": run_manager.get_child()})
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return await RAG["backend"].ainvoke(query, config={"callbacks": run_manager.get_child()})
+
+
+def _create_retriever():
+    retriever = LazyRetriever()
+    if os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true":
+        retriever = CachingRetriever(
+            retriever=retriever,
+            cache=InMemoryCache(
+                max_size=int(os.getenv("RETRIEVAL_CACHE_SIZE", "1000")),
+                ttl=float(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))
+            )
+        )
+    return retriever
+
+def _create_retriever_tool():
+    from langchain.tools.retriever import create_retriever_tool
+    return create_retriever_tool(
+        RAG["retriever"],
+        "retrieve_prodcuts_and_services_information",
+        "Search and return information about products or services."
+    )
+
+RAG = LazyRegistry({
+    "backend": _create_backend,
+    "retriever": _create_retriever,
+    "retriever_tool": _create_retriever_tool
+})
+RAG.wrap(instrument_retriever_tool)
+
+def get_retriever():
+    return RAG["retriever"]
 
 def get_retriever_tool():
-    return retriever_tool
+    return RAG["retriever_tool"]
+
+def set_retriever(retriever: BaseRetriever):
+    """Inject the retrieval backend (e.g. a fake), the caching wrapper and tool are rebuilt around it"""
+    RAG.reset()
+    RAG.override("backend", retriever)
+
+def knowledge_base_version() -> str:
+    """
+    Identifies the knowledge base content, so caches built on it can tell when it changed:
+    KNOWLEDGE_BASE_VERSION when set (bump it after a Bedrock ingestion job), the source file
+    hashes of the local index manifest with RETRIEVER_BACKEND=local, else the Knowledge Base id.
+    """
+    version = os.getenv("KNOWLEDGE_BASE_VERSION")
+    if version:
+        return version
+    if os.getenv("RETRIEVER_BACKEND", "bedrock") == "local":
+        from .vector_index import current_index_dir
+        path = os.path.join(current_index_dir(os.getenv("LOCAL_INDEX_DIR", ".index")), "manifest.json")
+        # only read again when a reindex published another version
+        return _manifest_version(path, os.stat(path).st_mtime_ns if os.path.exists(path) else 0)
+    return os.getenv("KNOWLEDGE_BASE_ID", "")
 
+@functools.lru_cache(maxsize=8)
+def _manifest_version(path: str, modified: int) -> str:
+    if not modified:
+        return ""
+    with open(path, encoding="utf-8") as manifest:
+        return content_hash(manifest.read())[:16]
@@ -0,0 +1,255 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from ..state import Email
+from .cache import CacheStats, content_hash, normalize_text
+from .instrumentation import timed
+from .mailboxes import current_mailbox
+from .metrics import get_metrics
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+
+load_dotenv()
+
+# MinHash signature length, split into LSH bands: emails about 0.8 similar share a band with
+# probability 0.9998, emails about 0.3 similar with probability 0.12
+NUM_PERMUTATIONS = 64
+BANDS = 16
+SHINGLE_WORDS = 3
+
+_PRIME = (1 << 61) - 1
+
+def _permutations(seed: int = 0) -> list[tuple[int, int]]:
+    rng = random.Random(seed)
+    return [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+# fixed, so signatures stay comparable across processes and restarts
+_PERMUTATIONS = _permutations()
+
+_WORD = re.compile(r"\w+")
+_SENTENCE = re.compile(r"[.!?¿¡:;\n]+")
+
+
+def shingles(text: str) -> set[str]:
+    """Overlapping word triples of the normalized text, punctuation dropped"""
+    words = _WORD.findall(normalize_text(text))
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[index:index + SHINGLE_WORDS]) for index in range(len(words) - SHINGLE_WORDS + 1)}
+
+def minhash(features: set[str]) -> tuple[int, ...]:
+    """Signature of a non-empty feature set"""
+    hashes = [int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big") for feature in features]
+    return tuple(min((a * value + b) % _PRIME for value in hashes) for a, b in _PERMUTATIONS)
+
+def similarity(left: tuple[int, ...], right: tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return sum(a == b for a, b in zip(left, right)) / len(left)
+
+def anchors(text: str) -> frozenset[str]:
+    """
+    Words that name a product, model, order or person: capitalized inside a sentence, or holding a
+    digit or an inner capital anywhere. Emails only share a reply when these match exactly, so a
+    question about another model or order never gets a near-duplicate's answer.
+    """
+    found = set()
+    for sentence in _SENTENCE.split(text):
+        for position, word in enumerate(_WORD.findall(sentence)):
+            if any(character.isdigit() for character in word) or any(character.isupper() for character in word[1:]) \
+                    or (position > 0 and word[0].isupper()):
+                found.add(word.lower())
+    return frozenset(found)
+
+
+@dataclass
+class CachedReply:
+    key: str
+    partition: str
+    signature: tuple[int, ...]
+    reply: Email
+    source_id: str
+    created_at: float
+
+
+class ReplyCache:
+    """
+    Replies written for earlier emails, keyed by a MinHash signature of the email body. An email
+    whose body is at least `threshold` similar to a cached one, in the same mailbox and category
+    and with the same anchors, gets the cached reply instead of a new one. Candidates come from
+    LSH bands, so a lookup does not compare against every entry. Least recently used entries are
+    evicted beyond `max_size` and entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_size: int = 5000, ttl: float | None = None, threshold: float = 0.8):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.stats = CacheStats()
+        self.invalidations = 0
+        self.knowledge_base_version: str | None = None
+        self._entries: OrderedDict[str, CachedReply] = OrderedDict()
+        self._bands: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _partition(email: Email, category: str) -> str:
+        return content_hash(current_mailbox(), category, " ".join(sorted(anchors(email.body))))
+
+    @staticmethod
+    def _band_keys(partition: str, signature: tuple[int, ...]) -> list[str]:
+        rows = len(signature) // BANDS
+        return [f"{partition}:{band}:{hash(signature[band * rows:(band + 1) * rows])}" for band in range(BANDS)]
+
+    def lookup(self, email: Email, category: str) -> tuple[CachedReply, float] | None:
+        """The most similar cached reply above the threshold and its similarity, or None"""
+        features = shingles(email.body)
+        if not features:
+            return None
+        partition = self._partition(email, category)
+        signature = minhash(features)
+        now = time.time()
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(partition, signature):
+                candidates.update(self._bands.get(band_key, ()))
+            best, best_similarity = None, 0.0
+            for key in candidates:
+                entry = self._entries[key]
+                if self.ttl is not None and now - entry.created_at > self.ttl:
+                    self._remove(key)
+                    self.stats.expirations += 1
+                    continue
+                score = similarity(signature, entry.signature)
+                if score >= self.threshold and score > best_similarity:
+                    best, best_similarity = entry, score
+            if best is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(best.key)
+            self.stats.hits += 1
+            return best, best_similarity
+
+    def store(self, email: Email, category: str, reply: Email) -> int:
+        """Cache the reply written for the email, returns how many entries were evicted for it"""
+        features = shingles(email.body)
+        if not features:
+            return 0
+        partition = self._partition(email, category)
+        signature = minhash(features)
+        # an identical body in the same partition keeps a single entry
+        key = content_hash(partition, email.body)
+        evicted = 0
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = CachedReply(key, partition, signature, reply, email.id, time.time())
+            for band_key in self._band_keys(partition, signature):
+                self._bands.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+            self.stats.evictions += evicted
+        return evicted
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band_key in self._band_keys(entry.partition, entry.signature):
+            keys = self._bands.get(band_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[band_key]
+
+    def sync_knowledge_base(self, version: str) -> bool:
+        """Drop every entry when the knowledge base changed since they were written; True if it did"""
+        with self._lock:
+            changed = self.knowledge_base_version is not None and version != self.knowledge_base_version
+            self.knowledge_base_version = version
+        if changed:
+            self.invalidate()
+        return changed
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._bands.clear()
+            self.invalidations += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def reply_cache_enabled() -> bool:
+    return os.getenv("REPLY_CACHE_ENABLED", "false").lower() == "true"
+
+def _categories() -> set[str]:
+    return {category.strip() for category in os.getenv("REPLY_CACHE_CATEGORIES", "customer_feedback,product_enquiry").split(",") if category.strip()}
+
+_UNSET = object()
+_reply_cache = _UNSET
+_reply_cache_lock = threading.Lock()
+
+def get_reply_cache() -> ReplyCache | None:
+    """
+    Process-wide reply cache configured through the REPLY_CACHE_* variables, None unless
+    REPLY_CACHE_ENABLED=true: a reused reply was not written for the email at hand.
+    """
+    global _reply_cache
+    if _reply_cache is _UNSET:
+        with _reply_cache_lock:
+            if _reply_cache is _UNSET:
+                _reply_cache = ReplyCache(
+                    max_size=int(os.getenv("REPLY_CACHE_SIZE", "5000")),
+                    ttl=float(os.getenv("REPLY_CACHE_TTL", "86400")),
+                    threshold=float(os.getenv("REPLY_CACHE_THRESHOLD", "0.8"))
+                ) if reply_cache_enabled() else None
+    return _reply_cache # type: ignore
+
+def set_reply_cache(cache: ReplyCache | None):
+    """Replace the process-wide reply cache, pass None to write every reply"""
+    global _reply_cache
+    _reply_cache = cache
+
+def _cacheable(email: Email, category: str) -> bool:
+    # a follow-up is answered in light of its thread, which a cached reply knows nothing about
+    # a body without a single word, e.g. "?? !!" or an emoji, has no shingles to sign
+    return bool(_WORD.search(email.body)) and not email.references and category in _categories()
+
+def _sync_knowledge_base(cache: ReplyCache):
+    from .rag_utils import knowledge_base_version
+    if cache.sync_knowledge_base(knowledge_base_version()):
+        print("Knowledge base changed, reply cache cleared")
+        get_metrics().inc("reply_cache_invalidations_total")
+
+@timed("reply_cache", call="lookup")
+def find_reply(email: Email, category: str) -> Email | None:
+    """The cached reply of a near-duplicate earlier email, adapted to this one, or None"""
+    cache = get_reply_cache()
+    if cache is None or not _cacheable(email, category):
+        return None
+    _sync_knowledge_base(cache)
+    match = cache.lookup(email, category)
+    metrics = get_metrics()
+    metrics.describe("reply_cache_lookups_total", "Reply cache lookups by category and result")
+    metrics.inc("reply_cache_lookups_total", category=category, result="hit" if match else "miss")
+    if match is None:
+        return None
+    entry, score = match
+    print(f"Reusing the reply to email {entry.source_id} (similarity {score:.2f})")
+    # the sender takes the recipient, subject and thread headers from the original email
+    return entry.reply.model_copy(update={"id": email.id})
+
+def remember_reply(email: Email, category: str, reply: Email):
+    """Cache a reply the writer just wrote, for near-duplicates of the email to reuse"""
+    cache = get_reply_cache()
+    if cache is None or not _cacheable(email, category):
+        return
+    _sync_knowledge_base(cache)
+    evicted = cache.store(email, category, reply)
+    if evicted:
+        get_metrics().inc("reply_cache_evictions_total", evicted)
@@ -0,0 +1,98 @@
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+from concurrent.futures import Future
+from typing import Any
+from .cache import InMemoryCache, content_hash
+import asyncio
+import re
+import threading
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query: str) -> str:
+    """Strip punctuation so '¿Precio del iPhone 13?' and 'precio del iphone 13' share a cache entry"""
+    return _PUNCTUATION.sub(" ", query)
+
+
+class CachingRetriever(BaseRetriever):
+    """
+    Wraps a retriever with a TTL/LRU document cache keyed on the normalized query.
+    Concurrent identical queries that miss the cache are coalesced into a single call
+    to the wrapped retriever, both for threads and for coroutines on the same event loop.
+    """
+
+    retriever: BaseRetriever
+    cache: Any = None
+    coalesced: int = 0
+
+    _inflight: dict[str, Future] = PrivateAttr(default_factory=dict)
+    _ainflight: dict[tuple[int, str], asyncio.Task] = PrivateAttr(default_factory=dict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, context: Any):
+        if self.cache is None:
+            self.cache = InMemoryCache(max_size=1000, ttl=3600)
+
+    @property
+    def stats(self) -> dict:
+        return {**self.cache.stats.as_dict(), "coalesced": self.coalesced}
+
+    def _cache_key(self, query: str) -> str:
+        return content_hash(normalize_query(query))
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        key = self._cache_key(query)
+        documents = self.cache.get(key)
+        if documents is not None:
+            return list(documents)
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+        if not leader:
+            return list(future.result())
+
+        try:
+            documents = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+            self.cache.set(key, documents)
+            future.set_result(documents)
+            return list(documents)
+        except Exception as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        key = self._cache_key(query)
+        documents = self.cache.get(key)
+        if documents is not None:
+            return list(documents)
+
+        # tasks are bound to their event loop, so coalescing is scoped per loop
+        inflight_key = (id(asyncio.get_running_loop()), key)
+        task = self._ainflight.get(inflight_key)
+        if task is None:
+            task = asyncio.ensure_future(self._afetch(key, query, run_manager))
+            self._ainflight[inflight_key] = task
+            task.add_done_callback(lambda _: self._ainflight.pop(inflight_key, None))
+        else:
+            self.coalesced += 1
+        # shield so one cancelled waiter does not cancel the shared call for the others
+        return list(await asyncio.shield(task))
+
+    async def _afetch(self, key: str, query: str, run_manager: AsyncCallbackManagerForRetrieverRun) -> list[Document]:
+        documents = await self.retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        self.cache.set(key, documents)
+        return documents
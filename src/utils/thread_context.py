@@ -0,0 +1,169 @@
+from dotenv import load_dotenv
+from email.utils import parsedate_to_datetime
+from ..state import Email
+from .cache import create_cache
+from .gmail_utils import _get_gmail_service, _parse_email_message
+from .instrumentation import timed
+from .mailboxes import current_mailbox
+from .mime import MESSAGE_FIELDS
+import os
+import re
+import threading
+
+load_dotenv()
+
+# rough token estimate for budgeting, Bedrock's tokenizers average about four characters per token
+CHARS_PER_TOKEN = 4
+# our own replies in a thread
+OWN_LABELS = {"SENT"}
+# one threads.get: the thread's historyId and every message with the fields a summary line needs
+THREAD_FIELDS = f"historyId,messages({MESSAGE_FIELDS})"
+
+_WHITESPACE = re.compile(r"\s+")
+
+_UNSET = object()
+_thread_cache = _UNSET
+_thread_cache_lock = threading.Lock()
+
+def get_thread_cache():
+    """
+    Process-wide cache of thread history configured through the THREAD_CONTEXT_CACHE_* variables.
+    Holds the thread as last read, per thread id, and the rendered summary per (thread, email).
+    """
+    global _thread_cache
+    if _thread_cache is _UNSET:
+        with _thread_cache_lock:
+            if _thread_cache is _UNSET:
+                _thread_cache = create_cache(
+                    backend=os.getenv("THREAD_CONTEXT_CACHE_BACKEND", "memory"),
+                    path=os.getenv("THREAD_CONTEXT_CACHE_PATH", ".cache/threads.sqlite"),
+                    max_size=int(os.getenv("THREAD_CONTEXT_CACHE_SIZE", "10000")),
+                    ttl=float(os.getenv("THREAD_CONTEXT_CACHE_TTL", "604800"))
+                )
+    return _thread_cache
+
+def set_thread_cache(cache):
+    """Replace the process-wide thread cache, pass None to fetch the thread on every email"""
+    global _thread_cache
+    _thread_cache = cache
+
+def thread_context_enabled() -> bool:
+    return os.getenv("THREAD_CONTEXT_ENABLED", "true").lower() == "true"
+
+def _max_tokens() -> int:
+    return int(os.getenv("THREAD_CONTEXT_MAX_TOKENS", "400"))
+
+def _message_tokens() -> int:
+    return int(os.getenv("THREAD_CONTEXT_MESSAGE_TOKENS", "150"))
+
+def _max_messages() -> int:
+    return int(os.getenv("THREAD_CONTEXT_MAX_MESSAGES", "6"))
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1 if text else 0
+
+def _truncate(text: str, tokens: int) -> str:
+    text = _WHITESPACE.sub(" ", text).strip()
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + " …"
+
+def _short_date(date: str) -> str:
+    try:
+        return parsedate_to_datetime(date).strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return ""
+
+@timed("gmail", call="threads.get")
+def _fetch_thread(service, thread_id: str) -> dict:
+    """The whole thread in one round trip: its historyId and its messages in chronological order, without drafts"""
+    thread = service.users().threads().get(userId='me', id=thread_id, format='full', fields=THREAD_FIELDS).execute()
+    return {
+        "history_id": thread.get("historyId"),
+        "messages": [_compact(message) for message in thread.get("messages", []) if 'DRAFT' not in message.get('labelIds', [])]
+    }
+
+def _window(earlier: list[dict]) -> list[dict]:
+    """The thread's opening message and the most recent ones, at most THREAD_CONTEXT_MAX_MESSAGES"""
+    limit = _max_messages()
+    if len(earlier) <= limit:
+        return earlier
+    return earlier[:1] + earlier[len(earlier) - limit + 1:]
+
+def _compact(message: dict) -> dict:
+    email = _parse_email_message(message)
+    return {
+        "id": email.id,
+        "sender": email.sender,
+        "date": _short_date(email.date),
+        "own": bool(OWN_LABELS & set(message.get('labelIds', []))),
+        "text": _truncate(email.body, _message_tokens())
+    }
+
+def render_thread_summary(messages: list[dict], earlier_count: int, max_tokens: int) -> str:
+    """
+    Earlier messages as compact lines within max_tokens: the opening message, then the most recent
+    ones that still fit. Messages left out are only counted.
+    """
+    if not messages:
+        return ""
+    lines = {0: messages[0]}
+    used = estimate_tokens(messages[0]["text"])
+    for index in range(len(messages) - 1, 0, -1):
+        tokens = estimate_tokens(messages[index]["text"])
+        if used + tokens > max_tokens:
+            break
+        lines[index] = messages[index]
+        used += tokens
+    omitted = earlier_count - len(lines)
+    header = "Earlier messages in this conversation, oldest first"
+    header += f" ({omitted} more not shown):" if omitted else ":"
+    return "\n".join([header, *(_render_line(message) for _, message in sorted(lines.items()))])
+
+def _render_line(message: dict) -> str:
+    author = "Us" if message["own"] else message["sender"]
+    date = f"[{message['date']}] " if message["date"] else ""
+    return f"{date}{author}: {message['text']}"
+
+def _thread_key(email: Email) -> str:
+    # thread ids are only unique within a mailbox
+    return f"thread:{current_mailbox()}:{email.thread_id}"
+
+def _summary_key(email: Email) -> str:
+    return f"summary:{current_mailbox()}:{email.thread_id}:{email.id}:{_max_tokens()}"
+
+def get_thread_context(email: Email, service=None) -> str:
+    """
+    A token-budgeted summary of the messages that came before `email` in its Gmail thread, or ""
+    for the first message of a thread. The thread is read with a single threads.get (bodies
+    masked to THREAD_FIELDS) and cached per thread id along with its historyId: a later call for
+    an email that is already in the cached copy makes no Gmail call, a newer follow-up reads the
+    thread again. Summaries are cached per thread id and email id, so the second writer call of a
+    run costs nothing.
+    """
+    # a reply carries References, the first message of a thread has no history to fetch
+    if not thread_context_enabled() or not isinstance(email, Email) or not email.thread_id or not email.references:
+        return ""
+    cache = get_thread_cache()
+    if cache is not None:
+        summary = cache.get(_summary_key(email))
+        if summary is not None:
+            return summary
+    try:
+        thread = cache.get(_thread_key(email)) if cache is not None else None
+        fetched = thread is None or all(message["id"] != email.id for message in thread["messages"])
+        if fetched:
+            thread = _fetch_thread(service or _get_gmail_service(), email.thread_id)
+        ids = [message["id"] for message in thread["messages"]]
+        earlier = thread["messages"][:ids.index(email.id)] if email.id in ids else thread["messages"]
+        summary = render_thread_summary(_window(earlier), len(earlier), _max_tokens())
+    except Exception as error:
+        # the reply is still written, just without the earlier conversation
+        print(f'An error occurred while loading thread {email.thread_id}: {error}')
+        return ""
+    if cache is not None:
+        if fetched:
+            cache.set(_thread_key(email), thread)
+        cache.set(_summary_key(email), summary)
+    return summary
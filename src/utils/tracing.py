@@ -0,0 +1,157 @@
+from collections import deque
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from dotenv import load_dotenv
+from typing import Any, Protocol
+import os
+import random
+import threading
+import time
+
+load_dotenv()
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start: float
+    end: float = 0.0
+    status: str = "ok"
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end - self.start) * 1000
+
+
+class SpanExporter(Protocol):
+    def export(self, span: Span): ...
+
+
+class InMemorySpanExporter:
+    """Keeps the last `max_spans` finished spans, enough to inspect recent runs offline"""
+
+    def __init__(self, max_spans: int = 10000):
+        self._spans: deque[Span] = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self, trace_id: str | None = None) -> list[Span]:
+        with self._lock:
+            return [span for span in self._spans if trace_id is None or span.trace_id == trace_id]
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+# the innermost open span of the current thread or task; LangChain copies the context into its worker threads
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def _new_id(bits: int) -> str:
+    # ids only need to be unique, not unpredictable; much cheaper than uuid4
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class _SpanScope:
+    """Context manager of Tracer.span(), a plain class because @contextmanager costs a generator per span"""
+
+    __slots__ = ("_tracer", "_name", "_attributes", "_span", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: dict[str, Any]):
+        self._tracer = tracer
+        self._name = name
+        self._attributes = attributes
+        self._span: Span | None = None
+        self._token: Token | None = None
+
+    def __enter__(self) -> Span | None:
+        if self._tracer.exporter is None:
+            return None
+        self._span = self._tracer._new_span(self._name, time.time(), self._attributes)
+        self._token = _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, error, traceback) -> bool:
+        span = self._span
+        if span is None:
+            return False
+        if error is not None:
+            span.status = "error"
+            span.attributes["error"] = repr(error)
+        span.end = time.time()
+        _current_span.reset(self._token) # type: ignore
+        self._tracer.exporter.export(span) # type: ignore
+        return False
+
+
+class Tracer:
+    """
+    Nested timing spans. span() opens a child of the current span (or a new trace) for the
+    duration of a with block; record() adds an already timed child, e.g. from a callback.
+    Without an exporter tracing is off: span() yields None and nothing is recorded.
+    """
+
+    def __init__(self, exporter: SpanExporter | None = None):
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def _new_span(self, name: str, start: float, attributes: dict[str, Any]) -> Span:
+        parent = _current_span.get()
+        return Span(
+            name=name,
+            trace_id=parent.trace_id if parent else _new_id(128),
+            span_id=_new_id(64),
+            parent_id=parent.span_id if parent else None,
+            start=start,
+            attributes=attributes
+        )
+
+    def span(self, name: str, **attributes: Any) -> _SpanScope:
+        return _SpanScope(self, name, attributes)
+
+    def record(self, name: str, start: float, end: float, status: str = "ok", **attributes: Any) -> Span | None:
+        if self.exporter is None:
+            return None
+        span = self._new_span(name, start, attributes)
+        span.end = end
+        span.status = status
+        self.exporter.export(span)
+        return span
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+_tracer = None
+
+def get_tracer() -> Tracer:
+    """
+    Process-wide tracer exporting to memory, TRACE_MAX_SPANS bounds how many are kept;
+    TRACE_ENABLED=false builds one without an exporter, which records nothing.
+    """
+    global _tracer
+    if _tracer is None:
+        enabled = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+        _tracer = Tracer(InMemorySpanExporter(max_spans=int(os.getenv("TRACE_MAX_SPANS", "10000"))) if enabled else None)
+    return _tracer
+
+def set_tracer(tracer: Tracer | None):
+    """Replace the process-wide tracer (e.g. with another exporter), None rebuilds it on next use"""
+    global _tracer
+    _tracer = tracer
+
+def trace(name: str, **attributes: Any):
+    """Open a span on the process-wide tracer, e.g. `with trace("run", mailbox="me"):` around a graph run"""
+    return get_tracer().span(name, **attributes)
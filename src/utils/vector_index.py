@@ -0,0 +1,353 @@
+"""
+Local embedded vector index, an alternative to the remote Bedrock Knowledge Base.
+
+Build or refresh the index (only changed source files are re-embedded):
+
+    python -m src.utils.vector_index reindex --data-dir src/data --index-dir .index
+"""
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from dotenv import load_dotenv
+from typing import Any, Callable
+import argparse
+import contextlib
+import hashlib
+import json
+import numpy as np
+import os
+import re
+import shutil
+import tempfile
+import time
+import unicodedata
+
+load_dotenv()
+
+_TOKEN = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic, offline embeddings: signed feature hashing of words and word bigrams.
+    Good enough for keyword-heavy product catalogues and for benchmarks without network access.
+    """
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+
+    def _features(self, text: str) -> list[str]:
+        text = unicodedata.normalize("NFKD", text.lower())
+        tokens = _TOKEN.findall("".join(char for char in text if not unicodedata.combining(char)))
+        return tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+def get_embeddings() -> tuple[Embeddings, str]:
+    """Embeddings configured through LOCAL_EMBEDDINGS, returned with an id stored in the index manifest"""
+    backend = os.getenv("LOCAL_EMBEDDINGS", "hashing")
+    if backend == "hashing":
+        return HashingEmbeddings(), "hashing-512"
+    if backend == "bedrock":
+        from langchain_aws import BedrockEmbeddings
+        model_id = os.getenv("EMBEDDING_MODEL", "amazon.titan-embed-text-v2:0")
+        return BedrockEmbeddings(model_id=model_id, region_name=os.getenv("AWS_REGION", "us-east-1")), model_id
+    raise ValueError(f"Unknown embeddings backend: {backend}")
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class FlatIndex:
+    """Exact inner-product search over L2-normalized vectors (works on a memory-mapped array)"""
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        scores = self.vectors @ query
+        ids = _top_k(scores, k)
+        return ids, scores[ids]
+
+
+class IVFIndex:
+    """
+    Inverted-file index: vectors are bucketed by their nearest k-means centroid and a query
+    only scans the `nprobe` closest buckets. Approximate, trades recall for latency on large corpora.
+    """
+
+    def __init__(self, vectors: np.ndarray, nlist: int | None = None, nprobe: int = 4, iterations: int = 10, seed: int = 0):
+        self.vectors = vectors
+        self.nprobe = nprobe
+        nlist = nlist or max(1, int(np.sqrt(len(vectors))))
+        self.centroids = self._kmeans(np.asarray(vectors), min(nlist, len(vectors)), iterations, seed)
+        assignments = np.argmax(np.asarray(vectors) @ self.centroids.T, axis=1)
+        self.lists = [np.flatnonzero(assignments == centroid) for centroid in range(len(self.centroids))]
+
+    @staticmethod
+    def _kmeans(vectors: np.ndarray, nlist: int, iterations: int, seed: int) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            for centroid in range(nlist):
+                members = vectors[assignments == centroid]
+                if len(members):
+                    centroids[centroid] = members.mean(axis=0)
+            centroids = _normalize_rows(centroids)
+        return centroids
+
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        probes = _top_k(self.centroids @ query, self.nprobe)
+        candidates = np.concatenate([self.lists[probe] for probe in probes])
+        if not len(candidates):
+            return candidates, np.empty(0, dtype=np.float32)
+        scores = self.vectors[candidates] @ query
+        best = _top_k(scores, k)
+        return candidates[best], scores[best]
+
+
+def chunk_text(text: str, max_chars: int = 800) -> list[str]:
+    """Split on blank lines and merge consecutive paragraphs up to max_chars"""
+    chunks, current = [], ""
+    for paragraph in (paragraph.strip() for paragraph in text.split("\n\n")):
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            chunks.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# file in the index directory naming the version directory readers use
+POINTER = "CURRENT"
+_INDEX_FILES = ("vectors.npy", "chunks.jsonl", "manifest.json")
+
+
+def current_index_dir(index_dir: str) -> str:
+    """The published version of the index at index_dir, as named by its pointer file"""
+    try:
+        with open(os.path.join(index_dir, POINTER), encoding="utf-8") as pointer:
+            return os.path.join(index_dir, pointer.read().strip())
+    except FileNotFoundError:
+        # an index written before versions, straight into index_dir
+        return index_dir
+
+
+class LocalVectorStore:
+    """
+    On-disk index made of vectors.npy (memory-mapped at query time), chunks.jsonl and a
+    manifest recording the content hash of every source file. Re-indexing only embeds
+    files whose hash changed and drops chunks of files that were removed.
+
+    Every build goes to a new version directory inside index_dir and is published by
+    replacing the CURRENT pointer file in one rename, so a reader always resolves a
+    complete index, the new one or the one before it.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.vectors: np.ndarray | None = None
+        self.chunks: list[dict] = []
+        self.manifest: dict = {}
+
+    @property
+    def exists(self) -> bool:
+        try:
+            self._resolve(lambda directory: os.stat(os.path.join(directory, "manifest.json")))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def load(self) -> "LocalVectorStore":
+        return self._resolve(self._load)
+
+    def _resolve(self, read: Callable[[str], Any]) -> Any:
+        """read(version directory), following the pointer again if that version was pruned meanwhile"""
+        while True:
+            directory = current_index_dir(self.index_dir)
+            try:
+                return read(directory)
+            except FileNotFoundError:
+                if current_index_dir(self.index_dir) == directory:
+                    raise
+
+    def _load(self, directory: str) -> "LocalVectorStore":
+        # every file comes from the same version
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as manifest:
+            self.manifest = json.load(manifest)
+        with open(os.path.join(directory, "chunks.jsonl"), encoding="utf-8") as chunks:
+            self.chunks = [json.loads(line) for line in chunks]
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        return self
+
+    def reindex(self, data_dir: str, embeddings: Embeddings, embeddings_id: str, batch_size: int = 64, full: bool = False) -> dict:
+        """Bring the index in line with data_dir, returns counts of added, kept and removed files"""
+        if self.exists and not full:
+            self.load()
+        if self.manifest.get("embeddings") != embeddings_id:
+            # vectors from another model are not comparable, start over
+            self.manifest, self.chunks, self.vectors = {}, [], None
+
+        previous_files = self.manifest.get("files", {})
+        current_files = {}
+        for name in sorted(os.listdir(data_dir)):
+            path = os.path.join(data_dir, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as source:
+                    current_files[name] = hashlib.sha256(source.read()).hexdigest()
+
+        kept = [name for name, digest in current_files.items() if previous_files.get(name) == digest]
+        changed = [name for name in current_files if name not in kept]
+        removed = [name for name in previous_files if name not in current_files]
+
+        keep_rows = [row for row, chunk in enumerate(self.chunks) if chunk["metadata"]["source"] in kept]
+        chunks = [self.chunks[row] for row in keep_rows]
+        vectors = [np.asarray(self.vectors[keep_rows])] if keep_rows and self.vectors is not None else []
+
+        new_chunks = []
+        for name in changed:
+            with open(os.path.join(data_dir, name), encoding="utf-8") as source:
+                new_chunks.extend(
+                    {"text": text, "metadata": {"source": name, "chunk": number}}
+                    for number, text in enumerate(chunk_text(source.read()))
+                )
+        for start in range(0, len(new_chunks), batch_size):
+            batch = new_chunks[start:start + batch_size]
+            vectors.append(np.asarray(embeddings.embed_documents([chunk["text"] for chunk in batch]), dtype=np.float32))
+        chunks.extend(new_chunks)
+
+        matrix = _normalize_rows(np.vstack(vectors)) if vectors else np.zeros((0, 1), dtype=np.float32)
+        self._write(matrix, chunks, {"embeddings": embeddings_id, "files": current_files})
+        self.load()
+        return {"added": len(changed), "kept": len(kept), "removed": len(removed), "chunks": len(chunks)}
+
+    def _write(self, vectors: np.ndarray, chunks: list[dict], manifest: dict):
+        os.makedirs(self.index_dir, exist_ok=True)
+        previous = current_index_dir(self.index_dir)
+        # version names sort by creation time, see _prune
+        version = tempfile.mkdtemp(dir=self.index_dir, prefix=f"v{time.time_ns()}-")
+        try:
+            np.save(os.path.join(version, "vectors.npy"), vectors)
+            with open(os.path.join(version, "chunks.jsonl"), "w", encoding="utf-8") as output:
+                for chunk in chunks:
+                    output.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+            with open(os.path.join(version, "manifest.json"), "w", encoding="utf-8") as output:
+                json.dump(manifest, output, indent=2)
+            descriptor, pointer = tempfile.mkstemp(dir=self.index_dir, prefix=f".{POINTER}-")
+            with os.fdopen(descriptor, "w", encoding="utf-8") as output:
+                output.write(os.path.basename(version))
+            os.replace(pointer, os.path.join(self.index_dir, POINTER))
+        except BaseException:
+            shutil.rmtree(version, ignore_errors=True)
+            raise
+        self._prune(previous)
+
+    def _prune(self, previous: str):
+        """
+        Delete the versions older than the one just replaced, which stays for readers that resolved
+        the pointer before the swap. Readers that memory-mapped older vectors keep them until they reload.
+        """
+        if previous == self.index_dir:
+            for name in _INDEX_FILES:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(self.index_dir, name))
+            return
+        for entry in os.scandir(self.index_dir):
+            if entry.is_dir() and entry.name.startswith("v") and entry.name < os.path.basename(previous):
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+
+class LocalIndexRetriever(BaseRetriever):
+    """Retriever over a LocalVectorStore using a flat or IVF index"""
+
+    store: Any
+    embeddings: Any
+    k: int = 4
+    index_type: str = "flat"
+    min_score: float = 0.0
+    index: Any = None
+
+    def model_post_init(self, context: Any):
+        if self.index is None:
+            vectors = self.store.vectors
+            use_ivf = self.index_type == "ivf" and len(vectors) > 0
+            self.index = IVFIndex(vectors) if use_ivf else FlatIndex(vectors)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        if not self.store.chunks:
+            return []
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        ids, scores = self.index.search(query_vector, self.k)
+        return [
+            Document(
+                page_content=self.store.chunks[row]["text"],
+                metadata={**self.store.chunks[row]["metadata"], "score": float(score)}
+            )
+            for row, score in zip(ids, scores)
+            if score >= self.min_score
+        ]
+
+
+def load_local_retriever() -> LocalIndexRetriever:
+    """Open (building it on first use) the local index configured through the LOCAL_INDEX_* variables"""
+    embeddings, embeddings_id = get_embeddings()
+    store = LocalVectorStore(os.getenv("LOCAL_INDEX_DIR", ".index"))
+    if not store.exists or store.load().manifest.get("embeddings") != embeddings_id:
+        store.reindex(os.getenv("LOCAL_INDEX_DATA_DIR", "src/data"), embeddings, embeddings_id)
+    return LocalIndexRetriever(
+        store=store,
+        embeddings=embeddings,
+        k=int(os.getenv("LOCAL_INDEX_K", "4")),
+        index_type=os.getenv("LOCAL_INDEX_TYPE", "flat")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local vector index")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    reindex = subcommands.add_parser("reindex", help="embed new or changed source files")
+    reindex.add_argument("--data-dir", default=os.getenv("LOCAL_INDEX_DATA_DIR", "src/data"))
+    reindex.add_argument("--index-dir", default=os.getenv("LOCAL_INDEX_DIR", ".index"))
+    reindex.add_argument("--batch-size", type=int, default=64)
+    reindex.add_argument("--full", action="store_true", help="re-embed every file")
+    args = parser.parse_args()
+
+    embeddings, embeddings_id = get_embeddings()
+    summary = LocalVectorStore(args.index_dir).reindex(
+        args.data_dir, embeddings, embeddings_id, batch_size=args.batch_size, full=args.full
+    )
+    print(f"Index updated: {summary}")
+
+
+if __name__ == "__main__":
+    main()
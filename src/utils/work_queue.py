@@ -0,0 +1,186 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from typing import Callable, Iterator, Protocol
+from ..state import Email
+import os
+import sqlite3
+import threading
+import time
+
+load_dotenv()
+
+
+@dataclass
+class WorkItem:
+    id: int
+    mailbox: str
+    email: Email
+    attempts: int
+
+
+class WorkQueue(Protocol):
+    """
+    Queue of emails to answer, shared by every worker. Items of the same partition (mailbox and
+    thread) are handed out one at a time in the order they were put, so replies in a thread
+    are written in order; different partitions are processed in parallel.
+    """
+
+    def put(self, mailbox: str, emails: list[Email]) -> int: ...
+    def claim(self, worker: str, limit: int = 1) -> list[WorkItem]: ...
+    def complete(self, item_id: int): ...
+    def fail(self, item_id: int, error: str) -> bool: ...
+    def settle(self, mailbox: str) -> list[str]: ...
+    def status_counts(self) -> dict[str, int]: ...
+
+
+def partition_key(mailbox: str, email: Email) -> str:
+    return f"{mailbox}:{email.thread_id or email.id}"
+
+
+class SQLiteWorkQueue:
+    """
+    WorkQueue in a SQLite file that worker processes open side by side. A claim runs in an
+    IMMEDIATE transaction, so two processes never lease the same item, and only takes the oldest
+    open item of each partition. Leases expire after `lease` seconds, so the items of a worker
+    that died are handed out again. Failed items are retried after `retry_delay` seconds, up to
+    `max_attempts` attempts, and keep their partition blocked meanwhile.
+
+    Rows move pending -> running -> done -> settled (the reply was sent and the email marked
+    processed), or to failed; putting a failed email again queues it afresh.
+    """
+
+    def __init__(self, path: str, lease: float = 300.0, max_attempts: int = 3, retry_delay: float = 30.0):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # autocommit, transactions are opened explicitly; wait for other processes' write locks
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS work_items ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, mailbox TEXT NOT NULL, email_id TEXT NOT NULL, "
+            "partition_key TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, lease_until REAL, next_attempt_at REAL NOT NULL, "
+            "last_error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, UNIQUE (mailbox, email_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS work_items_partition ON work_items (partition_key, status, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS work_items_status ON work_items (status, next_attempt_at)")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # IMMEDIATE takes the write lock up front, so a read-then-update cannot race another process
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def put(self, mailbox: str, emails: list[Email]) -> int:
+        """Queue the emails in order, returns how many were added (an email is queued once, unless it failed)"""
+        now = time.time()
+        added = 0
+        with self._transaction() as conn:
+            for email in emails:
+                # a failed email comes back when the listener delivers it again
+                cursor = conn.execute(
+                    "INSERT INTO work_items (mailbox, email_id, partition_key, payload, status, next_attempt_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, 'pending', ?, ?, ?) "
+                    "ON CONFLICT (mailbox, email_id) DO UPDATE SET payload = excluded.payload, status = 'pending', attempts = 0, "
+                    "worker = NULL, lease_until = NULL, next_attempt_at = excluded.next_attempt_at, updated_at = excluded.updated_at WHERE status = 'failed'",
+                    (mailbox, email.id, partition_key(mailbox, email), email.model_dump_json(), now, now, now)
+                )
+                added += cursor.rowcount
+        return added
+
+    def claim(self, worker: str, limit: int = 1) -> list[WorkItem]:
+        """Lease up to `limit` items whose partition has no earlier open item"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE work_items SET status = 'pending', worker = NULL, updated_at = ? WHERE status = 'running' AND lease_until < ?",
+                (now, now)
+            )
+            rows = conn.execute(
+                "SELECT id, mailbox, payload, attempts FROM work_items AS item "
+                "WHERE status = 'pending' AND next_attempt_at <= ? AND NOT EXISTS ("
+                "SELECT 1 FROM work_items AS earlier WHERE earlier.partition_key = item.partition_key "
+                "AND earlier.status IN ('pending', 'running') AND earlier.id < item.id) "
+                "ORDER BY id LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE work_items SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                [(worker, now + self.lease, now, row[0]) for row in rows]
+            )
+        return [
+            WorkItem(id=item_id, mailbox=mailbox, email=Email.model_validate_json(payload), attempts=attempts + 1)
+            for item_id, mailbox, payload, attempts in rows
+        ]
+
+    def _execute(self, sql: str, parameters: tuple):
+        with self._lock:
+            self._conn.execute(sql, parameters)
+
+    def complete(self, item_id: int):
+        self._execute(
+            "UPDATE work_items SET status = 'done', lease_until = NULL, last_error = NULL, updated_at = ? WHERE id = ?",
+            (time.time(), item_id)
+        )
+
+    def fail(self, item_id: int, error: str) -> bool:
+        """Retry the item later, or give up on it after max_attempts; True when it gave up"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE work_items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "next_attempt_at = ?, lease_until = NULL, last_error = ?, updated_at = ? WHERE id = ? RETURNING status",
+                (self.max_attempts, now + self.retry_delay, error, now, item_id)
+            ).fetchone()
+        return row is not None and row[0] == "failed"
+
+    def settle(self, mailbox: str) -> list[str]:
+        """Ids of the mailbox's answered emails not settled yet, marking them settled"""
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, email_id FROM work_items WHERE mailbox = ? AND status = 'done' ORDER BY id", (mailbox,)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE work_items SET status = 'settled', updated_at = ? WHERE id = ?", [(now, row[0]) for row in rows]
+            )
+        return [email_id for _, email_id in rows]
+
+    def status_counts(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM work_items GROUP BY status").fetchall())
+
+
+# backend name -> factory(path); register_work_queue() adds e.g. a Redis or SQS queue
+WORK_QUEUES: dict[str, Callable[[str], WorkQueue]] = {
+    "sqlite": lambda path: SQLiteWorkQueue(
+        path,
+        lease=float(os.getenv("WORK_QUEUE_LEASE", "300")),
+        max_attempts=int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "3"))
+    ),
+}
+
+
+def register_work_queue(name: str, factory: Callable[[str], WorkQueue]):
+    WORK_QUEUES[name] = factory
+
+
+def create_work_queue(backend: str | None = None, path: str | None = None) -> WorkQueue:
+    """Build the queue for WORK_QUEUE (sqlite) stored at WORK_QUEUE_PATH"""
+    backend = backend or os.getenv("WORK_QUEUE", "sqlite")
+    if backend not in WORK_QUEUES:
+        raise ValueError(f"Unknown work queue: {backend}")
+    return WORK_QUEUES[backend](path or os.getenv("WORK_QUEUE_PATH", ".cache/work_queue.sqlite"))